@@ -0,0 +1,302 @@
+"""
+Offline build of the cocktail index
+
+Streams the dataset CSV, parses and formats cocktail documents across a
+process pool, embeds them in bounded concurrent batches and writes a
+versioned, checksummed index artifact, then atomically points "current" at
+it. Each artifact also carries the cocktail similarity graph used for
+"similar to X" requests. A running server picks the new artifact up without
+a restart:
+
+    python -m app.build_index --processes 4 --concurrency 4
+
+Vectors of documents that are unchanged since the current artifact are
+reused, as are the graph neighbours of unchanged cocktails, and a dataset
+with nothing changed produces no new version unless --force is given.
+"""
+import os
+import csv
+import sys
+import time
+import hashlib
+import argparse
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+from app.config import (
+    COCKTAILS_DATA,
+    EMBEDDING_BACKEND,
+    EMBEDDING_DIM,
+    EMBEDDING_BATCH_SIZE,
+    INDEX_ARTIFACTS_PATH,
+    INDEX_KEEP_VERSIONS,
+    SIMILARITY_GRAPH_K,
+    SIMILARITY_GRAPH_ALPHA
+)
+from app.utils.cocktail_store import CocktailStore
+from app.utils.cocktail_parser import (
+    download_cocktail_data,
+    format_cocktail,
+    cocktail_doc_id,
+    cocktail_metadata
+)
+
+# (doc_id, text, metadata) of one cocktail document
+PreparedDocument = Tuple[str, str, Dict[str, Any]]
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Read the dataset CSV one record at a time"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_chunks(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Split records into chunks"""
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def prepare_chunk(records: List[Dict[str, Any]]) -> Tuple[CocktailStore, List[PreparedDocument]]:
+    """
+    Parse and format one chunk of records into documents
+
+    Records go through CocktailStore like they do at serving time, so the
+    text, and with it the document ID, matches what the server computes.
+    The chunk's store is returned as well, to be joined into the catalog
+    snapshot without parsing the records again.
+
+    Args:
+        records: Raw CSV records
+
+    Returns:
+        Tuple of (the chunk's CocktailStore, one (doc_id, text, metadata) tuple per record)
+    """
+    store = CocktailStore.from_records(records)
+    documents = []
+    for cocktail in store:
+        text = format_cocktail(cocktail)
+        doc_id = cocktail_doc_id(text)
+        documents.append((doc_id, text, cocktail_metadata(cocktail, doc_id)))
+    return store, documents
+
+
+def embed_in_batches(embeddings, texts: List[str], batch_size: int, concurrency: int) -> List[List[float]]:
+    """
+    Embed texts in batches, with at most concurrency batches in flight
+
+    Args:
+        embeddings: Embedding backend
+        texts: Texts to embed
+        batch_size: Texts per embedding call
+        concurrency: Embedding calls in flight at once
+
+    Returns:
+        One vector per text, in order
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    vectors: List[List[float]] = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for done, batch_vectors in enumerate(pool.map(embeddings.embed_documents, batches), 1):
+            vectors.extend(batch_vectors)
+            print(f"Embedded batch {done}/{len(batches)}")
+    return vectors
+
+
+def previous_artifact(root: str, model: str):
+    """The current artifact, if it used the same embedding model"""
+    from app.db.index_artifact import IndexArtifact
+
+    try:
+        artifact = IndexArtifact.load_current(root, verify=False)
+    except ValueError:
+        return None
+    if artifact is None or artifact.manifest.get("embedding_model") != model:
+        return None
+    return artifact
+
+
+def build_similarity_graph(index, row_ids: List[str], cocktails: CocktailStore, k: int, alpha: float, previous=None):
+    """
+    Build the similarity graph over catalog rows
+
+    Args:
+        index: CocktailIndex holding every row's vector
+        row_ids: Document ID of each catalog row
+        cocktails: Catalog, for the ingredient lists
+        k: Neighbours per cocktail
+        alpha: Weight of embedding cosine against ingredient Jaccard
+        previous: Graph of the current artifact, whose unchanged rows are reused
+
+    Returns:
+        SimilarityGraph
+    """
+    from app.db.similarity_graph import SimilarityGraph
+
+    started = time.perf_counter()
+    positions = {doc_id: position for position, doc_id in enumerate(index.ids)}
+    vectors = index.vectors[[positions[doc_id] for doc_id in row_ids]]
+    graph = SimilarityGraph.build(
+        row_ids, vectors, [cocktail.ingredients for cocktail in cocktails], k, alpha, previous
+    )
+    print(
+        f"Built similarity graph over {len(graph)} cocktails in {time.perf_counter() - started:.2f}s"
+        + (" from the previous graph" if previous is not None else "")
+    )
+    return graph
+
+
+def build(
+    source: str = COCKTAILS_DATA,
+    root: str = INDEX_ARTIFACTS_PATH,
+    processes: Optional[int] = None,
+    chunk_size: int = 100,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    concurrency: int = 4,
+    keep: int = INDEX_KEEP_VERSIONS,
+    force: bool = False,
+    graph_k: int = SIMILARITY_GRAPH_K,
+    graph_alpha: float = SIMILARITY_GRAPH_ALPHA
+) -> str:
+    """
+    Build an index artifact and make it current
+
+    Args:
+        source: Dataset CSV, downloaded from Kaggle if missing
+        root: Artifacts root directory
+        processes: Parser processes, defaults to the CPU count
+        chunk_size: Records per parser task
+        batch_size: Texts per embedding call
+        concurrency: Embedding calls in flight at once
+        keep: Number of artifacts to keep
+        force: Write a new version even if nothing changed
+        graph_k: Neighbours per cocktail in the similarity graph
+        graph_alpha: Weight of embedding cosine against ingredient Jaccard in the graph
+
+    Returns:
+        Version of the current artifact
+    """
+    from app.db.embeddings import create_embeddings
+    from app.db.cocktail_index import CocktailIndex
+    from app.db.index_artifact import IndexArtifact, file_checksum
+
+    started = time.perf_counter()
+    if not os.path.exists(source) and not download_cocktail_data(source):
+        raise SystemExit(f"No dataset at {source}")
+
+    # Parse and format in parallel while the CSV is streamed in
+    chunks = iter_chunks(iter_records(source), chunk_size)
+    processes = processes or os.cpu_count() or 1
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(prepare_chunk, chunks))
+    else:
+        results = [prepare_chunk(chunk) for chunk in chunks]
+    prepared = [document for _, documents in results for document in documents]
+    if not prepared:
+        raise SystemExit(f"No cocktails in {source}")
+    cocktails = CocktailStore.concat([store for store, _ in results])
+
+    documents: Dict[str, PreparedDocument] = {}
+    for document in prepared:
+        documents.setdefault(document[0], document)
+    ids = list(documents)
+    print(f"Prepared {len(ids)} documents from {len(cocktails)} records with {processes} processes")
+
+    # Batches are sent concurrently from here, coalescing them behind one dispatcher would serialize them
+    embeddings = create_embeddings(batching=False)
+    # Local backends have no model name, their dimension tells versions apart
+    model = f"{EMBEDDING_BACKEND}:{getattr(embeddings, 'model', None) or EMBEDDING_DIM}"
+    # Graph rows are catalog rows, so row order and graph settings are part of the content
+    row_ids = [document[0] for document in prepared]
+    content_hash = hashlib.sha256(
+        "\n".join([model, f"graph:{graph_k}:{graph_alpha}"] + row_ids).encode("utf-8")
+    ).hexdigest()
+
+    os.makedirs(root, exist_ok=True)
+    current = IndexArtifact.current_version(root)
+    manifest = IndexArtifact.read_manifest(root, current) if current else None
+    if not force and manifest is not None and manifest.get("content_hash") == content_hash:
+        print(f"Index artifact {current} is up to date")
+        return current
+
+    # Only new or changed documents are embedded
+    previous = previous_artifact(root, model)
+    reused = (
+        {doc_id: previous.index.vectors[row] for row, doc_id in enumerate(previous.index.ids)}
+        if previous is not None else {}
+    )
+    missing = [doc_id for doc_id in ids if doc_id not in reused]
+    fresh = dict(zip(missing, embed_in_batches(
+        embeddings, [documents[doc_id][1] for doc_id in missing], batch_size, concurrency
+    )))
+    print(f"Embedded {len(missing)} documents, reused {len(ids) - len(missing)}")
+
+    index = CocktailIndex.build(
+        ids,
+        [fresh[doc_id] if doc_id in fresh else reused[doc_id] for doc_id in ids],
+        [documents[doc_id][1] for doc_id in ids],
+        [documents[doc_id][2] for doc_id in ids]
+    )
+    graph = build_similarity_graph(
+        index, row_ids, cocktails, graph_k, graph_alpha, previous.graph if previous is not None else None
+    )
+
+    version = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{content_hash[:8]}"
+    path = IndexArtifact.write(root, version, cocktails, index, {
+        "embedding_backend": EMBEDDING_BACKEND,
+        "embedding_model": model,
+        "content_hash": content_hash,
+        "similarity_graph": {"k": graph_k, "alpha": graph_alpha},
+        "source": {"path": os.path.basename(source), "sha256": file_checksum(source)}
+    }, graph)
+
+    deleted = IndexArtifact.prune(root, keep)
+    print(
+        f"Wrote index artifact {version} to {path} in {time.perf_counter() - started:.1f}s"
+        + (f", removed {len(deleted)} old versions" if deleted else "")
+    )
+    return version
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build a versioned cocktail index artifact")
+    parser.add_argument("--source", default=COCKTAILS_DATA, help="Dataset CSV")
+    parser.add_argument("--output", default=INDEX_ARTIFACTS_PATH, help="Artifacts root directory")
+    parser.add_argument("--processes", type=int, default=None, help="Parser processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Records per parser task")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Texts per embedding call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding calls in flight at once")
+    parser.add_argument("--keep", type=int, default=INDEX_KEEP_VERSIONS, help="Artifacts to keep")
+    parser.add_argument("--force", action="store_true", help="Write a new version even if nothing changed")
+    parser.add_argument("--graph-k", type=int, default=SIMILARITY_GRAPH_K, help="Neighbours per cocktail in the similarity graph")
+    parser.add_argument(
+        "--graph-alpha", type=float, default=SIMILARITY_GRAPH_ALPHA,
+        help="Weight of embedding cosine against ingredient Jaccard in the similarity graph"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    build(
+        source=args.source,
+        root=args.output,
+        processes=args.processes,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        keep=args.keep,
+        force=args.force,
+        graph_k=args.graph_k,
+        graph_alpha=args.graph_alpha
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,22 +7,114 @@ load_dotenv()
 # API Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
+# Point at benchmarks/mock_openai.py (e.g. http://localhost:8100/v1) to run without OpenAI
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE")
 
 # Vector DB Configuration
 VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./chroma_db")
+COCKTAIL_MANIFEST_PATH = os.path.join(VECTOR_DB_PATH, "cocktails_manifest.json")
+
+# Embedding Configuration
+# Backend is one of "openai", "local" (offline hashed n-grams) or "fake" (tests)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+# Send OpenAI embedding inputs as token ids, split at the model's context length. Needs
+# tiktoken's encoding, which is downloaded on first use, and servers other than OpenAI's
+# (like the mock) can't read token ids, so a custom OPENAI_API_BASE gets raw text
+EMBEDDING_TOKENIZE = os.getenv("EMBEDDING_TOKENIZE", "false" if OPENAI_API_BASE else "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(VECTOR_DB_PATH, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+# Coalesce concurrent embedding calls to the API into batches
+EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Batched embedding requests allowed in flight at once
+EMBEDDING_BATCH_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_BATCH_MAX_IN_FLIGHT", "4"))
+# Seconds a caller waits for its batch before giving up
+EMBEDDING_BATCH_TIMEOUT = float(os.getenv("EMBEDDING_BATCH_TIMEOUT", "30"))
+
+# In-memory cocktail index (serves search_cocktails without going through Chroma)
+COCKTAIL_INDEX_ENABLED = os.getenv("COCKTAIL_INDEX_ENABLED", "false").lower() == "true"
+COCKTAIL_INDEX_DIR = "cocktail_index"
+
+# Versioned index artifacts written by `python -m app.build_index`; the server loads the current one
+INDEX_ARTIFACTS_PATH = os.getenv("INDEX_ARTIFACTS_PATH", os.path.join(VECTOR_DB_PATH, "artifacts"))
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))
+# How often the server checks for a newer artifact; 0 disables hot reload
+INDEX_RELOAD_SECONDS = float(os.getenv("INDEX_RELOAD_SECONDS", "10"))
+# Cocktail similarity graph built into each artifact: neighbours per cocktail, and the weight
+# of embedding cosine against ingredient-set Jaccard in the blended score
+SIMILARITY_GRAPH_K = int(os.getenv("SIMILARITY_GRAPH_K", "10"))
+SIMILARITY_GRAPH_ALPHA = float(os.getenv("SIMILARITY_GRAPH_ALPHA", "0.7"))
+
+# Hybrid search: BM25 over the catalog alongside the vector search, merged by reciprocal-rank fusion
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+# Personalized re-ranking: over-fetch cocktail candidates and re-rank them by the user's
+# favorite ingredients (weighted against query relevance) and disliked ingredients
+PERSONALIZED_RERANK_ENABLED = os.getenv("PERSONALIZED_RERANK_ENABLED", "true").lower() == "true"
+PERSONALIZED_CANDIDATES = int(os.getenv("PERSONALIZED_CANDIDATES", "20"))
+PERSONALIZED_FAVORITE_WEIGHT = float(os.getenv("PERSONALIZED_FAVORITE_WEIGHT", "0.3"))
+
+# User memory Configuration
+USER_PREFERENCES_PATH = os.getenv("USER_PREFERENCES_PATH", os.path.join(VECTOR_DB_PATH, "user_preferences.sqlite3"))
+USER_PREFERENCES_FLUSH_SECONDS = float(os.getenv("USER_PREFERENCES_FLUSH_SECONDS", "1.0"))
+# Users idle this long, and the least recently used past the maximum, are dropped from memory
+USER_PREFERENCES_TTL = float(os.getenv("USER_PREFERENCES_TTL", "3600"))
+USER_PREFERENCES_MAX_USERS = int(os.getenv("USER_PREFERENCES_MAX_USERS", "10000"))
+DEFAULT_USER_ID = "anonymous"
+# Set by the multi-worker runner: workers send memory reads and writes to this local socket
+MEMORY_SERVICE_ADDRESS = os.getenv("MEMORY_SERVICE_ADDRESS")
+MEMORY_SERVICE_AUTHKEY = os.getenv("MEMORY_SERVICE_AUTHKEY", "")
 
 # Data paths
 DATA_DIR = os.getenv("DATA_DIR", "./data")
 COCKTAILS_DATA = os.path.join(DATA_DIR, "cocktails.csv")
+COCKTAILS_SNAPSHOT = os.path.join(DATA_DIR, "cocktails.snapshot")
 
 # RAG Configuration
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+CONTEXT_INSTRUCTIONS_TOKENS = int(os.getenv("CONTEXT_INSTRUCTIONS_TOKENS", "60"))
+
+# Response cache Configuration
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+# Conversation Configuration
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "300"))
+CONVERSATION_SUMMARIZE = os.getenv("CONVERSATION_SUMMARIZE", "true").lower() == "true"
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", "3600"))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
 
 # LLM Configuration
 TEMPERATURE = 0.7
 MAX_TOKENS = 1000
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "2.0"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "3500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "90000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8.0"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
 
 # Server Configuration
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", "8000"))
+# More than one worker runs the production mode: index once, then fork workers
+WORKERS = int(os.getenv("WORKERS", "1"))
+# Workers only read the prebuilt catalog and index snapshots
+INDEX_READ_ONLY = os.getenv("INDEX_READ_ONLY", "false").lower() == "true"
+
+# Metrics Configuration
+# Add a Server-Timing header with per-stage timings to API responses
+METRICS_TIMING_HEADERS = os.getenv("METRICS_TIMING_HEADERS", "false").lower() == "true"
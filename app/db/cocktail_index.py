@@ -0,0 +1,206 @@
+import os
+import json
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+# Metadata fields that get a precomputed boolean mask per distinct value
+FILTER_FIELDS = ("alcoholic", "category", "glass")
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.json"
+
+
+class CocktailIndex:
+    """
+    In-process exact nearest-neighbour index over the cocktail collection.
+
+    All embeddings live in one contiguous float32 matrix with L2-normalized
+    rows, so top-k is a single matrix-vector product plus argpartition.
+    Boolean masks over FILTER_FIELDS are built once at load time and narrow
+    the candidate rows before scoring. Snapshots are plain .npy files loaded
+    with mmap, so worker processes share the same physical pages.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        self.ids = ids
+        self.vectors = vectors
+        self.documents = documents
+        self.metadatas = metadatas
+        self.masks = self._build_masks(metadatas)
+
+    @classmethod
+    def build(
+        cls,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> "CocktailIndex":
+        """
+        Build an index from raw embeddings
+
+        Args:
+            ids: Document IDs
+            embeddings: Document embeddings
+            documents: Document texts
+            metadatas: Document metadata
+
+        Returns:
+            CocktailIndex
+        """
+        vectors = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return cls(list(ids), vectors, list(documents), list(metadatas))
+
+    @staticmethod
+    def _build_masks(metadatas: List[Dict[str, Any]]) -> Dict[str, Dict[str, np.ndarray]]:
+        masks: Dict[str, Dict[str, np.ndarray]] = {}
+        for field in FILTER_FIELDS:
+            field_masks: Dict[str, np.ndarray] = {}
+            for row, metadata in enumerate(metadatas):
+                value = str(metadata.get(field, "")).lower()
+                if value not in field_masks:
+                    field_masks[value] = np.zeros(len(metadatas), dtype=bool)
+                field_masks[value][row] = True
+            masks[field] = field_masks
+        return masks
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def mask_for(self, filter: Optional[Dict[str, str]]) -> Optional[np.ndarray]:
+        """
+        Combine the precomputed masks for a metadata filter
+
+        Args:
+            filter: Mapping of metadata field to required value
+
+        Returns:
+            Boolean row mask, or None if the filter is empty
+        """
+        if not filter:
+            return None
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, value in filter.items():
+            if field not in self.masks:
+                raise ValueError(f"Cannot filter on unindexed field: {field}")
+            field_mask = self.masks[field].get(str(value).lower())
+            if field_mask is None:
+                return np.zeros(len(self.ids), dtype=bool)
+            mask &= field_mask
+        return mask
+
+    def search(
+        self,
+        query_vector: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, str]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Find the rows most similar to a query vector
+
+        Args:
+            query_vector: Query embedding
+            k: Number of results to return
+            filter: Optional metadata filter
+
+        Returns:
+            List of (row, cosine similarity) pairs, best first
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        mask = self.mask_for(filter)
+        if mask is None:
+            rows = None
+            scores = self.vectors @ query
+        else:
+            rows = np.flatnonzero(mask)
+            scores = self.vectors[rows] @ query
+
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            return [(int(rows[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def similarity_search(
+        self,
+        query_vector: List[float],
+        k: int = 5,
+        filter: Optional[Dict[str, str]] = None
+    ) -> List[Document]:
+        """
+        Search the index and return matching documents
+
+        Args:
+            query_vector: Query embedding
+            k: Number of results to return
+            filter: Optional metadata filter
+
+        Returns:
+            List of similar cocktail documents
+        """
+        return [
+            Document(page_content=self.documents[row], metadata=self.metadatas[row])
+            for row, _ in self.search(query_vector, k=k, filter=filter)
+        ]
+
+    def save(self, path: str) -> None:
+        """
+        Write a snapshot of the index to a directory
+
+        Args:
+            path: Snapshot directory
+        """
+        os.makedirs(path, exist_ok=True)
+
+        vectors_tmp = os.path.join(path, f"{VECTORS_FILE}.tmp")
+        with open(vectors_tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype=np.float32))
+
+        documents_tmp = os.path.join(path, f"{DOCUMENTS_FILE}.tmp")
+        with open(documents_tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}, f)
+
+        os.replace(vectors_tmp, os.path.join(path, VECTORS_FILE))
+        os.replace(documents_tmp, os.path.join(path, DOCUMENTS_FILE))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["CocktailIndex"]:
+        """
+        Load a snapshot, memory-mapping the vector matrix
+
+        Args:
+            path: Snapshot directory
+
+        Returns:
+            CocktailIndex, or None if no usable snapshot exists
+        """
+        try:
+            with open(os.path.join(path, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        if vectors.ndim != 2 or vectors.shape[0] != len(data["ids"]):
+            return None
+
+        return cls(data["ids"], vectors, data["documents"], data["metadatas"])
@@ -0,0 +1,220 @@
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+from typing import List, Dict, Tuple, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+
+class Histogram:
+    """Counts of observed values in fixed buckets, each bucket an upper bound"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict[str, object]:
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "mean": round(self.total / self.count, 4) if self.count else 0.0,
+            "max": self.max
+        }
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent calls into batched requests
+
+    Callers block on a future while a dispatcher thread collects their texts.
+    A batch is sent once max_wait_ms have passed since its oldest text arrived
+    or max_batch_size texts are waiting, whichever comes first; identical texts
+    in a batch are embedded once. Batches are sent from a small pool, so up to
+    max_in_flight requests run at once; while all of them are busy, callers
+    keep queueing into the next batch. Calls larger than a batch (bulk
+    indexing) go straight to the wrapped model. A caller waits at most
+    timeout seconds for its batch; anything that goes wrong sending a batch,
+    including a response that doesn't line up with the texts, is raised to
+    every caller in it.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_wait_ms: float = 5.0,
+        max_batch_size: int = 64,
+        max_in_flight: int = 4,
+        timeout: float = 30.0
+    ):
+        self.embeddings = embeddings
+        # Keeps cache keys of a wrapping CachedEmbeddings unchanged
+        self.model = getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+
+        # (texts, future, arrival time) per waiting call, oldest first
+        self._queue: List[Tuple[List[str], Future, float]] = []
+        self._queued_texts = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._dispatcher: Optional[threading.Thread] = None
+        self._senders: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+        self.queue_depth = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self._stats = {"calls": 0, "batches": 0, "texts": 0, "deduplicated": 0, "bypassed": 0}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts as part of the next batch
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One vector per text
+        """
+        if not texts:
+            return []
+        if len(texts) <= self.max_batch_size:
+            future = self._submit(list(texts))
+            if future is not None:
+                try:
+                    return future.result(timeout=self.timeout)
+                finally:
+                    # No-op once resolved; otherwise the late result is dropped
+                    future.cancel()
+
+        with self._cond:
+            self._stats["bypassed"] += 1
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query text as part of the next batch"""
+        return self.embed_documents([text])[0]
+
+    def _submit(self, texts: List[str]) -> Optional[Future]:
+        # Returns None once closed, the caller then embeds directly
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                return None
+            if self._dispatcher is None:
+                self._senders = ThreadPoolExecutor(
+                    max_workers=self.max_in_flight, thread_name_prefix="embedding-batch"
+                )
+                self._dispatcher = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._dispatcher.start()
+            self._queue.append((texts, future, time.monotonic()))
+            self._queued_texts += len(texts)
+            self._stats["calls"] += 1
+            self._cond.notify()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+
+                # Wait for more callers until the batch is full or the oldest caller's window closes
+                deadline = self._queue[0][2] + self.max_wait
+                while self._queued_texts < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            # Only this thread takes from the queue, so it is still non-empty once a slot frees up
+            self._slots.acquire()
+            with self._cond:
+                self.queue_depth.observe(len(self._queue))
+                batch = []
+                size = 0
+                while self._queue and (not batch or size + len(self._queue[0][0]) <= self.max_batch_size):
+                    texts, future, _ = self._queue.pop(0)
+                    batch.append((texts, future))
+                    size += len(texts)
+                self._queued_texts -= size
+
+            self._senders.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: List[Tuple[List[str], Future]]) -> None:
+        try:
+            self._send(batch)
+        finally:
+            self._slots.release()
+
+    def _send(self, batch: List[Tuple[List[str], Future]]) -> None:
+        unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+        total = sum(len(texts) for texts, _ in batch)
+        with self._cond:
+            self.batch_size.observe(len(unique))
+            self._stats["batches"] += 1
+            self._stats["texts"] += len(unique)
+            self._stats["deduplicated"] += total - len(unique)
+
+        try:
+            embedded = self.embeddings.embed_documents(unique)
+            if len(embedded) != len(unique):
+                raise ValueError(f"Embedding model returned {len(embedded)} vectors for {len(unique)} texts")
+            vectors = dict(zip(unique, embedded))
+            for texts, future in batch:
+                self._resolve(future, [vectors[text] for text in texts])
+        except Exception as e:
+            for _, future in batch:
+                self._resolve(future, error=e)
+
+    @staticmethod
+    def _resolve(future: Future, result: Optional[List[List[float]]] = None, error: Optional[Exception] = None) -> None:
+        # Callers that timed out have cancelled their future, and failures
+        # after a partial fan-out only reach the futures still pending
+        if future.done():
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Get batching counters
+
+        Returns:
+            Dictionary with call and batch counts plus queue-depth and batch-size histograms
+        """
+        with self._cond:
+            stats: Dict[str, object] = dict(self._stats)
+            stats["queue_depth"] = self.queue_depth.snapshot()
+            stats["batch_size"] = self.batch_size.snapshot()
+        return stats
+
+    def close(self) -> None:
+        """Send anything still queued and stop the dispatcher"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._senders.shutdown(wait=True)
@@ -0,0 +1,151 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an in-process LRU tier and a SQLite tier on disk.
+
+    Vectors are keyed by (model, normalized text). The SQLite file runs in WAL
+    mode so several worker processes can read and write it concurrently.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache_path: str,
+        model: Optional[str] = None,
+        max_memory_entries: int = 4096
+    ):
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.max_memory_entries = max_memory_entries
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text so trivially different inputs share a cache entry"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of documents, calling the wrapped model only for cache misses
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of embeddings, in the same order as texts
+        """
+        normalized = [self.normalize(text) for text in texts]
+        keys = [self._key(text) for text in normalized]
+        results: Dict[str, List[float]] = {}
+
+        # Memory tier
+        with self._lock:
+            for key in keys:
+                if key in self._memory and key not in results:
+                    self._memory.move_to_end(key)
+                    results[key] = self._memory[key]
+                    self._stats["memory_hits"] += 1
+
+        # Disk tier
+        pending = list(dict.fromkeys(key for key in keys if key not in results))
+        if pending:
+            found = self._read_disk(pending)
+            with self._lock:
+                self._stats["disk_hits"] += len(found)
+                for key, vector in found.items():
+                    self._remember(key, vector)
+            results.update(found)
+
+        # Wrapped model, one batched call for everything still missing
+        missing = {}
+        for key, text in zip(keys, normalized):
+            if key not in results:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._write_disk(computed)
+            with self._lock:
+                self._stats["misses"] += len(computed)
+                for key, vector in computed.items():
+                    self._remember(key, vector)
+            results.update(computed)
+
+        return [results[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query, served from the cache when possible
+
+        Args:
+            text: Query text
+
+        Returns:
+            Embedding
+        """
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache hit/miss counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        return stats
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        # Caller holds self._lock
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _write_disk(self, vectors: Dict[str, List[float]]) -> None:
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in vectors.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
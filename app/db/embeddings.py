@@ -0,0 +1,166 @@
+import re
+import hashlib
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_DIM,
+    EMBEDDING_TOKENIZE,
+    OPENAI_API_KEY,
+    OPENAI_API_BASE,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_BATCH_ENABLED,
+    EMBEDDING_BATCH_WAIT_MS,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_MAX_IN_FLIGHT,
+    EMBEDDING_BATCH_TIMEOUT
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=65536)
+def _hash_feature(feature: str, dim: int) -> Tuple[int, float]:
+    """Map a feature to a (bucket, sign) pair that is stable across processes"""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, 1.0 if (digest >> 63) else -1.0
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local CPU embeddings built from hashed word and character n-gram counts.
+
+    Each batch is encoded into one sparse (row, bucket, sign) triplet list and
+    scattered into a dense float32 matrix with NumPy, then sublinear TF scaling
+    and L2 normalization are applied to the whole matrix at once. Needs no
+    network access and no fitted vocabulary, so query and document vectors
+    always live in the same space.
+    """
+
+    def __init__(self, dim: int = 512, char_ngram: int = 3):
+        self.dim = dim
+        self.char_ngram = char_ngram
+        self.model = f"hashing-{dim}-{char_ngram}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_RE.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        features.extend(f"b:{a}_{b}" for a, b in zip(words, words[1:]))
+
+        n = self.char_ngram
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(f"c:{padded[i:i + n]}" for i in range(max(len(padded) - n + 1, 1)))
+
+        return features
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode a batch of texts into a (len(texts), dim) float32 matrix
+
+        Args:
+            texts: Texts to encode
+
+        Returns:
+            Matrix of L2-normalized embeddings
+        """
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                bucket, sign = _hash_feature(feature, self.dim)
+                rows.append(row)
+                cols.append(bucket)
+                signs.append(sign)
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), np.asarray(signs, dtype=np.float32))
+
+        # Sublinear TF, keeping the sign from the hashing trick
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings for tests.
+
+    Every text maps to a unit vector drawn from a generator seeded by the text's
+    hash, so identical inputs always produce identical vectors.
+    """
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.model = f"fake-{dim}"
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def create_embeddings(backend: str = EMBEDDING_BACKEND, batching: bool = EMBEDDING_BATCH_ENABLED) -> Embeddings:
+    """
+    Create the embedding backend selected in the configuration
+
+    Args:
+        backend: One of "openai", "local" or "fake"
+        batching: Coalesce concurrent calls through BatchingEmbeddings; callers
+            that send their own batches, like the offline index build, turn it off
+
+    Returns:
+        Embeddings instance
+    """
+    backend = backend.lower()
+
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        from app.db.embedding_cache import CachedEmbeddings
+        from app.db.embedding_batcher import BatchingEmbeddings
+
+        embeddings = OpenAIEmbeddings(
+            openai_api_key=OPENAI_API_KEY,
+            openai_api_base=OPENAI_API_BASE,
+            check_embedding_ctx_length=EMBEDDING_TOKENIZE
+        )
+        if batching:
+            # Cache misses from concurrent requests are coalesced into batched API calls
+            embeddings = BatchingEmbeddings(
+                embeddings,
+                EMBEDDING_BATCH_WAIT_MS,
+                EMBEDDING_BATCH_SIZE,
+                EMBEDDING_BATCH_MAX_IN_FLIGHT,
+                EMBEDDING_BATCH_TIMEOUT
+            )
+
+        return CachedEmbeddings(
+            embeddings,
+            cache_path=EMBEDDING_CACHE_PATH,
+            max_memory_entries=EMBEDDING_CACHE_SIZE
+        )
+    if backend == "local":
+        return HashingEmbeddings(dim=EMBEDDING_DIM)
+    if backend == "fake":
+        return FakeEmbeddings(dim=EMBEDDING_DIM)
+
+    raise ValueError(f"Unknown embedding backend: {backend}")
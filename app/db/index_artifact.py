@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from typing import List, Dict, Any, Optional
+
+from app.db.cocktail_index import CocktailIndex
+from app.db.similarity_graph import SimilarityGraph
+from app.utils.cocktail_store import CocktailStore
+
+MANIFEST_FILE = "manifest.json"
+CATALOG_FILE = "cocktails.snapshot"
+GRAPH_FILE = "similarity_graph.npz"
+CURRENT_POINTER = "current"
+ARTIFACT_FORMAT = 1
+
+
+def file_checksum(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IndexArtifact:
+    """
+    One immutable, versioned build of the cocktail catalog and vector index
+
+    An artifact is a directory under the artifacts root named after its
+    version. It holds the catalog snapshot, the CocktailIndex snapshot, the
+    cocktail similarity graph and a manifest with the SHA-256 of every file.
+    Artifacts are written to a temporary directory and renamed into place,
+    then the "current" pointer file is replaced atomically, so readers only
+    ever see complete builds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        manifest: Dict[str, Any],
+        cocktails: CocktailStore,
+        index: CocktailIndex,
+        graph: Optional[SimilarityGraph] = None
+    ):
+        self.path = path
+        self.manifest = manifest
+        self.cocktails = cocktails
+        self.index = index
+        # Older artifacts have no similarity graph
+        self.graph = graph
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    @staticmethod
+    def current_version(root: str) -> Optional[str]:
+        """
+        Version named by the "current" pointer
+
+        Args:
+            root: Artifacts root directory
+
+        Returns:
+            Version, or None if nothing has been built yet
+        """
+        try:
+            with open(os.path.join(root, CURRENT_POINTER), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def read_manifest(root: str, version: str) -> Optional[Dict[str, Any]]:
+        """Manifest of one artifact, or None if it can't be read"""
+        try:
+            with open(os.path.join(root, version, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def write(
+        cls,
+        root: str,
+        version: str,
+        cocktails: CocktailStore,
+        index: CocktailIndex,
+        metadata: Dict[str, Any],
+        graph: Optional[SimilarityGraph] = None
+    ) -> str:
+        """
+        Write a new artifact and make it current
+
+        Args:
+            root: Artifacts root directory
+            version: Version name, also the directory name
+            cocktails: Catalog to snapshot
+            index: Vector index to snapshot
+            metadata: Extra manifest fields, e.g. the embedding backend
+            graph: Similarity graph over the catalog rows
+
+        Returns:
+            Path of the artifact directory
+        """
+        path = os.path.join(root, version)
+        tmp_path = os.path.join(root, f".tmp-{version}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        cocktails.save(os.path.join(tmp_path, CATALOG_FILE))
+        index.save(tmp_path)
+        if graph is not None:
+            graph.save(os.path.join(tmp_path, GRAPH_FILE))
+
+        files = {
+            name: file_checksum(os.path.join(tmp_path, name))
+            for name in sorted(os.listdir(tmp_path))
+        }
+        manifest = dict(metadata)
+        manifest.update({
+            "format": ARTIFACT_FORMAT,
+            "version": version,
+            "created_at": time.time(),
+            "count": len(index),
+            "files": files
+        })
+        with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, path)
+        cls.set_current(root, version)
+        return path
+
+    @staticmethod
+    def set_current(root: str, version: str) -> None:
+        """Atomically point "current" at a version"""
+        tmp_pointer = os.path.join(root, f"{CURRENT_POINTER}.tmp")
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pointer, os.path.join(root, CURRENT_POINTER))
+
+    @classmethod
+    def load(cls, root: str, version: str, verify: bool = True) -> "IndexArtifact":
+        """
+        Load an artifact, memory-mapping its snapshots
+
+        Args:
+            root: Artifacts root directory
+            version: Version to load
+            verify: Check every file against the manifest checksums
+
+        Returns:
+            IndexArtifact
+
+        Raises:
+            ValueError: If the artifact is incomplete or corrupt
+        """
+        path = os.path.join(root, version)
+        manifest = cls.read_manifest(root, version)
+        if manifest is None or manifest.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"No readable index artifact at {path}")
+
+        if verify:
+            for name, checksum in manifest["files"].items():
+                file_path = os.path.join(path, name)
+                if not os.path.exists(file_path) or file_checksum(file_path) != checksum:
+                    raise ValueError(f"Checksum mismatch for {name} in index artifact {version}")
+
+        cocktails = CocktailStore.load(os.path.join(path, CATALOG_FILE))
+        index = CocktailIndex.load(path)
+        if cocktails is None or index is None or len(index) != manifest["count"]:
+            raise ValueError(f"Index artifact {version} could not be loaded")
+
+        graph = None
+        if GRAPH_FILE in manifest["files"]:
+            graph = SimilarityGraph.load(os.path.join(path, GRAPH_FILE))
+            if graph is None or len(graph) != len(cocktails):
+                raise ValueError(f"Similarity graph of index artifact {version} could not be loaded")
+        return cls(path, manifest, cocktails, index, graph)
+
+    @classmethod
+    def load_current(cls, root: str, verify: bool = True) -> Optional["IndexArtifact"]:
+        """
+        Load the artifact the "current" pointer names
+
+        Args:
+            root: Artifacts root directory
+            verify: Check file checksums
+
+        Returns:
+            IndexArtifact, or None if nothing has been built yet
+        """
+        version = cls.current_version(root)
+        if version is None:
+            return None
+        return cls.load(root, version, verify)
+
+    @classmethod
+    def prune(cls, root: str, keep: int) -> List[str]:
+        """
+        Delete all but the newest keep artifacts, never the current one
+
+        Args:
+            root: Artifacts root directory
+            keep: Number of artifacts to keep
+
+        Returns:
+            Versions that were deleted
+        """
+        current = cls.current_version(root)
+        versions = []
+        for name in os.listdir(root):
+            manifest = cls.read_manifest(root, name) if not name.startswith(".") else None
+            if manifest is not None:
+                versions.append((manifest.get("created_at", 0), name))
+
+        deleted = []
+        for _, name in sorted(versions, reverse=True)[keep:]:
+            if name != current:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+                deleted.append(name)
+        return deleted
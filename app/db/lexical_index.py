@@ -0,0 +1,153 @@
+import re
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Words that carry no meaning in a cocktail query; ignored in queries and name lookups
+STOPWORDS = frozenset((
+    "a", "an", "and", "about", "can", "cocktail", "cocktails", "do", "drink", "drinks", "for", "how",
+    "i", "in", "is", "make", "me", "of", "please", "recipe", "show", "tell", "the", "to", "what", "with"
+))
+
+# Field weights: a match in the name counts more than one in the instructions
+FIELD_WEIGHTS = {"name": 3.0, "ingredients": 2.0, "instructions": 1.0}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens of a text"""
+    return _WORD_RE.findall(str(text).lower()) if text else []
+
+
+class BM25Index:
+    """
+    BM25 index over cocktail names, ingredients and instructions
+
+    Postings are stored in CSR form: for term t, doc_ids[indptr[t]:indptr[t+1]]
+    are the cocktails containing it and term_freqs the matching field-weighted
+    frequencies. Scoring a query is a few vectorized updates of one score array
+    per query term. Rows are catalog positions, so hits map straight back to
+    cocktails without any lookup.
+    """
+
+    def __init__(self, names: List[str], fields: List[Dict[str, List[str]]], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        vocabulary: Dict[str, int] = {}
+        postings: List[Dict[int, float]] = []
+        doc_lengths = np.zeros(len(fields), dtype=np.float32)
+        for row, doc_fields in enumerate(fields):
+            for field, tokens in doc_fields.items():
+                weight = FIELD_WEIGHTS[field]
+                doc_lengths[row] += weight * len(tokens)
+                for token in tokens:
+                    term_id = vocabulary.setdefault(token, len(vocabulary))
+                    if term_id == len(postings):
+                        postings.append({})
+                    postings[term_id][row] = postings[term_id].get(row, 0.0) + weight
+
+        self.vocabulary = vocabulary
+        self.indptr = np.zeros(len(postings) + 1, dtype=np.int32)
+        np.cumsum([len(rows) for rows in postings], out=self.indptr[1:])
+        self.doc_ids = np.fromiter(
+            (row for rows in postings for row in rows), dtype=np.int32, count=int(self.indptr[-1])
+        )
+        self.term_freqs = np.fromiter(
+            (freq for rows in postings for freq in rows.values()), dtype=np.float32, count=int(self.indptr[-1])
+        )
+
+        n_docs = len(fields)
+        doc_freqs = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        average_length = float(doc_lengths.mean()) if n_docs else 0.0
+        # Per-document part of the BM25 denominator, precomputed once
+        self._length_norm = (
+            k1 * (1 - b + b * doc_lengths / average_length) if average_length else np.full(n_docs, k1, np.float32)
+        ).astype(np.float32)
+
+        self._name_to_row: Dict[str, int] = {}
+        for row, name in enumerate(names):
+            key = self.normalize_name(name)
+            if key:
+                self._name_to_row.setdefault(key, row)
+
+    @classmethod
+    def from_catalog(cls, catalog) -> "BM25Index":
+        """
+        Build an index over every cocktail in the catalog
+
+        Args:
+            catalog: CocktailCatalog, whose parsed ingredient lists are reused
+
+        Returns:
+            BM25Index
+        """
+        names = []
+        fields = []
+        for cocktail, ingredients in zip(catalog.cocktails, catalog.ingredients):
+            name = str(cocktail.get("name", ""))
+            names.append(name)
+            fields.append({
+                "name": tokenize(name),
+                "ingredients": [token for ingredient in ingredients for token in tokenize(ingredient)],
+                "instructions": tokenize(cocktail.get("instructions", ""))
+            })
+        return cls(names, fields)
+
+    def __len__(self) -> int:
+        return len(self._length_norm)
+
+    @staticmethod
+    def normalize_name(text: str) -> str:
+        """Name or query reduced to its meaningful words, for exact-name lookups"""
+        return " ".join(token for token in tokenize(text) if token not in STOPWORDS)
+
+    def find_name(self, query: str) -> Optional[int]:
+        """
+        Get the row of the cocktail the query names exactly
+
+        Args:
+            query: Search query, e.g. "ABC" or "How do I make a Mojito?"
+
+        Returns:
+            Row of the cocktail, or None if the query is not just a cocktail name
+        """
+        key = self.normalize_name(query)
+        return self._name_to_row.get(key) if key else None
+
+    def search(self, query: str, k: int = 5, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Rank cocktails for a query
+
+        Args:
+            query: Search query
+            k: Number of results to return
+            mask: Optional boolean array of rows allowed in the results
+
+        Returns:
+            List of (row, score) pairs for rows matching at least one term, best first
+        """
+        if k <= 0:
+            return []
+
+        scores = np.zeros(len(self), dtype=np.float32)
+        for token in set(tokenize(query)) - STOPWORDS:
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            rows = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end]
+            # Rows are unique within a posting list, so fancy-index += is safe
+            scores[rows] += self.idf[term_id] * freqs * (self.k1 + 1) / (freqs + self._length_norm[rows])
+
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row), float(scores[row])) for row in order]
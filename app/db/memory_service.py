@@ -0,0 +1,258 @@
+import os
+import time
+import uuid
+import signal
+import threading
+from multiprocessing.connection import Listener, Client, Connection
+from typing import List, Dict, Any, Optional, Tuple
+
+from langchain.schema import Document
+
+from app.config import (
+    MODEL_NAME,
+    USER_PREFERENCES_TTL,
+    USER_PREFERENCES_MAX_USERS,
+    CONVERSATION_TOKEN_BUDGET,
+    CONVERSATION_SUMMARY_TOKENS,
+    CONVERSATION_TTL,
+    CONVERSATION_MAX_SESSIONS
+)
+from app.db.preference_store import UserPreferenceStore
+from app.llm.conversation import ConversationStore, ConversationSession, Turn
+
+# Calls a client may make, with the store they are served by
+PREFERENCE_METHODS = ("add", "get", "get_all", "flush")
+DOCUMENT_METHODS = ("add_document", "search_documents")
+CONVERSATION_METHODS = ("open_session", "append_turns", "begin_compaction", "finish_compaction")
+
+
+class MemoryService:
+    """
+    The single writer of user memories in multi-worker mode
+
+    Runs in its own process and owns the user preference database and the
+    free-text memory collection. Workers talk to it over a local socket
+    through MemoryServiceClient, so no two processes ever write to the same
+    files. Structured preferences are served from the service's in-memory
+    UserPreferenceStore, which keeps its write-behind flushing; free-text
+    memories arrive already embedded, so the service never calls an
+    embedding model.
+
+    It also holds the conversation sessions, so a follow-up message can be
+    served by any worker. Summaries are written by the workers, which call
+    the LLM; the service only picks the turns to fold in and swaps them for
+    the summary.
+    """
+
+    def __init__(self, preferences_path: str, memories_path: str, flush_interval: float = 1.0):
+        # Imported here so workers using the client never load Chroma for it
+        from langchain_chroma import Chroma
+
+        self.preference_store = UserPreferenceStore(
+            preferences_path, flush_interval, USER_PREFERENCES_TTL, USER_PREFERENCES_MAX_USERS
+        )
+        os.makedirs(memories_path, exist_ok=True)
+        self.memory_db = Chroma(
+            collection_name="user_memories",
+            embedding_function=None,
+            persist_directory=memories_path
+        )
+        self.conversations = ConversationStore(
+            MODEL_NAME,
+            token_budget=CONVERSATION_TOKEN_BUDGET,
+            summary_budget=CONVERSATION_SUMMARY_TOKENS,
+            ttl_seconds=CONVERSATION_TTL,
+            max_sessions=CONVERSATION_MAX_SESSIONS
+        )
+        # Connections are served on their own threads
+        self._conversation_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def add_document(self, text: str, metadata: Dict[str, Any], vector: List[float]) -> None:
+        """Store an embedded free-text memory"""
+        self.memory_db._collection.add(
+            ids=[str(uuid.uuid4())],
+            embeddings=[vector],
+            documents=[text],
+            metadatas=[metadata]
+        )
+
+    def search_documents(self, vector: List[float], k: int, user_id: str) -> List[Document]:
+        """Find a user's free-text memories closest to a query vector"""
+        return self.memory_db.similarity_search_by_vector(vector, k=k, filter={"user_id": user_id})
+
+    def open_session(self, session_id: Optional[str], user_id: str) -> ConversationSession:
+        """Get or create a user's conversation session"""
+        return self.conversations.get_or_create(session_id, user_id)
+
+    def append_turns(self, session_id: str, turns: List[Turn]) -> None:
+        """Append counted turns to a session, if it hasn't expired meanwhile"""
+        session = self.conversations.get(session_id)
+        if session is not None:
+            session.turns.extend(turns)
+            session.updated_at = time.monotonic()
+
+    def begin_compaction(self, session_id: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """Pick the turns of a session to summarize"""
+        session = self.conversations.get(session_id)
+        return self.conversations.begin_compaction(session) if session is not None else None
+
+    def finish_compaction(self, session_id: str, count: int, summary: Optional[str]) -> None:
+        """Swap the picked turns of a session for their summary"""
+        session = self.conversations.get(session_id)
+        if session is not None:
+            self.conversations.finish_compaction(session, count, summary)
+
+    def _handle(self, method: str, args: Tuple[Any, ...]) -> Any:
+        if method in PREFERENCE_METHODS:
+            return getattr(self.preference_store, method)(*args)
+        if method in DOCUMENT_METHODS:
+            return getattr(self, method)(*args)
+        if method in CONVERSATION_METHODS:
+            with self._conversation_lock:
+                return getattr(self, method)(*args)
+        raise ValueError(f"Unknown memory service call: {method}")
+
+    def _serve_connection(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ("ok", self._handle(method, args))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                conn.send(reply)
+
+    def _accept_loop(self, listener: Listener) -> None:
+        while not self._stop.is_set():
+            try:
+                conn = listener.accept()
+            except OSError:
+                # Listener closed on shutdown, or a client failed authentication
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def serve(self, address: str, authkey: bytes) -> None:
+        """
+        Serve clients until SIGTERM or SIGINT, then flush pending writes
+
+        Args:
+            address: Unix socket path to listen on
+            authkey: Shared secret clients must present
+        """
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: self._stop.set())
+
+        if os.path.exists(address):
+            os.remove(address)
+        listener = Listener(address, family="AF_UNIX", authkey=authkey)
+        threading.Thread(target=self._accept_loop, args=(listener,), daemon=True).start()
+        print(f"Memory service listening on {address}")
+
+        while not self._stop.wait(1.0):
+            pass
+
+        listener.close()
+        self.preference_store.close()
+        print("Memory service stopped")
+
+
+def run_memory_service(
+    address: str,
+    authkey: bytes,
+    preferences_path: str,
+    memories_path: str,
+    flush_interval: float = 1.0
+) -> None:
+    """Process entry point for the memory service"""
+    MemoryService(preferences_path, memories_path, flush_interval).serve(address, authkey)
+
+
+class MemoryServiceClient:
+    """
+    Worker-side handle on the memory service
+
+    Offers the UserPreferenceStore methods that VectorStore uses, plus calls
+    for embedded free-text memories and the conversation session calls of
+    SharedConversationStore. Each call borrows one of a small pool of
+    connections, so calls from different threads don't wait on each other.
+    """
+
+    def __init__(self, address: str, authkey: bytes, connect_timeout: float = 10.0):
+        self.address = address
+        self.authkey = authkey
+        self._idle: List[Connection] = []
+        self._lock = threading.Lock()
+
+        # The service may still be starting when the first worker comes up
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self._idle.append(self._connect())
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.1)
+
+    def _connect(self) -> Connection:
+        return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+
+    def _call(self, method: str, *args: Any) -> Any:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+
+        try:
+            conn.send((method, args))
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            conn.close()
+            raise
+
+        with self._lock:
+            self._idle.append(conn)
+        if status == "error":
+            raise RuntimeError(f"Memory service call {method} failed: {result}")
+        return result
+
+    def add(self, user_id: str, memory_type: str, content: str) -> bool:
+        return self._call("add", user_id, memory_type, content)
+
+    def get(self, user_id: str, memory_type: str) -> List[str]:
+        return self._call("get", user_id, memory_type)
+
+    def get_all(self, user_id: str) -> Dict[str, List[str]]:
+        return self._call("get_all", user_id)
+
+    def flush(self) -> None:
+        self._call("flush")
+
+    def add_document(self, text: str, metadata: Dict[str, Any], vector: List[float]) -> None:
+        self._call("add_document", text, metadata, vector)
+
+    def search_documents(self, vector: List[float], k: int, user_id: str) -> List[Document]:
+        return self._call("search_documents", vector, k, user_id)
+
+    def open_session(self, session_id: Optional[str], user_id: str) -> ConversationSession:
+        return self._call("open_session", session_id, user_id)
+
+    def append_turns(self, session_id: str, turns: List[Turn]) -> None:
+        self._call("append_turns", session_id, turns)
+
+    def begin_compaction(self, session_id: str) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        return self._call("begin_compaction", session_id)
+
+    def finish_compaction(self, session_id: str, count: int, summary: Optional[str]) -> None:
+        self._call("finish_compaction", session_id, count, summary)
+
+    def close(self) -> None:
+        """Close this worker's connections; the service keeps running"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
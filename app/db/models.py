@@ -9,12 +9,15 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     """Model for chat request"""
     message: str = Field(..., description="User message")
-    history: List[ChatMessage] = Field(default_factory=list, description="Chat history")
+    history: List[ChatMessage] = Field(default_factory=list, description="Chat history, only used without a session_id")
+    session_id: Optional[str] = Field(default=None, max_length=64, description="Server-side conversation session ID")
+    user_id: str = Field(default="anonymous", max_length=128, description="ID of the user or session the memories belong to")
 
 class ChatResponse(BaseModel):
     """Model for chat response"""
     message: str = Field(..., description="Assistant response")
     sources: Optional[List[str]] = Field(default=None, description="Sources used for the response")
+    session_id: Optional[str] = Field(default=None, description="Conversation session ID to send with the next message")
 
 class Memory(BaseModel):
     """Model for memory"""
@@ -29,4 +32,17 @@ class Cocktail(BaseModel):
     glass: str
     ingredients: List[str]
     measures: Optional[List[str]] = None
-    instructions: str
\ No newline at end of file
+    instructions: str
+
+    @classmethod
+    def from_view(cls, view) -> "Cocktail":
+        """Build from a CocktailView without re-validating the stored values"""
+        return cls.model_construct(
+            name=view.name,
+            category=view.category,
+            alcoholic=view.alcoholic,
+            glass=view.glass,
+            ingredients=view.ingredients,
+            measures=view.measures,
+            instructions=view.instructions
+        )
@@ -0,0 +1,140 @@
+from typing import List, Dict, Optional, Sequence
+
+import numpy as np
+from langchain.schema import Document
+
+from app.db.cocktail_index import CocktailIndex
+from app.utils.cocktail_parser import CocktailCatalog
+
+# Subtracted from the score of any cocktail with a disliked ingredient. Relevance
+# and favorite overlap stay well below it, so such cocktails always rank last
+DISLIKE_PENALTY = 10.0
+
+
+class PreferenceReranker:
+    """
+    Re-ranks cocktail candidates by a user's ingredient preferences
+
+    The catalog's cocktail x ingredient incidence matrix is kept in CSR form
+    (indptr and int32 column indices per catalog row). For a candidate list,
+    the user's favorites and dislikes become boolean masks over the ingredient
+    columns, and one gather plus two bincounts give every candidate's favorite
+    and disliked ingredient counts. The score is
+
+        relevance + favorite_weight * share of favorites matched - DISLIKE_PENALTY * has a dislike
+
+    where relevance is the candidate's cosine with the query when given the
+    query vector and the vector index is loaded, and its normalized rank in
+    the incoming list otherwise (hybrid results, whose fused order already
+    combines vector and BM25 evidence).
+    """
+
+    def __init__(
+        self,
+        catalog: CocktailCatalog,
+        rows: Sequence[Document],
+        index: Optional[CocktailIndex] = None,
+        favorite_weight: float = 0.3
+    ):
+        self.catalog = catalog
+        self.favorite_weight = favorite_weight
+        self.columns: Dict[str, int] = {name: column for column, name in enumerate(catalog.ingredient_names)}
+
+        row_columns = [
+            sorted({self.columns[name.lower()] for name in ingredients})
+            for ingredients in catalog.ingredients
+        ]
+        # A trailing empty row stands in for documents that are not catalog rows
+        self.indptr = np.zeros(len(row_columns) + 2, dtype=np.int64)
+        np.cumsum([len(columns) for columns in row_columns], out=self.indptr[1:-1])
+        self.indptr[-1] = self.indptr[-2]
+        self.indices = np.fromiter(
+            (column for columns in row_columns for column in columns), dtype=np.int32, count=int(self.indptr[-1])
+        )
+        self.empty_row = len(row_columns)
+
+        self.row_of: Dict[str, int] = {}
+        for row, document in enumerate(rows):
+            self.row_of.setdefault(document.metadata["id"], row)
+
+        # Vector index position of each catalog row, for query cosines
+        self.positions: Optional[np.ndarray] = None
+        if index is not None:
+            position_of = {doc_id: position for position, doc_id in enumerate(index.ids)}
+            self.positions = np.array(
+                [position_of.get(document.metadata["id"], -1) for document in rows], dtype=np.int64
+            )
+        self.index = index
+
+    def _mask(self, terms: List[str]) -> np.ndarray:
+        """Boolean mask of the ingredient columns the terms refer to"""
+        mask = np.zeros(max(1, len(self.columns)), dtype=bool)
+        for term in terms:
+            for name in self.catalog.ingredients_matching(term):
+                mask[self.columns[name]] = True
+        return mask
+
+    def _relevance(self, rows: np.ndarray, vector: Optional[List[float]]) -> np.ndarray:
+        """Query cosine of each candidate, or its normalized rank if cosines are unavailable"""
+        count = len(rows)
+        ranks = 1.0 - np.arange(count, dtype=np.float32) / max(count, 1)
+        if vector is None or self.positions is None or (rows == self.empty_row).any():
+            return ranks
+        positions = self.positions[rows]
+        if (positions < 0).any():
+            return ranks
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        return self.index.vectors[positions] @ query
+
+    def rerank(
+        self,
+        documents: List[Document],
+        favorites: List[str],
+        dislikes: List[str],
+        vector: Optional[List[float]] = None,
+        relevance: Optional[np.ndarray] = None
+    ) -> List[Document]:
+        """
+        Order candidates by relevance and the user's preferences
+
+        Args:
+            documents: Candidates, best first
+            favorites: User's favorite ingredients
+            dislikes: User's disliked ingredients
+            vector: Query embedding, if the query was embedded
+            relevance: Precomputed relevance per candidate, e.g. similarity graph weights
+
+        Returns:
+            The candidates, re-ranked
+        """
+        if not documents or not (favorites or dislikes):
+            return documents
+
+        rows = np.array(
+            [self.row_of.get(document.metadata.get("id"), self.empty_row) for document in documents],
+            dtype=np.int64
+        )
+        if relevance is None:
+            relevance = self._relevance(rows, vector)
+
+        # Gather every candidate's ingredient columns out of the CSR arrays in one go
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        owners = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        columns = self.indices[np.repeat(starts, lengths) + offsets]
+
+        score = np.asarray(relevance, dtype=np.float32).copy()
+        if favorites:
+            hits = np.bincount(owners, weights=self._mask(favorites)[columns], minlength=len(rows))
+            score += self.favorite_weight * np.minimum(hits / len(favorites), 1.0)
+        if dislikes:
+            hits = np.bincount(owners, weights=self._mask(dislikes)[columns], minlength=len(rows))
+            score -= DISLIKE_PENALTY * (hits > 0)
+
+        order = np.argsort(-score, kind="stable")
+        return [documents[i] for i in order]
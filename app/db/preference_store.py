@@ -0,0 +1,169 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple
+
+# Memory types held as structured preferences rather than free text
+STRUCTURED_TYPES = ("favorite_ingredient", "disliked_ingredient", "favorite_cocktail")
+
+
+class UserPreferenceStore:
+    """
+    Per-user memory store with write-behind persistence
+
+    Every user's memories live in a dict keyed by user ID, then by memory
+    type, so reading a user's favorites is a couple of dictionary lookups. A
+    user's rows are loaded from SQLite on first access. Writes update the
+    dict at once and are queued; a background thread flushes the queue to
+    SQLite every flush_interval seconds and on close(). SQLite stays the
+    source of truth: after each flush, users idle for longer than
+    ttl_seconds and the least recently used ones past max_users are dropped
+    from memory, and reloaded if they come back. Users with writes still
+    queued are never dropped.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        flush_interval: float = 1.0,
+        ttl_seconds: float = 3600,
+        max_users: int = 10000
+    ):
+        self.flush_interval = flush_interval
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+
+        # Ordered by last use, least recent first
+        self._users: "OrderedDict[str, Dict[str, List[str]]]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._pending: List[Tuple[str, str, str, float]] = []
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_memories ("
+            "user_id TEXT NOT NULL, type TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (user_id, type, content))"
+        )
+        self._conn.commit()
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="user-preference-flush", daemon=True)
+        self._flusher.start()
+
+    def _user(self, user_id: str) -> Dict[str, List[str]]:
+        # Caller holds self._lock
+        memories = self._users.get(user_id)
+        if memories is None:
+            memories = {}
+            rows = self._conn.execute(
+                "SELECT type, content FROM user_memories WHERE user_id = ? ORDER BY created_at",
+                (user_id,)
+            ).fetchall()
+            for memory_type, content in rows:
+                memories.setdefault(memory_type, []).append(content)
+            self._users[user_id] = memories
+        else:
+            self._users.move_to_end(user_id)
+        self._last_used[user_id] = time.monotonic()
+        return memories
+
+    def add(self, user_id: str, memory_type: str, content: str) -> bool:
+        """
+        Record a memory for a user
+
+        Args:
+            user_id: User ID
+            memory_type: Type of memory (e.g., "favorite_ingredient")
+            content: Memory content
+
+        Returns:
+            True if the memory is new, False if the user already had it
+        """
+        content = content.strip()
+        with self._lock:
+            values = self._user(user_id).setdefault(memory_type, [])
+            if content in values:
+                return False
+            values.append(content)
+            self._pending.append((user_id, memory_type, content, time.time()))
+            return True
+
+    def get(self, user_id: str, memory_type: str) -> List[str]:
+        """
+        Get a user's memories of one type, oldest first
+
+        Args:
+            user_id: User ID
+            memory_type: Type of memory
+
+        Returns:
+            List of memory contents
+        """
+        with self._lock:
+            return list(self._user(user_id).get(memory_type, ()))
+
+    def get_all(self, user_id: str) -> Dict[str, List[str]]:
+        """
+        Get all of a user's memories
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Dictionary of memory type to contents
+        """
+        with self._lock:
+            return {memory_type: list(values) for memory_type, values in self._user(user_id).items()}
+
+    def flush(self) -> None:
+        """Write queued memories to SQLite, then drop idle users from memory"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if pending:
+                try:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO user_memories (user_id, type, content, created_at) VALUES (?, ?, ?, ?)",
+                        pending
+                    )
+                    self._conn.commit()
+                except sqlite3.Error:
+                    # Keep the writes queued for the next attempt
+                    self._pending[:0] = pending
+                    raise
+            self._evict()
+
+    def _evict(self) -> None:
+        # Caller holds self._lock
+        cutoff = time.monotonic() - self.ttl_seconds
+        unsaved = {user_id for user_id, _, _, _ in self._pending}
+        for user_id in list(self._users):
+            if len(self._users) <= self.max_users and self._last_used[user_id] >= cutoff:
+                # Users are ordered by last use, everyone after this one is more recent
+                break
+            if user_id in unsaved:
+                continue
+            del self._users[user_id]
+            del self._last_used[user_id]
+
+    def __len__(self) -> int:
+        """Number of users held in memory"""
+        with self._lock:
+            return len(self._users)
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Error flushing user memories: {e}")
+
+    def close(self) -> None:
+        """Stop the background flusher and write anything still queued"""
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
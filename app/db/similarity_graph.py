@@ -0,0 +1,230 @@
+from typing import List, Dict, Optional, Sequence, Set
+
+import numpy as np
+
+# Rows scored per matrix product when building
+_BLOCK_ROWS = 512
+
+
+class SimilarityGraph:
+    """
+    k-nearest-neighbour graph over catalog rows in CSR form
+
+    Row i's neighbours are neighbors[indptr[i]:indptr[i + 1]], best first,
+    with their scores in the same slice of weights. A score blends the
+    cosine of the two cocktails' embeddings with the Jaccard similarity of
+    their ingredient sets: alpha * cosine + (1 - alpha) * jaccard. Rows keep
+    the document ID they were built from, so a rebuild only rescores rows
+    whose document changed and rows that lost a neighbour.
+    """
+
+    def __init__(
+        self,
+        ids: Sequence[str],
+        indptr: np.ndarray,
+        neighbors: np.ndarray,
+        weights: np.ndarray,
+        k: int,
+        alpha: float
+    ):
+        self.ids = list(ids)
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.weights = weights
+        self.k = k
+        self.alpha = alpha
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def neighbours_of(self, row: int, k: Optional[int] = None) -> np.ndarray:
+        """
+        Nearest neighbours of a row
+
+        Args:
+            row: Catalog row
+            k: Number of neighbours, at most the k the graph was built with
+
+        Returns:
+            Neighbour rows, best first
+        """
+        start, end = self.indptr[row], self.indptr[row + 1]
+        if k is not None:
+            end = min(end, start + k)
+        return self.neighbors[start:end]
+
+    @classmethod
+    def build(
+        cls,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        ingredients: Sequence[Sequence[str]],
+        k: int = 10,
+        alpha: float = 0.7,
+        previous: Optional["SimilarityGraph"] = None
+    ) -> "SimilarityGraph":
+        """
+        Build the graph, reusing a previous build where rows are unchanged
+
+        Args:
+            ids: Document ID of each catalog row
+            vectors: Embedding of each row
+            ingredients: Ingredient names of each row
+            k: Neighbours per row
+            alpha: Weight of embedding cosine against ingredient Jaccard
+            previous: Earlier graph built with the same k and alpha
+
+        Returns:
+            SimilarityGraph
+        """
+        scorer = _Scorer(ids, vectors, ingredients, alpha)
+        n = len(ids)
+        lists: List[Optional[np.ndarray]] = [None] * n
+        scores: List[Optional[np.ndarray]] = [None] * n
+
+        stale: Set[int] = set(range(n))
+        if previous is not None and previous.k == k and previous.alpha == alpha:
+            stale = cls._reuse(previous, ids, scorer, k, lists, scores)
+
+        stale_rows = sorted(stale)
+        for start in range(0, len(stale_rows), _BLOCK_ROWS):
+            block = np.asarray(stale_rows[start:start + _BLOCK_ROWS], dtype=np.int64)
+            block_scores = scorer.scores(block)
+            for row, row_scores in zip(block, block_scores):
+                lists[row], scores[row] = _top_k(np.arange(n), row_scores, k)
+
+        counts = np.fromiter((len(row_list) for row_list in lists), dtype=np.int64, count=n)
+        indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(counts, out=indptr[1:])
+        neighbors = np.concatenate(lists).astype(np.int32) if n else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate(scores).astype(np.float32) if n else np.zeros(0, dtype=np.float32)
+        return cls(ids, indptr, neighbors, weights, k, alpha)
+
+    @staticmethod
+    def _reuse(
+        previous: "SimilarityGraph",
+        ids: Sequence[str],
+        scorer: "_Scorer",
+        k: int,
+        lists: List[Optional[np.ndarray]],
+        scores: List[Optional[np.ndarray]]
+    ) -> Set[int]:
+        """
+        Carry unchanged rows over from a previous graph
+
+        Unchanged rows keep their old neighbours, merged with their scores
+        against new rows. Rows that lost a neighbour to a removed row, and
+        new rows, are returned to be scored in full.
+        """
+        old_rows: Dict[str, int] = {}
+        for row, doc_id in enumerate(previous.ids):
+            old_rows.setdefault(doc_id, row)
+        new_rows: Dict[str, int] = {}
+        for row, doc_id in enumerate(ids):
+            new_rows.setdefault(doc_id, row)
+
+        # Old row -> new row, -1 for removed rows
+        remap = np.array([new_rows.get(doc_id, -1) for doc_id in previous.ids], dtype=np.int64)
+        added = np.array([row for row, doc_id in enumerate(ids) if doc_id not in old_rows], dtype=np.int64)
+        stale = set(added.tolist())
+
+        # Scores of every row against the added rows, by symmetry of the score
+        added_scores = scorer.scores(added).T if len(added) else None
+
+        for row, doc_id in enumerate(ids):
+            old_row = old_rows.get(doc_id)
+            if old_row is None or row in stale:
+                continue
+            old_neighbours = remap[previous.neighbours_of(old_row)]
+            if (old_neighbours < 0).any() or (len(old_neighbours) < k and len(ids) > len(old_neighbours) + 1):
+                stale.add(row)
+                continue
+
+            start, end = previous.indptr[old_row], previous.indptr[old_row + 1]
+            candidates = old_neighbours
+            candidate_scores = previous.weights[start:end]
+            if added_scores is not None:
+                candidates = np.concatenate([candidates, added])
+                candidate_scores = np.concatenate([candidate_scores, added_scores[row]])
+            lists[row], scores[row] = _top_k(candidates, candidate_scores, k)
+        return stale
+
+    def save(self, path: str) -> None:
+        """Write the graph to an .npz file"""
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                ids=np.array(self.ids, dtype=str),
+                indptr=self.indptr,
+                neighbors=self.neighbors,
+                weights=self.weights,
+                k=np.int32(self.k),
+                alpha=np.float64(self.alpha)
+            )
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SimilarityGraph"]:
+        """
+        Load a graph written by save()
+
+        Args:
+            path: .npz file
+
+        Returns:
+            SimilarityGraph, or None if the file is missing or unreadable
+        """
+        try:
+            with np.load(path) as data:
+                return cls(
+                    data["ids"].tolist(),
+                    data["indptr"],
+                    data["neighbors"],
+                    data["weights"],
+                    int(data["k"]),
+                    float(data["alpha"])
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+class _Scorer:
+    """Blended cosine and Jaccard scores of some rows against all rows"""
+
+    def __init__(self, ids: Sequence[str], vectors: np.ndarray, ingredients: Sequence[Sequence[str]], alpha: float):
+        self.alpha = alpha
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+        vocabulary: Dict[str, int] = {}
+        sets = [{vocabulary.setdefault(name.lower(), len(vocabulary)) for name in names} for names in ingredients]
+        self.incidence = np.zeros((len(sets), max(1, len(vocabulary))), dtype=np.float32)
+        for row, columns in enumerate(sets):
+            self.incidence[row, list(columns)] = 1.0
+        self.sizes = self.incidence.sum(axis=1)
+
+        # Duplicate documents are never each other's neighbours
+        codes: Dict[str, int] = {}
+        self.codes = np.array([codes.setdefault(doc_id, len(codes)) for doc_id in ids], dtype=np.int64)
+
+    def scores(self, rows: np.ndarray) -> np.ndarray:
+        cosine = self.vectors[rows] @ self.vectors.T
+        shared = self.incidence[rows] @ self.incidence.T
+        union = self.sizes[rows][:, None] + self.sizes[None, :] - shared
+        jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+        scores = self.alpha * cosine + (1.0 - self.alpha) * jaccard
+        scores[self.codes[rows][:, None] == self.codes[None, :]] = -np.inf
+        return scores
+
+
+def _top_k(candidates: np.ndarray, scores: np.ndarray, k: int):
+    """The k best-scoring candidates and their scores, best first"""
+    valid = np.isfinite(scores)
+    candidates, scores = candidates[valid], scores[valid]
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        candidates, scores = candidates[top], scores[top]
+    order = np.argsort(-scores, kind="stable")
+    return candidates[order], scores[order]
@@ -1,26 +1,124 @@
 import os
+import json
+import asyncio
 import numpy as np
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.chat_models import ChatOpenAI
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Tuple
 from langchain_chroma import Chroma
 from langchain.schema import Document
 
-from app.config import VECTOR_DB_PATH, OPENAI_API_KEY
+from app.config import (
+    VECTOR_DB_PATH,
+    COCKTAIL_MANIFEST_PATH,
+    EMBEDDING_BACKEND,
+    COCKTAIL_INDEX_ENABLED,
+    COCKTAIL_INDEX_DIR,
+    HYBRID_SEARCH_ENABLED,
+    HYBRID_CANDIDATES,
+    HYBRID_RRF_K,
+    PERSONALIZED_RERANK_ENABLED,
+    PERSONALIZED_CANDIDATES,
+    PERSONALIZED_FAVORITE_WEIGHT,
+    USER_PREFERENCES_PATH,
+    USER_PREFERENCES_FLUSH_SECONDS,
+    USER_PREFERENCES_TTL,
+    USER_PREFERENCES_MAX_USERS,
+    DEFAULT_USER_ID,
+    MEMORY_SERVICE_ADDRESS,
+    MEMORY_SERVICE_AUTHKEY,
+    INDEX_READ_ONLY
+)
+from app.db.embeddings import create_embeddings
+from app.db.embedding_batcher import BatchingEmbeddings
+from app.db.cocktail_index import CocktailIndex
+from app.db.lexical_index import BM25Index
+from app.db.preference_store import UserPreferenceStore, STRUCTURED_TYPES
+from app.db.memory_service import MemoryServiceClient
+from app.db.index_artifact import IndexArtifact
+from app.db.similarity_graph import SimilarityGraph
+from app.db.personalization import PreferenceReranker
+from app.utils.metrics import metrics, stage
+from app.utils.cocktail_parser import (
+    CocktailCatalog,
+    get_cocktail_catalog,
+    format_cocktail,
+    cocktail_doc_id,
+    cocktail_metadata
+)
+
+COCKTAILS = "cocktails"
+USER_MEMORIES = "user_memories"
+# Cocktails similar to the one named by the query, from the similarity graph when possible
+SIMILAR_COCKTAILS = "similar_cocktails"
+
+
+@dataclass
+class SearchRequest:
+    """One search in a batch passed to VectorStore.search_batch"""
+    collection: str
+    query: str
+    k: int = 5
+    filter: Optional[Dict[str, str]] = None
+    user_id: str = DEFAULT_USER_ID
+    # Re-rank cocktail results by the user's favorite and disliked ingredients
+    personalize: bool = False
+
+
+@dataclass
+class CocktailSearchState:
+    """
+    Everything cocktail search reads, replaced as a whole when a new index is loaded
+    
+    A search takes the current state once and uses it throughout, so a hot
+    reload never mixes rankings from one index with rows of another.
+    """
+    # Optional in-process vector index; without it searches go to Chroma
+    index: Optional[CocktailIndex] = None
+    # Lexical side of hybrid search; rows are catalog positions
+    catalog: Optional[CocktailCatalog] = None
+    lexical_index: Optional[BM25Index] = None
+    rows: List[Document] = field(default_factory=list)
+    # Precomputed neighbours per catalog row, from the index artifact
+    graph: Optional[SimilarityGraph] = None
+    # Personalized re-ranking over catalog rows
+    reranker: Optional[PreferenceReranker] = None
+    # Index artifact version, if the state was loaded from one
+    version: Optional[str] = None
+
 
 class VectorStore:
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+        self.embeddings = create_embeddings()
         
         # Initialize vector stores for different collections
-        self.cocktail_db = self._init_vector_store("cocktails")
-        self.user_memory_db = self._init_vector_store("user_memories")
+        self.cocktail_db = self._init_vector_store(COCKTAILS)
+        
+        # In multi-worker mode one memory service process owns all user memories
+        self.memory_service: Optional[MemoryServiceClient] = None
+        self.user_memory_db: Optional[Chroma] = None
+        if MEMORY_SERVICE_ADDRESS:
+            self.memory_service = MemoryServiceClient(MEMORY_SERVICE_ADDRESS, MEMORY_SERVICE_AUTHKEY.encode("utf-8"))
+            self.preference_store = self.memory_service
+        else:
+            self.user_memory_db = self._init_vector_store(USER_MEMORIES)
+            # Structured per-user preferences, kept in memory and written behind to SQLite
+            self.preference_store = UserPreferenceStore(
+                USER_PREFERENCES_PATH, USER_PREFERENCES_FLUSH_SECONDS, USER_PREFERENCES_TTL, USER_PREFERENCES_MAX_USERS
+            )
+        
+        self.search_state = CocktailSearchState()
+    
+    @staticmethod
+    def _backend_path(name: str) -> str:
+        """Path under VECTOR_DB_PATH for data tied to the embedding backend"""
+        if EMBEDDING_BACKEND != "openai":
+            # Vectors from different backends are not comparable, keep them apart
+            return os.path.join(VECTOR_DB_PATH, EMBEDDING_BACKEND, name)
+        return os.path.join(VECTOR_DB_PATH, name)
     
     def _init_vector_store(self, collection_name: str) -> Chroma:
         """Initialize a vector store with the given collection name"""
-        persist_directory = os.path.join(VECTOR_DB_PATH, collection_name)
+        persist_directory = self._backend_path(collection_name)
         
         # Create directory if it doesn't exist
         os.makedirs(persist_directory, exist_ok=True)
@@ -31,105 +129,617 @@ class VectorStore:
             persist_directory=persist_directory
         )
     
-    def add_cocktails(self, cocktails: List[Dict[str, Any]]) -> None:
+    def add_cocktails(self, cocktails: List[Dict[str, Any]], build_index: bool = COCKTAIL_INDEX_ENABLED) -> None:
         """
         Add cocktails to the vector store
         
+        Documents are keyed by a hash of their formatted text, so only new or
+        changed cocktails are embedded and stale ones are removed. With
+        INDEX_READ_ONLY set, nothing is written: the collection and snapshots
+        must already match the cocktails.
+        
         Args:
             cocktails: List of cocktail dictionaries
+            build_index: Load the in-memory cocktail index, building its snapshot if needed
         """
-        documents = []
-        
-        for i, cocktail in enumerate(cocktails):
-            # Create a formatted string representation of the cocktail
-            cocktail_text = f"Name: {cocktail['name']}\n"
-            cocktail_text += f"Category: {cocktail['category']}\n"
-            cocktail_text += f"Alcoholic: {cocktail['alcoholic']}\n"
-            cocktail_text += f"Glass: {cocktail['glassType']}\n"
-            cocktail_text += f"Ingredients: {cocktail.get('ingredients', '')}\n"
-            cocktail_text += f"Ingredient Measures: {cocktail.get('ingredientMeasures', '')}\n"
-            cocktail_text += f"Instructions: {cocktail['instructions']}\n"
+        documents = {}
+        row_ids = []
+        
+        for cocktail in cocktails:
+            cocktail_text = format_cocktail(cocktail)
+            doc_id = cocktail_doc_id(cocktail_text)
+            row_ids.append(doc_id)
             
             # Create document
-            doc = Document(
-                page_content=cocktail_text,
-                metadata={
-                    "id": str(i),
-                    "name": cocktail['name'],
-                    "category": cocktail['category'],
-                    "alcoholic": cocktail['alcoholic'],
-                    "glass": cocktail['glassType'],
-                    "ingredients": cocktail.get('ingredients', ''),
-                    "measures": cocktail.get('ingredientMeasures', '')
-                }
-            )
+            documents[doc_id] = Document(page_content=cocktail_text, metadata=cocktail_metadata(cocktail, doc_id))
+        
+        if INDEX_READ_ONLY:
+            if self._load_manifest() != set(documents):
+                raise RuntimeError("Cocktail collection does not match the catalog; index it before starting workers")
+            print(f"Using prebuilt index of {len(documents)} cocktails")
+        else:
+            self._sync_cocktails(documents)
+        
+        state = CocktailSearchState()
+        if build_index:
+            state.index = self._load_cocktail_index(set(documents))
+        
+        # Lexical search and the personalized re-ranker both work on catalog rows
+        if HYBRID_SEARCH_ENABLED or PERSONALIZED_RERANK_ENABLED:
+            # Reuses the catalog built at load time, and its parsed ingredient lists
+            state.catalog = get_cocktail_catalog(cocktails)
+            state.rows = [documents[doc_id] for doc_id in row_ids]
+            if HYBRID_SEARCH_ENABLED:
+                state.lexical_index = BM25Index.from_catalog(state.catalog)
+            state.reranker = self._reranker(state)
+        self.search_state = state
+    
+    def load_artifact(self, artifact: IndexArtifact) -> None:
+        """
+        Serve cocktail search from a prebuilt index artifact
+        
+        Nothing is written or embedded. The new search state is built
+        completely before it replaces the old one, so this can run while
+        requests are being served.
+        
+        Args:
+            artifact: Loaded index artifact
+        """
+        index = artifact.index
+        state = CocktailSearchState(index=index, graph=artifact.graph, version=artifact.version)
+        
+        # Graph lookups and the re-ranker resolve names in the catalog and return its rows as well
+        if HYBRID_SEARCH_ENABLED or PERSONALIZED_RERANK_ENABLED or state.graph is not None:
+            positions = {doc_id: position for position, doc_id in enumerate(index.ids)}
+            documents: Dict[int, Document] = {}
+            for cocktail in artifact.cocktails:
+                position = positions[cocktail_doc_id(format_cocktail(cocktail))]
+                if position not in documents:
+                    documents[position] = Document(
+                        page_content=index.documents[position],
+                        metadata=index.metadatas[position]
+                    )
+                state.rows.append(documents[position])
+            state.catalog = get_cocktail_catalog(artifact.cocktails)
+            if HYBRID_SEARCH_ENABLED:
+                state.lexical_index = BM25Index.from_catalog(state.catalog)
+            state.reranker = self._reranker(state)
+        
+        self.search_state = state
+        print(f"Serving cocktail search from index artifact {artifact.version} ({len(index)} cocktails)")
+    
+    @staticmethod
+    def _reranker(state: CocktailSearchState) -> Optional[PreferenceReranker]:
+        """Personalized re-ranker over the state's catalog rows, if enabled"""
+        if not PERSONALIZED_RERANK_ENABLED:
+            return None
+        return PreferenceReranker(state.catalog, state.rows, state.index, PERSONALIZED_FAVORITE_WEIGHT)
+    
+    def _sync_cocktails(self, documents: Dict[str, Document]) -> None:
+        """Bring the cocktail collection and its manifest in line with the documents"""
+        indexed_ids = self._load_manifest()
+        if indexed_ids is None or len(indexed_ids) != self.cocktail_db._collection.count():
+            # Missing or out-of-date manifest: reconcile against the collection itself
+            indexed_ids = set(self.cocktail_db.get(include=[])["ids"])
+        
+        new_ids = [doc_id for doc_id in documents if doc_id not in indexed_ids]
+        stale_ids = [doc_id for doc_id in indexed_ids if doc_id not in documents]
+        
+        if stale_ids:
+            self.cocktail_db.delete(ids=stale_ids)
+        if new_ids:
+            self.cocktail_db.add_documents([documents[doc_id] for doc_id in new_ids], ids=new_ids)
+        
+        self._save_manifest(set(documents))
+        print(
+            f"Indexed {len(documents)} cocktails "
+            f"({len(new_ids)} added, {len(stale_ids)} removed, "
+            f"{len(documents) - len(new_ids)} unchanged)"
+        )
+    
+    def _load_cocktail_index(self, doc_ids: Set[str]) -> CocktailIndex:
+        """
+        Load the in-memory cocktail index, rebuilding the snapshot if it is stale
+        
+        Args:
+            doc_ids: IDs of the documents currently in the cocktail collection
             
-            documents.append(doc)
+        Returns:
+            CocktailIndex
+        """
+        index_path = self._backend_path(COCKTAIL_INDEX_DIR)
+        
+        index = CocktailIndex.load(index_path)
+        if index is not None and set(index.ids) == doc_ids:
+            print(f"Loaded cocktail index snapshot with {len(index)} cocktails")
+            return index
+        if INDEX_READ_ONLY:
+            raise RuntimeError(f"No up-to-date cocktail index snapshot in {index_path}")
         
-        # Add documents to vector store
-        self.cocktail_db.add_documents(documents)
-        print(f"Added {len(documents)} cocktails to vector store")
+        # Reuse the embeddings already stored in Chroma, nothing is re-embedded
+        data = self.cocktail_db.get(include=["embeddings", "documents", "metadatas"])
+        index = CocktailIndex.build(data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+        index.save(index_path)
+        print(f"Built cocktail index snapshot with {len(index)} cocktails")
+        
+        # Reload so this process uses the shared memory-mapped copy as well
+        return CocktailIndex.load(index_path) or index
+    
+    def _load_manifest(self) -> Optional[Set[str]]:
+        """Load the set of indexed cocktail document IDs, or None if there is no manifest"""
+        try:
+            with open(COCKTAIL_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("embedding_backend", "openai") != EMBEDDING_BACKEND:
+                return None
+            return set(manifest["ids"])
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _save_manifest(self, doc_ids: Set[str]) -> None:
+        """Atomically write the set of indexed cocktail document IDs"""
+        os.makedirs(os.path.dirname(COCKTAIL_MANIFEST_PATH) or ".", exist_ok=True)
+        tmp_path = f"{COCKTAIL_MANIFEST_PATH}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"embedding_backend": EMBEDDING_BACKEND, "ids": sorted(doc_ids)}, f)
+        os.replace(tmp_path, COCKTAIL_MANIFEST_PATH)
     
-    def search_cocktails(self, query: str, k: int = 5) -> List[Document]:
+    def search_cocktails(
+        self,
+        query: str,
+        k: int = 5,
+        filter: Optional[Dict[str, str]] = None
+    ) -> List[Document]:
         """
         Search for cocktails similar to the query
         
+        With hybrid search on, a query that is just a cocktail name ("ABC",
+        "how do I make a Mojito?") is answered from the BM25 index alone, with
+        no embedding call. Any other query runs both the vector and the BM25
+        search and merges their rankings by reciprocal-rank fusion.
+        
         Args:
             query: Search query
             k: Number of results to return
+            filter: Optional metadata filter on "alcoholic", "category" or "glass"
             
         Returns:
             List of similar cocktails
         """
-        return self.cocktail_db.similarity_search(query, k=k)
+        return self.search_batch([SearchRequest(COCKTAILS, query, k, filter)])[0]
     
-    def add_user_memory(self, memory_text: str, memory_type: str) -> None:
+    def search_batch(self, requests: List[SearchRequest]) -> List[List[Document]]:
         """
-        Add user memory to the vector store
+        Run several cocktail and user memory searches with one embedding call
+        
+        The query texts of every request that needs an embedding are embedded
+        together in one batch, then each search runs against its vector. Exact
+        cocktail name lookups, similarity graph lookups and users without
+        free-text memories need no embedding at all. Personalized cocktail
+        searches over-fetch candidates and re-rank them by the user's
+        favorite and disliked ingredients.
         
         Args:
-            memory_text: Memory text
-            memory_type: Type of memory (e.g., "favorite_ingredient", "favorite_cocktail")
+            requests: Searches to run, on COCKTAILS, SIMILAR_COCKTAILS or USER_MEMORIES
+            
+        Returns:
+            One result list per request, in request order
         """
-        document = Document(
-            page_content=memory_text,
-            metadata={"type": memory_type}
-        )
+        state = self.search_state
+        
+        memories = {
+            request.user_id: self.preference_store.get_all(request.user_id)
+            for request in requests
+            if request.collection == USER_MEMORIES or (request.personalize and state.reranker is not None)
+        }
         
-        self.user_memory_db.add_documents([document])
-        print(f"Added user memory of type {memory_type}: {memory_text}")
+        texts = []
+        for request in requests:
+            if request.collection == COCKTAILS:
+                needed = self._exact_cocktail_row(state, request.query, request.filter) is None
+            elif request.collection == SIMILAR_COCKTAILS:
+                needed = self._graph_row(state, request.query) is None
+            else:
+                needed = self._free_text_count(memories[request.user_id]) > 0
+            text = self._query_text(request)
+            if needed and text not in texts:
+                texts.append(text)
+        vectors = {}
+        if texts:
+            with stage("embedding"):
+                vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+        
+        results = []
+        with stage("search"):
+            for request in requests:
+                vector = vectors.get(self._query_text(request))
+                preferences = self._preferences(state, request, memories)
+                if request.collection == COCKTAILS:
+                    results.append(self._search_cocktails(
+                        state, request.query, request.k, request.filter, vector, preferences
+                    ))
+                elif request.collection == SIMILAR_COCKTAILS:
+                    results.append(self._similar_cocktails(state, request.query, request.k, vector, preferences))
+                else:
+                    results.append(self._search_user_memories(request.k, request.user_id, memories[request.user_id], vector))
+        return results
     
-    def get_user_memories(self, query: str, k: int = 5) -> List[Document]:
+    async def asearch_batch(self, requests: List[SearchRequest]) -> List[List[Document]]:
         """
-        Get user memories similar to the query
+        Run several searches with one embedding call without blocking the event loop
+        
+        Args:
+            requests: Searches to run, on COCKTAILS, SIMILAR_COCKTAILS or USER_MEMORIES
+            
+        Returns:
+            One result list per request, in request order
+        """
+        return await asyncio.to_thread(self.search_batch, requests)
+    
+    @staticmethod
+    def _query_text(request: SearchRequest) -> str:
+        """Text embedded for a request that needs an embedding"""
+        if request.collection == SIMILAR_COCKTAILS:
+            return f"Cocktail similar to {request.query}"
+        return request.query
+    
+    @staticmethod
+    def _preferences(
+        state: CocktailSearchState,
+        request: SearchRequest,
+        memories: Dict[str, Dict[str, List[str]]]
+    ) -> Optional[Tuple[List[str], List[str]]]:
+        """(favorite, disliked) ingredients to re-rank a request's results by, or None to leave them as they are"""
+        if not request.personalize or state.reranker is None or request.user_id not in memories:
+            return None
+        favorites = memories[request.user_id].get("favorite_ingredient", [])
+        dislikes = memories[request.user_id].get("disliked_ingredient", [])
+        if not favorites and not dislikes:
+            return None
+        return favorites, dislikes
+    
+    @staticmethod
+    def _graph_row(state: CocktailSearchState, name: str) -> Optional[int]:
+        """Catalog row of the named cocktail, if the similarity graph can answer for it"""
+        if state.graph is None or state.catalog is None:
+            return None
+        return state.catalog.find_by_name(name)
+    
+    def _similar_cocktails(
+        self,
+        state: CocktailSearchState,
+        name: str,
+        k: int,
+        vector: Optional[List[float]],
+        preferences: Optional[Tuple[List[str], List[str]]] = None
+    ) -> List[Document]:
+        """
+        The named cocktail followed by its nearest neighbours
+        
+        Read straight off the similarity graph, O(k) once the name resolves.
+        With preferences, all of the graph's neighbours are re-ranked with
+        their graph scores as relevance. Without a graph, or for names not in
+        the catalog, this falls back to a cocktail search for "Cocktail
+        similar to <name>".
+        """
+        row = self._graph_row(state, name)
+        if row is None:
+            return self._search_cocktails(state, f"Cocktail similar to {name}", k, None, vector, preferences)
+        
+        metrics.inc("cocktail_events_total", event="similarity_graph")
+        if preferences is None:
+            neighbours = [state.rows[hit] for hit in state.graph.neighbours_of(row, k)]
+        else:
+            start, end = state.graph.indptr[row], state.graph.indptr[row + 1]
+            neighbours = state.reranker.rerank(
+                [state.rows[hit] for hit in state.graph.neighbors[start:end]],
+                *preferences,
+                relevance=state.graph.weights[start:end]
+            )[:k]
+        return self._unique_documents([state.rows[row]] + neighbours)
+    
+    @staticmethod
+    def _exact_cocktail_row(state: CocktailSearchState, query: str, filter: Optional[Dict[str, str]]) -> Optional[int]:
+        """Catalog row of the cocktail the query names exactly, if it passes the filter"""
+        if state.lexical_index is None:
+            return None
+        row = state.lexical_index.find_name(query)
+        if row is None or (filter and row not in state.catalog.query(**filter)):
+            return None
+        return row
+    
+    def _search_cocktails(
+        self,
+        state: CocktailSearchState,
+        query: str,
+        k: int,
+        filter: Optional[Dict[str, str]],
+        vector: Optional[List[float]],
+        preferences: Optional[Tuple[List[str], List[str]]] = None
+    ) -> List[Document]:
+        """
+        Search cocktails, using the query embedding if one was computed
+        
+        With preferences, PERSONALIZED_CANDIDATES results are fetched and
+        re-ranked by the user's favorite and disliked ingredients before the
+        top k are kept. A query naming a cocktail exactly is not re-ranked.
+        """
+        fetch = k if preferences is None else max(k, PERSONALIZED_CANDIDATES)
+        
+        if state.lexical_index is None:
+            documents = self._vector_search(state, query, fetch, filter, vector)
+            if preferences is not None:
+                documents = state.reranker.rerank(documents, *preferences, vector=vector)
+            return documents[:k]
+        
+        mask = self._lexical_mask(state, filter)
+        
+        row = self._exact_cocktail_row(state, query, filter)
+        if row is not None:
+            metrics.inc("cocktail_events_total", event="lexical_fast_path")
+            rows = [row] + [hit for hit, _ in state.lexical_index.search(query, k, mask)]
+            return self._unique_documents(state.rows[hit] for hit in rows)[:k]
+        
+        metrics.inc("cocktail_events_total", event="hybrid_search")
+        candidates = max(fetch, HYBRID_CANDIDATES)
+        vector_docs = self._vector_search(state, query, candidates, filter, vector)
+        lexical_docs = [state.rows[hit] for hit, _ in state.lexical_index.search(query, candidates, mask)]
+        documents = self._fuse_rankings([vector_docs, lexical_docs])[:fetch]
+        if preferences is not None:
+            # The fused order is the relevance, it already reflects the vector ranking
+            documents = state.reranker.rerank(documents, *preferences)
+        return documents[:k]
+    
+    def _vector_search(
+        self,
+        state: CocktailSearchState,
+        query: str,
+        k: int,
+        filter: Optional[Dict[str, str]],
+        vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        """Embedding similarity search over the cocktail collection"""
+        if vector is None:
+            vector = self.embeddings.embed_query(query)
+        
+        if state.index is not None:
+            return state.index.similarity_search(vector, k=k, filter=filter)
+        
+        if filter and len(filter) > 1:
+            # Chroma needs an explicit $and for more than one condition
+            filter = {"$and": [{field: value} for field, value in filter.items()]}
+        return self.cocktail_db.similarity_search_by_vector(vector, k=k, filter=filter)
+    
+    @staticmethod
+    def _lexical_mask(state: CocktailSearchState, filter: Optional[Dict[str, str]]) -> Optional[np.ndarray]:
+        """Boolean array of catalog rows passing the metadata filter"""
+        if not filter:
+            return None
+        mask = np.zeros(len(state.catalog), dtype=bool)
+        mask[state.catalog.query(**filter)] = True
+        return mask
+    
+    @staticmethod
+    def _unique_documents(documents) -> List[Document]:
+        """Drop repeated documents, keeping the first occurrence"""
+        seen = set()
+        unique = []
+        for document in documents:
+            if document.metadata["id"] not in seen:
+                seen.add(document.metadata["id"])
+                unique.append(document)
+        return unique
+    
+    @staticmethod
+    def _fuse_rankings(rankings: List[List[Document]]) -> List[Document]:
+        """
+        Merge ranked result lists by reciprocal-rank fusion
+        
+        Each document scores the sum of 1 / (HYBRID_RRF_K + rank) over the lists
+        it appears in, so agreement between lists outweighs one high rank.
+        
+        Args:
+            rankings: Result lists, best first
+            
+        Returns:
+            Documents ordered by fused score
+        """
+        scores: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        for ranking in rankings:
+            for rank, document in enumerate(VectorStore._unique_documents(ranking), start=1):
+                doc_id = document.metadata["id"]
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (HYBRID_RRF_K + rank)
+                documents.setdefault(doc_id, document)
+        return [documents[doc_id] for doc_id in sorted(scores, key=scores.get, reverse=True)]
+    
+    async def asearch_cocktails(
+        self,
+        query: str,
+        k: int = 5,
+        filter: Optional[Dict[str, str]] = None
+    ) -> List[Document]:
+        """
+        Search for cocktails similar to the query without blocking the event loop
         
         Args:
             query: Search query
             k: Number of results to return
+            filter: Optional metadata filter on "alcoholic", "category" or "glass"
             
         Returns:
-            List of similar memories
+            List of similar cocktails
+        """
+        return await asyncio.to_thread(self.search_cocktails, query, k, filter)
+    
+    def add_user_memory(self, memory_text: str, memory_type: str, user_id: str = DEFAULT_USER_ID) -> None:
+        """
+        Add user memory
+        
+        Structured preferences go to the per-user preference store. Any other
+        memory is free text and is also embedded for similarity search.
+        
+        Args:
+            memory_text: Memory text; for structured preferences, just the value (e.g. "rum")
+            memory_type: Type of memory (e.g., "favorite_ingredient", "favorite_cocktail")
+            user_id: User the memory belongs to
+        """
+        if not self.preference_store.add(user_id, memory_type, memory_text):
+            return
+        
+        if memory_type not in STRUCTURED_TYPES:
+            metadata = {"type": memory_type, "user_id": user_id}
+            if self.memory_service is not None:
+                self.memory_service.add_document(memory_text, metadata, self.embeddings.embed_query(memory_text))
+            else:
+                self.user_memory_db.add_documents([Document(page_content=memory_text, metadata=metadata)])
+        
+        print(f"Added user memory of type {memory_type} for {user_id}: {memory_text}")
+    
+    async def aadd_user_memory(self, memory_text: str, memory_type: str, user_id: str = DEFAULT_USER_ID) -> None:
+        """
+        Add user memory without blocking the event loop
+        
+        Args:
+            memory_text: Memory text; for structured preferences, just the value (e.g. "rum")
+            memory_type: Type of memory (e.g., "favorite_ingredient", "favorite_cocktail")
+            user_id: User the memory belongs to
         """
-        return self.user_memory_db.similarity_search(query, k=k)
+        await asyncio.to_thread(self.add_user_memory, memory_text, memory_type, user_id)
     
-    def get_favorite_ingredients(self) -> List[str]:
+    def get_user_memories(self, query: str, k: int = 5, user_id: str = DEFAULT_USER_ID) -> List[Document]:
+        """
+        Get a user's memories relevant to the query
+        
+        Structured preferences are returned directly; only the user's free-text
+        memories go through similarity search, and only if there are any.
+        
+        Args:
+            query: Search query
+            k: Number of free-text memories to return
+            user_id: User whose memories to search
+            
+        Returns:
+            List of memories
+        """
+        return self.search_batch([SearchRequest(USER_MEMORIES, query, k, user_id=user_id)])[0]
+    
+    @staticmethod
+    def _free_text_count(memories: Dict[str, List[str]]) -> int:
+        return sum(len(values) for memory_type, values in memories.items() if memory_type not in STRUCTURED_TYPES)
+    
+    def _search_user_memories(
+        self,
+        k: int,
+        user_id: str,
+        memories: Dict[str, List[str]],
+        vector: Optional[List[float]]
+    ) -> List[Document]:
+        """Render a user's structured memories and search the free-text ones by vector"""
+        documents = [
+            Document(page_content=f"My {memory_type} is {content}", metadata={"type": memory_type, "user_id": user_id})
+            for memory_type in STRUCTURED_TYPES
+            for content in memories.get(memory_type, ())
+        ]
+        
+        free_text_count = self._free_text_count(memories)
+        if free_text_count and vector is not None:
+            if self.memory_service is not None:
+                documents.extend(self.memory_service.search_documents(vector, min(k, free_text_count), user_id))
+            else:
+                documents.extend(self.user_memory_db.similarity_search_by_vector(
+                    vector, k=min(k, free_text_count), filter={"user_id": user_id}
+                ))
+        
+        return documents
+    
+    async def aget_user_memories(self, query: str, k: int = 5, user_id: str = DEFAULT_USER_ID) -> List[Document]:
+        """
+        Get a user's memories relevant to the query without blocking the event loop
+        
+        Args:
+            query: Search query
+            k: Number of free-text memories to return
+            user_id: User whose memories to search
+            
+        Returns:
+            List of memories
+        """
+        return await asyncio.to_thread(self.get_user_memories, query, k, user_id)
+    
+    def get_favorite_ingredients(self, user_id: str = DEFAULT_USER_ID) -> List[str]:
         """
         Get user's favorite ingredients
         
+        Args:
+            user_id: User ID
+            
         Returns:
             List of favorite ingredients
         """
-        memories = self.user_memory_db.similarity_search("favorite ingredients", k=10)
-        ingredients = []
+        return self.preference_store.get(user_id, "favorite_ingredient")
+    
+    def get_disliked_ingredients(self, user_id: str = DEFAULT_USER_ID) -> List[str]:
+        """
+        Get user's disliked ingredients
         
-        for memory in memories:
-            if memory.metadata.get("type") == "favorite_ingredient":
-                # Extract ingredient name from memory text
-                content = memory.page_content.lower()
-                if "favorite" in content and "ingredient" in content:
-                    # Try to extract the ingredient from the text
-                    parts = content.split("is ")
-                    if len(parts) > 1:
-                        ingredients.append(parts[1].strip())
+        Args:
+            user_id: User ID
+            
+        Returns:
+            List of disliked ingredients
+        """
+        return self.preference_store.get(user_id, "disliked_ingredient")
+    
+    async def aget_favorite_ingredients(self, user_id: str = DEFAULT_USER_ID) -> List[str]:
+        """
+        Get user's favorite ingredients without blocking the event loop
         
-        return ingredients
+        The local preference store is an in-memory read, so it runs inline;
+        through the memory service it is a socket round trip, run in a thread.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            List of favorite ingredients
+        """
+        if self.memory_service is not None:
+            return await asyncio.to_thread(self.get_favorite_ingredients, user_id)
+        return self.get_favorite_ingredients(user_id)
+    
+    def close(self) -> None:
+        """Flush pending user memories to disk (or disconnect from the memory service) and stop the embedding batcher"""
+        self.preference_store.close()
+        batcher = self._embedding_batcher()
+        if batcher is not None:
+            batcher.close()
+    
+    def get_embedding_cache_stats(self) -> Dict[str, int]:
+        """
+        Get embedding cache hit/miss counters
+        
+        Returns:
+            Dictionary of cache counters, empty if the backend is not cached
+        """
+        stats = getattr(self.embeddings, "stats", None)
+        return stats() if stats else {}
+    
+    def _embedding_batcher(self) -> Optional[BatchingEmbeddings]:
+        """The batching layer of the embedding backend, if it has one"""
+        embeddings = self.embeddings
+        while embeddings is not None:
+            if isinstance(embeddings, BatchingEmbeddings):
+                return embeddings
+            embeddings = getattr(embeddings, "embeddings", None)
+        return None
+    
+    def get_embedding_batch_stats(self) -> Dict[str, Any]:
+        """
+        Get embedding batching counters and histograms
+        
+        Returns:
+            Dictionary of batch counters, empty if the backend is not batched
+        """
+        batcher = self._embedding_batcher()
+        return batcher.stats() if batcher else {}
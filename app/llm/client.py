@@ -0,0 +1,323 @@
+import time
+import random
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+import httpx
+import openai
+from langchain.schema import BaseMessage
+
+from app.llm.errors import LLMOverloaded
+from app.utils.tokens import count_tokens
+from app.utils.metrics import metrics
+
+# Errors worth another attempt: rate limits, timeouts, dropped connections and 5xx
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError
+)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute
+
+    Callers reserve capacity up front and are told how long to wait for it,
+    which lets the same bucket serve threads (time.sleep) and coroutines
+    (asyncio.sleep). The balance may go negative; that debt is what later
+    callers wait out.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        # Caller holds self._lock
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until amount would be available, without reserving it"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (min(amount, self.capacity) - self._tokens) / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take amount from the bucket
+
+        Args:
+            amount: Capacity to take, capped at the bucket size
+
+        Returns:
+            Seconds the caller must wait before using it
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+
+class LLMClient:
+    """
+    Shared admission control and retry policy for every LLM call
+
+    One pooled HTTP client (sync and async) is shared by every request, so
+    the calls of a turn reuse warm connections. Each call estimates its tokens
+    (prompt plus max_tokens) and reserves them, plus one request, from the
+    requests/min and tokens/min buckets. At most max_concurrency calls are in
+    flight. A call that would wait longer than queue_timeout for a slot or
+    for rate-limit capacity, or that arrives with max_queue calls already
+    waiting, fails fast with LLMOverloaded so the API can answer 503.
+    Retryable errors are retried with exponential backoff and full jitter,
+    honouring Retry-After when the server sends one.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_output_tokens: int,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        queue_timeout: float = 2.0,
+        requests_per_minute: float = 3500,
+        tokens_per_minute: float = 90000,
+        max_retries: int = 3,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 8.0,
+        request_timeout: float = 30.0,
+        max_connections: int = 32
+    ):
+        self.model_name = model_name
+        self.max_output_tokens = max_output_tokens
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.request_timeout = request_timeout
+
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._sync_slots = threading.BoundedSemaphore(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "shed": 0, "throttled_seconds": 0.0}
+
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.http_client = httpx.Client(limits=limits, timeout=request_timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=request_timeout)
+
+    def openai_clients(self, api_key: Optional[str], base_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        OpenAI chat completion clients on the shared connection pool
+
+        Retries are left to this class, so the SDK's own are disabled.
+
+        Args:
+            api_key: OpenAI API key
+            base_url: Optional API base URL
+
+        Returns:
+            Keyword arguments "client" and "async_client" for ChatOpenAI
+        """
+        params = {"api_key": api_key, "base_url": base_url, "max_retries": 0, "timeout": self.request_timeout}
+        return {
+            "client": openai.OpenAI(http_client=self.http_client, **params).chat.completions,
+            "async_client": openai.AsyncOpenAI(http_client=self.http_async_client, **params).chat.completions
+        }
+
+    def _estimate_tokens(self, messages: List[BaseMessage]) -> int:
+        prompt = sum(count_tokens(str(message.content), self.model_name) for message in messages)
+        return prompt + self.max_output_tokens
+
+    def saturated(self) -> bool:
+        """True if a new call would be shed right away"""
+        with self._lock:
+            return self._in_flight >= self.max_concurrency and self._waiting >= self.max_queue
+
+    def _shed(self, reason: str, retry_after: float) -> LLMOverloaded:
+        with self._lock:
+            self._stats["shed"] += 1
+        return LLMOverloaded(f"LLM capacity exhausted: {reason}", retry_after=max(1.0, retry_after))
+
+    def _rate_limit_delay(self, messages: List[BaseMessage]) -> float:
+        """Reserve rate-limit capacity for a call and return how long to wait for it"""
+        tokens = self._estimate_tokens(messages)
+        metrics.inc("cocktail_llm_tokens_total", tokens - self.max_output_tokens, type="prompt")
+        delay = max(self.request_bucket.delay_for(1), self.token_bucket.delay_for(tokens))
+        if delay > self.queue_timeout:
+            raise self._shed("rate limit", delay)
+
+        delay = max(self.request_bucket.reserve(1), self.token_bucket.reserve(tokens))
+        with self._lock:
+            self._stats["throttled_seconds"] += delay
+        return delay
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.retry_max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    async def _acquire(self) -> None:
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+
+        with self._lock:
+            if self._in_flight >= self.max_concurrency and self._waiting >= self.max_queue:
+                shed = True
+            else:
+                shed = False
+                self._waiting += 1
+        if shed:
+            raise self._shed("too many queued calls", self.queue_timeout)
+
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._shed("no free slot", self.queue_timeout) from None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        with self._lock:
+            self._in_flight += 1
+            self._stats["calls"] += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._async_slots.release()
+
+    def _record_retry(self, error: Exception, attempt: int) -> bool:
+        """Count a failed attempt; True if the call should be retried"""
+        with self._lock:
+            if isinstance(error, RETRYABLE_ERRORS) and attempt < self.max_retries:
+                self._stats["retries"] += 1
+                return True
+            self._stats["failures"] += 1
+            return False
+
+    async def ainvoke(self, llm, messages: List[BaseMessage]):
+        """
+        Call a chat model under the client's limits
+
+        Args:
+            llm: LangChain chat model
+            messages: Prompt messages
+
+        Returns:
+            The model's reply message
+        """
+        await self._acquire()
+        try:
+            await asyncio.sleep(self._rate_limit_delay(messages))
+            attempt = 0
+            while True:
+                try:
+                    return await llm.ainvoke(messages)
+                except Exception as e:
+                    if not self._record_retry(e, attempt):
+                        raise
+                    await asyncio.sleep(self._retry_delay(e, attempt))
+                    attempt += 1
+        finally:
+            self._release()
+
+    async def astream(self, llm, messages: List[BaseMessage]) -> AsyncIterator[Any]:
+        """
+        Stream a chat model reply under the client's limits
+
+        Only failures before the first chunk are retried; after that the
+        client has already seen part of the reply.
+
+        Args:
+            llm: LangChain chat model
+            messages: Prompt messages
+
+        Yields:
+            Reply chunks
+        """
+        await self._acquire()
+        try:
+            await asyncio.sleep(self._rate_limit_delay(messages))
+            attempt = 0
+            while True:
+                started = False
+                try:
+                    async for chunk in llm.astream(messages):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started or not self._record_retry(e, attempt):
+                        raise
+                    await asyncio.sleep(self._retry_delay(e, attempt))
+                    attempt += 1
+        finally:
+            self._release()
+
+    def invoke(self, llm, messages: List[BaseMessage]):
+        """
+        Call a chat model under the client's limits from synchronous code
+
+        Args:
+            llm: LangChain chat model
+            messages: Prompt messages
+
+        Returns:
+            The model's reply message
+        """
+        if not self._sync_slots.acquire(timeout=self.queue_timeout):
+            raise self._shed("no free slot", self.queue_timeout)
+        try:
+            with self._lock:
+                self._stats["calls"] += 1
+            time.sleep(self._rate_limit_delay(messages))
+            attempt = 0
+            while True:
+                try:
+                    return llm.invoke(messages)
+                except Exception as e:
+                    if not self._record_retry(e, attempt):
+                        raise
+                    time.sleep(self._retry_delay(e, attempt))
+                    attempt += 1
+        finally:
+            self._sync_slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get client counters
+
+        Returns:
+            Dictionary with calls, retries, failures, shed calls, time spent
+            throttled, and the current in-flight and waiting counts
+        """
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["in_flight"] = self._in_flight
+            stats["waiting"] = self._waiting
+        stats["throttled_seconds"] = round(stats["throttled_seconds"], 4)
+        return stats
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections"""
+        self.http_client.close()
+        await self.http_async_client.aclose()
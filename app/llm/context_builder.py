@@ -0,0 +1,119 @@
+import ast
+import hashlib
+from typing import List, Dict, Tuple
+
+from langchain.schema import Document
+
+from app.utils.cocktail_parser import parse_list_field
+from app.utils.tokens import count_tokens, truncate_tokens
+
+
+class ContextBuilder:
+    """
+    Packs retrieved documents into a bounded prompt context
+
+    Documents are deduplicated by ID (cocktail ID, or a hash of the text for
+    memories). User memories go first since they are short and personal.
+    Cocktails follow, those returned by several searches ahead of the rest,
+    then in retrieval order. Each cocktail is rendered on a few compact lines
+    with measured ingredients and shortened instructions. Documents are added
+    until the token budget is spent.
+    """
+
+    def __init__(self, model_name: str, token_budget: int = 800, instructions_tokens: int = 60):
+        self.model_name = model_name
+        self.token_budget = token_budget
+        self.instructions_tokens = instructions_tokens
+
+    @staticmethod
+    def _doc_id(document: Document) -> str:
+        doc_id = document.metadata.get("id") if document.metadata else None
+        if doc_id:
+            return f"cocktail:{doc_id}"
+        return "text:" + hashlib.sha1(document.page_content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _is_cocktail(document: Document) -> bool:
+        return bool(document.metadata and document.metadata.get("name"))
+
+    @staticmethod
+    def _measures(value) -> List[str]:
+        # Keep empty measures in place so they stay aligned with the ingredients
+        try:
+            items = ast.literal_eval(value) if isinstance(value, str) else value
+        except (ValueError, SyntaxError):
+            return parse_list_field(value)
+        if not isinstance(items, (list, tuple)):
+            return parse_list_field(value)
+        return ["" if item is None else str(item).strip() for item in items]
+
+    def _render_cocktail(self, document: Document) -> str:
+        metadata = document.metadata
+        ingredients = parse_list_field(metadata.get("ingredients"))
+        measures = self._measures(metadata.get("measures"))
+        measured = [
+            f"{measures[i]} {ingredient}" if i < len(measures) and measures[i] else ingredient
+            for i, ingredient in enumerate(ingredients)
+        ]
+
+        instructions = ""
+        for line in document.page_content.splitlines():
+            if line.startswith("Instructions:"):
+                instructions = line[len("Instructions:"):].strip()
+                break
+        instructions = truncate_tokens(instructions, self.instructions_tokens, self.model_name)
+
+        header = " | ".join(
+            value for value in (
+                metadata.get("name"), metadata.get("category"), metadata.get("alcoholic"), metadata.get("glass")
+            ) if value
+        )
+        lines = [header, f"Ingredients: {', '.join(measured)}"]
+        if instructions:
+            lines.append(f"Instructions: {instructions}")
+        return "\n".join(lines)
+
+    def build(self, documents: List[Document]) -> Tuple[str, List[str]]:
+        """
+        Build the context string for a set of retrieved documents
+
+        Args:
+            documents: Retrieved documents, possibly with duplicates
+
+        Returns:
+            Tuple of (context, names of the cocktails included)
+        """
+        unique: Dict[str, Document] = {}
+        hits: Dict[str, int] = {}
+        for document in documents:
+            doc_id = self._doc_id(document)
+            hits[doc_id] = hits.get(doc_id, 0) + 1
+            unique.setdefault(doc_id, document)
+
+        order = list(unique)
+        position = {doc_id: i for i, doc_id in enumerate(order)}
+        ranked = sorted(
+            order,
+            key=lambda doc_id: (self._is_cocktail(unique[doc_id]), -hits[doc_id], position[doc_id])
+        )
+
+        parts = []
+        sources = []
+        remaining = self.token_budget
+        for doc_id in ranked:
+            document = unique[doc_id]
+            if self._is_cocktail(document):
+                text = self._render_cocktail(document)
+            else:
+                text = document.page_content.strip()
+
+            tokens = count_tokens(text, self.model_name) + 2  # Separator
+            if tokens > remaining:
+                continue
+            remaining -= tokens
+
+            parts.append(text)
+            if self._is_cocktail(document):
+                sources.append(document.metadata["name"])
+
+        return "\n\n".join(parts), sources
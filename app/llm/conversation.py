@@ -0,0 +1,303 @@
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable
+
+from app.utils.tokens import count_tokens, truncate_tokens
+
+
+@dataclass
+class Turn:
+    """One message in a conversation, with its token count measured once"""
+    role: str
+    content: str
+    tokens: int
+
+
+@dataclass
+class ConversationSession:
+    """Server-held state of one conversation"""
+    session_id: str
+    user_id: str
+    turns: List[Turn] = field(default_factory=list)
+    summary: str = ""
+    summary_tokens: int = 0
+    updated_at: float = field(default_factory=time.monotonic)
+    compacting: bool = False
+
+    @property
+    def history_tokens(self) -> int:
+        return self.summary_tokens + sum(turn.tokens for turn in self.turns)
+
+    def history(self, max_tokens: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Get the history to send to the LLM
+
+        Args:
+            max_tokens: Drop the oldest turns beyond this many tokens, so the
+                bound holds even before a pending compaction has run
+
+        Returns:
+            Chat history, starting with a system entry holding the summary of
+            older turns if there is one
+        """
+        turns = self.turns
+        if max_tokens is not None:
+            total = self.history_tokens
+            start = 0
+            while start < len(turns) and total > max_tokens:
+                total -= turns[start].tokens
+                start += 1
+            turns = turns[start:]
+
+        history = []
+        if self.summary:
+            history.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+        history.extend({"role": turn.role, "content": turn.content} for turn in turns)
+        return history
+
+
+class ConversationStore:
+    """
+    In-memory conversation sessions with a token budget per session
+
+    Each turn's tokens are counted once when it is added. When a session's
+    history goes over the budget, the oldest turns are folded into a running
+    summary (or dropped if no summarizer is given) until it is back under
+    compact_ratio of the budget. The slack means compaction runs once every
+    few turns rather than on each one, and the summary is extended rather
+    than rebuilt. Idle sessions expire after a TTL and the least recently
+    used ones are evicted past max_sessions.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        token_budget: int = 1500,
+        summary_budget: int = 300,
+        compact_ratio: float = 0.6,
+        ttl_seconds: float = 3600,
+        max_sessions: int = 10000
+    ):
+        self.model_name = model_name
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.compact_ratio = compact_ratio
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._tasks = set()
+
+    def get_or_create(self, session_id: Optional[str], user_id: str) -> ConversationSession:
+        """
+        Get a user's session, creating a new one if the ID is unknown or expired
+
+        Args:
+            session_id: Session ID sent by the client, if any
+            user_id: User the session belongs to
+
+        Returns:
+            ConversationSession
+        """
+        self._expire()
+
+        session = self._sessions.get(session_id) if session_id else None
+        # Never hand one user's conversation to another
+        if session is None or session.user_id != user_id:
+            session = ConversationSession(session_id=uuid.uuid4().hex, user_id=user_id)
+            self._sessions[session.session_id] = session
+
+        session.updated_at = time.monotonic()
+        self._sessions.move_to_end(session.session_id)
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+        return session
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        """Get a session by ID without creating or refreshing it"""
+        return self._sessions.get(session_id)
+
+    async def aget_or_create(self, session_id: Optional[str], user_id: str) -> ConversationSession:
+        """Async version of get_or_create()"""
+        return await self._run(self.get_or_create, session_id, user_id)
+
+    async def _run(self, function: Callable, *args):
+        """Run a session call; stores whose sessions live in another process run it off the event loop"""
+        return function(*args)
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Sessions are ordered by last use, so expired ones are at the front
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.updated_at >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+    def history(self, session: ConversationSession) -> List[Dict[str, str]]:
+        """Get a session's history, bounded by the token budget"""
+        return session.history(max_tokens=self.token_budget)
+
+    def add_turn(self, session: ConversationSession, role: str, content: str) -> None:
+        """
+        Append a message to a session
+
+        Args:
+            session: Session to update
+            role: "user" or "assistant"
+            content: Message content
+        """
+        session.turns.append(Turn(role, content, count_tokens(content, self.model_name)))
+        session.updated_at = time.monotonic()
+
+    def add_turns(self, session: ConversationSession, messages: List[Tuple[str, str]]) -> None:
+        """
+        Append several messages to a session
+
+        Args:
+            session: Session to update
+            messages: (role, content) pairs, oldest first
+        """
+        for role, content in messages:
+            self.add_turn(session, role, content)
+
+    async def aadd_turns(self, session: ConversationSession, messages: List[Tuple[str, str]]) -> None:
+        """Async version of add_turns()"""
+        await self._run(self.add_turns, session, messages)
+
+    def needs_compaction(self, session: ConversationSession) -> bool:
+        return session.history_tokens > self.token_budget and not session.compacting
+
+    def begin_compaction(self, session: ConversationSession) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        """
+        Pick the oldest turns to fold into the summary
+
+        The turns stay in the session until finish_compaction(), so history
+        read in the meantime still has them.
+
+        Args:
+            session: Session to compact
+
+        Returns:
+            Tuple of (summary so far, turns to fold in), or None if there is
+            nothing to compact
+        """
+        if not self.needs_compaction(session):
+            return None
+
+        target = int(self.token_budget * self.compact_ratio)
+        tokens = session.history_tokens
+        count = 0
+        # Always keep the latest exchange verbatim
+        while len(session.turns) - count > 2 and tokens > target:
+            tokens -= session.turns[count].tokens
+            count += 1
+        if not count:
+            return None
+
+        session.compacting = True
+        return session.summary, [{"role": turn.role, "content": turn.content} for turn in session.turns[:count]]
+
+    def finish_compaction(self, session: ConversationSession, count: int, summary: Optional[str]) -> None:
+        """
+        Replace the oldest turns with their summary
+
+        Args:
+            session: Session being compacted
+            count: Number of turns begin_compaction() picked
+            summary: New summary, or None to keep the turns
+        """
+        session.compacting = False
+        if summary is None:
+            return
+
+        session.summary = truncate_tokens(summary.strip(), self.summary_budget, self.model_name)
+        session.summary_tokens = count_tokens(session.summary, self.model_name)
+        # Turns added since begin_compaction() were appended, the picked ones are still first
+        del session.turns[:count]
+
+    async def compact(
+        self,
+        session: ConversationSession,
+        summarize: Optional[Callable[[str, List[Dict[str, str]]], Awaitable[str]]] = None
+    ) -> None:
+        """
+        Bring a session back under its token budget
+
+        The oldest turns are removed only once their summary is in place. If
+        summarizing fails they are kept, and the next compaction retries.
+
+        Args:
+            session: Session to compact
+            summarize: Coroutine taking (summary so far, turns to fold in) and
+                returning the new summary; older turns are dropped without it
+        """
+        picked = await self._run(self.begin_compaction, session)
+        if picked is None:
+            return
+
+        previous, turns = picked
+        summary = None
+        try:
+            summary = previous if summarize is None else await summarize(previous, turns)
+        except Exception as e:
+            print(f"Error summarizing conversation {session.session_id}, keeping its turns: {e}")
+        finally:
+            await self._run(self.finish_compaction, session, len(turns), summary)
+
+    def schedule_compaction(
+        self,
+        session: ConversationSession,
+        summarize: Optional[Callable[[str, List[Dict[str, str]]], Awaitable[str]]] = None
+    ) -> None:
+        """Compact a session in the background if it is over budget"""
+        if self.needs_compaction(session):
+            task = asyncio.get_running_loop().create_task(self.compact(session, summarize))
+            # Keep a reference until the task is done so it isn't garbage collected
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+
+class SharedConversationStore(ConversationStore):
+    """
+    Conversation sessions kept by the memory service, for multi-worker mode
+
+    Requests of one conversation can land on any worker, so the sessions
+    live in the memory service process and every worker reads and updates
+    them through its client. A session handed out here is a snapshot: new
+    turns are counted locally, appended to the snapshot and sent to the
+    service, and compaction picks and replaces turns on the service's copy.
+    The budgets must match the ones the service was started with.
+    """
+
+    def __init__(self, client, model_name: str, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.client = client
+
+    def get_or_create(self, session_id: Optional[str], user_id: str) -> ConversationSession:
+        return self.client.open_session(session_id, user_id)
+
+    def add_turns(self, session: ConversationSession, messages: List[Tuple[str, str]]) -> None:
+        turns = [Turn(role, content, count_tokens(content, self.model_name)) for role, content in messages]
+        session.turns.extend(turns)
+        self.client.append_turns(session.session_id, turns)
+
+    def add_turn(self, session: ConversationSession, role: str, content: str) -> None:
+        self.add_turns(session, [(role, content)])
+
+    def begin_compaction(self, session: ConversationSession) -> Optional[Tuple[str, List[Dict[str, str]]]]:
+        # The snapshot may be stale, the service checks its own copy again
+        if not self.needs_compaction(session):
+            return None
+        return self.client.begin_compaction(session.session_id)
+
+    def finish_compaction(self, session: ConversationSession, count: int, summary: Optional[str]) -> None:
+        self.client.finish_compaction(session.session_id, count, summary)
+
+    async def _run(self, function: Callable, *args):
+        return await asyncio.to_thread(function, *args)
@@ -1,17 +1,56 @@
-from typing import List, Dict, Any, Optional
+import json
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator
 from langchain_community.chat_models import ChatOpenAI
-from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain.prompts import ChatPromptTemplate
 
-from app.config import OPENAI_API_KEY, MODEL_NAME, TEMPERATURE, MAX_TOKENS
+from app.llm.client import LLMClient
+from app.utils.metrics import metrics, stage, record_stage
+from app.utils.tokens import count_tokens
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_API_BASE,
+    MODEL_NAME,
+    TEMPERATURE,
+    MAX_TOKENS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_REQUEST_TIMEOUT,
+    LLM_MAX_CONNECTIONS
+)
 
 class LLMEngine:
     def __init__(self):
+        # Every call goes through the client's rate limits, concurrency cap and retries
+        self.client = LLMClient(
+            model_name=MODEL_NAME,
+            max_output_tokens=MAX_TOKENS,
+            max_concurrency=LLM_MAX_CONCURRENCY,
+            max_queue=LLM_MAX_QUEUE,
+            queue_timeout=LLM_QUEUE_TIMEOUT,
+            requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+            max_retries=LLM_MAX_RETRIES,
+            retry_base_delay=LLM_RETRY_BASE_DELAY,
+            retry_max_delay=LLM_RETRY_MAX_DELAY,
+            request_timeout=LLM_REQUEST_TIMEOUT,
+            max_connections=LLM_MAX_CONNECTIONS
+        )
+        
         self.llm = ChatOpenAI(
             model_name=MODEL_NAME,
             openai_api_key=OPENAI_API_KEY,
             temperature=TEMPERATURE,
-            max_tokens=MAX_TOKENS
+            max_tokens=MAX_TOKENS,
+            max_retries=0,
+            **self.client.openai_clients(OPENAI_API_KEY, OPENAI_API_BASE)
         )
         
         self.system_prompt = """
@@ -28,19 +67,13 @@ class LLMEngine:
         Always respond in a friendly and conversational manner, as if you're a professional bartender chatting with a customer.
         """
     
-    def detect_user_preferences(self, message: str) -> Optional[Dict[str, str]]:
-        """
-        Detect user preferences from a message
-        
-        Args:
-            message: User message
-            
-        Returns:
-            Dictionary with memory type and content if a preference is detected,
-            None otherwise
-        """
-        # Use LLM to detect if the message contains a preference
-        messages = [
+    @staticmethod
+    def _record_completion(content: str) -> None:
+        metrics.inc("cocktail_llm_tokens_total", count_tokens(content, MODEL_NAME), type="completion")
+    
+    def _preference_messages(self, message: str) -> List[BaseMessage]:
+        """Build the prompt used to detect user preferences"""
+        return [
             SystemMessage(content="""
             Your task is to analyze the user message and detect if they're sharing a preference about cocktails or ingredients.
             If they are, extract the preference type and content. Respond in JSON format.
@@ -56,41 +89,63 @@ class LLMEngine:
             """),
             HumanMessage(content=message)
         ]
-        
-        response = self.llm.invoke(messages)
-        
-        # Parse response
+    
+    @staticmethod
+    def _parse_preference(content: str) -> Optional[Dict[str, str]]:
+        """Parse the preference detector's JSON reply"""
         try:
-            import json
-            result = json.loads(response.content)
+            result = json.loads(content)
             
             if result.get("detected", False):
                 return {
                     "type": result["type"],
                     "content": result["content"]
                 }
-        except:
+        except (ValueError, KeyError, TypeError, AttributeError):
             pass
         
         return None
     
-    def generate_response(
-        self,
-        message: str,
-        history: List[Dict[str, str]],
-        retrieved_context: Optional[str] = None
-    ) -> str:
+    def detect_user_preferences(self, message: str) -> Optional[Dict[str, str]]:
         """
-        Generate a response to a user message
+        Detect user preferences from a message
         
         Args:
             message: User message
-            history: Chat history
-            retrieved_context: Context retrieved from vector store
             
         Returns:
-            Generated response
+            Dictionary with memory type and content if a preference is detected,
+            None otherwise
+        """
+        # Use LLM to detect if the message contains a preference
+        with stage("llm_preference"):
+            response = self.client.invoke(self.llm, self._preference_messages(message))
+        self._record_completion(response.content)
+        return self._parse_preference(response.content)
+    
+    async def adetect_user_preferences(self, message: str) -> Optional[Dict[str, str]]:
+        """
+        Detect user preferences from a message without blocking the event loop
+        
+        Args:
+            message: User message
+            
+        Returns:
+            Dictionary with memory type and content if a preference is detected,
+            None otherwise
         """
+        with stage("llm_preference"):
+            response = await self.client.ainvoke(self.llm, self._preference_messages(message))
+        self._record_completion(response.content)
+        return self._parse_preference(response.content)
+    
+    def _build_messages(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        retrieved_context: Optional[str] = None
+    ) -> List[BaseMessage]:
+        """Build the LangChain message list for a response"""
         # Convert history to LangChain message format
         messages = [SystemMessage(content=self.system_prompt)]
         
@@ -109,13 +164,119 @@ class LLMEngine:
         for entry in history:
             if entry["role"] == "user":
                 messages.append(HumanMessage(content=entry["content"]))
+            elif entry["role"] == "system":
+                messages.append(SystemMessage(content=entry["content"]))
             else:
                 messages.append(AIMessage(content=entry["content"]))
         
         # Add current message
         messages.append(HumanMessage(content=message))
         
+        return messages
+    
+    def generate_response(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        retrieved_context: Optional[str] = None
+    ) -> str:
+        """
+        Generate a response to a user message
+        
+        Args:
+            message: User message
+            history: Chat history
+            retrieved_context: Context retrieved from vector store
+            
+        Returns:
+            Generated response
+        """
         # Generate response
-        response = self.llm.invoke(messages)
+        with stage("generation"):
+            response = self.client.invoke(self.llm, self._build_messages(message, history, retrieved_context))
+        self._record_completion(response.content)
+        
+        return response.content
+    
+    async def agenerate_response(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        retrieved_context: Optional[str] = None
+    ) -> str:
+        """
+        Generate a response to a user message without blocking the event loop
+        
+        Args:
+            message: User message
+            history: Chat history
+            retrieved_context: Context retrieved from vector store
+            
+        Returns:
+            Generated response
+        """
+        with stage("generation"):
+            response = await self.client.ainvoke(self.llm, self._build_messages(message, history, retrieved_context))
+        self._record_completion(response.content)
+        
+        return response.content
+    
+    async def astream_response(
+        self,
+        message: str,
+        history: List[Dict[str, str]],
+        retrieved_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response to a user message token by token
+        
+        Args:
+            message: User message
+            history: Chat history
+            retrieved_context: Context retrieved from vector store
+            
+        Yields:
+            Response text chunks as they arrive
+        """
+        start = time.perf_counter()
+        chunks = 0
+        async for chunk in self.client.astream(self.llm, self._build_messages(message, history, retrieved_context)):
+            if chunk.content:
+                if not chunks:
+                    record_stage("llm_first_token", time.perf_counter() - start)
+                chunks += 1
+                yield chunk.content
+        record_stage("generation", time.perf_counter() - start)
+        # Streamed chunks are about one token each
+        metrics.inc("cocktail_llm_tokens_total", chunks, type="completion")
+    
+    async def asummarize_conversation(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """
+        Fold older conversation turns into a running summary
+        
+        Args:
+            summary: Summary of the conversation so far, may be empty
+            turns: Turns to add to the summary, oldest first
+            
+        Returns:
+            Updated summary
+        """
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        messages = [
+            SystemMessage(content="""
+            You maintain a short running summary of a conversation between a user and a cocktail advisor.
+            Update the summary with the new messages. Keep the user's stated preferences, the cocktails
+            discussed and any open questions. Reply with the updated summary only, in a few sentences.
+            """),
+            HumanMessage(content=f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}")
+        ]
+        
+        with stage("llm_summary"):
+            response = await self.client.ainvoke(self.llm, messages)
+        self._record_completion(response.content)
         
-        return response.content
\ No newline at end of file
+        return response.content
+    
+    async def aclose(self) -> None:
+        """Close the LLM client's connection pool"""
+        await self.client.aclose()
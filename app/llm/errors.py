@@ -0,0 +1,6 @@
+class LLMOverloaded(Exception):
+    """Raised instead of queueing a call when the LLM client is saturated"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,230 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Iterable, Any
+
+from app.utils.cocktail_parser import CocktailCatalog
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_PUNCTUATION_RE = re.compile(r"[.,?!;:]")
+
+# Cue phrases per intent, matched as whole words
+COCKTAIL_CUES = (
+    "cocktail", "cocktails", "drink", "drinks", "recipe", "recipes", "ingredient", "ingredients",
+    "mix", "contain", "contains", "containing"
+)
+PREFERENCE_CUES = (
+    "favorite", "favorites", "favourite", "favourites", "prefer", "preference", "preferences",
+    "love", "i like", "we like", "do i like"
+)
+RECOMMEND_CUES = ("recommend", "recommendation", "recommendations", "suggest", "suggestion", "suggestions", "what should")
+# A bare "like" is too often "I'd like ..." to signal similarity on its own
+SIMILAR_CUES = (
+    "similar", "similar to", "alternative to", "alternatives to", "something like", "anything like",
+    "drinks like", "drink like", "cocktails like", "cocktail like", "one like", "more like"
+)
+
+# Words allowed between a similarity cue and the cocktail it refers to
+_ARTICLES = {"a", "an", "the", "my"}
+_FALLBACK_NAME_TOKENS = 6
+
+COCKTAIL = "cocktail"
+INGREDIENT = "ingredient"
+
+
+class TokenAutomaton:
+    """
+    Aho-Corasick automaton over word tokens
+
+    Patterns are token sequences, so matches always start and end on word
+    boundaries ("like" never matches inside "likely"). After build(), one
+    left-to-right pass over a token list reports every pattern occurrence,
+    however many patterns there are.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, Any]]] = [[]]
+
+    def add(self, tokens: Iterable[str], payload: Any) -> None:
+        """Add a pattern with the payload reported when it matches"""
+        tokens = list(tokens)
+        if not tokens:
+            return
+        state = 0
+        for token in tokens:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][token] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((len(tokens), payload))
+
+    def build(self) -> "TokenAutomaton":
+        """Compute failure links; call once after all patterns are added"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(token, 0)
+                # Patterns ending at the fallback state end here as well
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+        return self
+
+    def scan(self, tokens: List[str]) -> List[Tuple[int, int, Any]]:
+        """
+        Find every pattern occurrence
+
+        Args:
+            tokens: Token list to scan
+
+        Returns:
+            (start, end, payload) per occurrence, end exclusive, in order of end position
+        """
+        matches = []
+        state = 0
+        for position, token in enumerate(tokens):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            for length, payload in self._outputs[state]:
+                matches.append((position + 1 - length, position + 1, payload))
+        return matches
+
+
+@dataclass
+class QueryIntent:
+    """What a query asks for, and the catalog entities it names"""
+    search_cocktails: bool = False
+    search_user_memories: bool = False
+    get_favorites: bool = False
+    recommend_similar: bool = False
+    # Canonical names, in order of appearance
+    cocktails: List[str] = field(default_factory=list)
+    ingredients: List[str] = field(default_factory=list)
+    # Cocktail a similarity request refers to
+    similar_to: Optional[str] = None
+
+
+class IntentRouter:
+    """
+    Single-pass query router
+
+    Intent cues and the catalog's cocktail names and ingredients are compiled
+    into one TokenAutomaton, so a query is tokenized and scanned once to get
+    both its intents and the entities it names. Overlapping entities resolve
+    leftmost-longest ("Long Island Iced Tea" over "Iced Tea"). Searches are
+    planned from the result: cocktail search when the query is about drinks
+    or names an ingredient or a cocktail other than the one a similarity
+    request refers to, memory search only on first-person preference cues,
+    and a similarity search only when it has a cocktail to work from.
+    """
+
+    def __init__(self, cocktails: Iterable[str] = (), ingredients: Iterable[str] = ()):
+        automaton = TokenAutomaton()
+        for intent, cues in (
+            ("cocktail", COCKTAIL_CUES),
+            ("preference", PREFERENCE_CUES),
+            ("recommend", RECOMMEND_CUES),
+            ("similar", SIMILAR_CUES)
+        ):
+            for cue in cues:
+                automaton.add(_TOKEN_RE.findall(cue), ("cue", intent))
+        for kind, names in ((COCKTAIL, cocktails), (INGREDIENT, ingredients)):
+            for name in names:
+                automaton.add(_TOKEN_RE.findall(name.lower()), (kind, name))
+        self.automaton = automaton.build()
+
+    @classmethod
+    def from_catalog(cls, catalog: CocktailCatalog) -> "IntentRouter":
+        """Build a router that knows the catalog's cocktail names (in canonical case) and ingredients"""
+        names = [str(catalog.get(catalog.find_by_name(name))["name"]) for name in catalog.cocktail_names if name]
+        return cls(names, catalog.ingredient_names)
+
+    @staticmethod
+    def _entities(matches: List[Tuple[int, int, Any]]) -> List[Tuple[int, int, str, str]]:
+        """Leftmost-longest non-overlapping entity matches as (start, end, kind, name)"""
+        entities = sorted(
+            ((start, end, kind, name) for start, end, (kind, name) in matches if kind != "cue"),
+            key=lambda entity: (entity[0], -entity[1])
+        )
+        chosen = []
+        for entity in entities:
+            if not chosen or entity[0] >= chosen[-1][1]:
+                chosen.append(entity)
+        return chosen
+
+    @staticmethod
+    def _fallback_name(query: str, spans: List[Tuple[int, int]], start: int) -> Optional[str]:
+        """Words after a similarity cue up to the next punctuation, for names not in the catalog"""
+        words = []
+        for position in range(start, min(len(spans), start + _FALLBACK_NAME_TOKENS)):
+            if position > start and _PUNCTUATION_RE.search(query[spans[position - 1][1]:spans[position][0]]):
+                break
+            words.append(query[spans[position][0]:spans[position][1]])
+        while words and words[0].lower() in _ARTICLES:
+            words.pop(0)
+        return " ".join(words) or None
+
+    def route(self, query: str) -> QueryIntent:
+        """
+        Work out which searches a query needs
+
+        Args:
+            query: User query
+
+        Returns:
+            QueryIntent
+        """
+        lowered = query.lower()
+        spans = [match.span() for match in _TOKEN_RE.finditer(lowered)]
+        tokens = [lowered[start:end] for start, end in spans]
+        matches = self.automaton.scan(tokens)
+
+        cues: Dict[str, List[int]] = {}
+        for _, end, (kind, intent) in matches:
+            if kind == "cue":
+                cues.setdefault(intent, []).append(end)
+        entities = self._entities(matches)
+
+        intent = QueryIntent()
+        for _, _, kind, name in entities:
+            names = intent.cocktails if kind == COCKTAIL else intent.ingredients
+            if name not in names:
+                names.append(name)
+
+        if "similar" in cues:
+            intent.recommend_similar = True
+            # The first cocktail right after a cue, allowing an article in between
+            for cue_end in cues["similar"]:
+                position = cue_end
+                while position < len(tokens) and tokens[position] in _ARTICLES:
+                    position += 1
+                following = [entity for entity in entities if entity[0] == position and entity[2] == COCKTAIL]
+                if following:
+                    intent.similar_to = following[0][3]
+                    break
+            if intent.similar_to is None:
+                intent.similar_to = (
+                    intent.cocktails[0] if intent.cocktails
+                    else self._fallback_name(query, spans, max(cues["similar"]))
+                )
+
+        other_cocktails = [name for name in intent.cocktails if name != intent.similar_to]
+        intent.search_cocktails = bool("cocktail" in cues or intent.ingredients or other_cocktails)
+        intent.search_user_memories = "preference" in cues
+
+        if "recommend" in cues:
+            intent.search_cocktails = True
+            intent.search_user_memories = True
+            intent.get_favorites = True
+
+        return intent
@@ -1,18 +1,71 @@
-from typing import List, Dict, Any, Optional, Tuple
+import time
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from langchain.schema import Document
 
-from app.db.vector_store import VectorStore
+from app.db.vector_store import VectorStore, SearchRequest, COCKTAILS, USER_MEMORIES, SIMILAR_COCKTAILS
 from app.llm.engine import LLMEngine
+from app.utils.cocktail_parser import CocktailCatalog
+from app.utils.memory_handler import PreferenceMatcher
+from app.llm.response_cache import SemanticResponseCache
+from app.llm.context_builder import ContextBuilder
+from app.llm.intent_router import IntentRouter
+from app.utils.metrics import metrics, stage
+from app.config import (
+    MODEL_NAME,
+    DEFAULT_USER_ID,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_INSTRUCTIONS_TOKENS,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_SIZE
+)
 
 class CocktailRAG:
-    def __init__(self, vector_store: VectorStore, llm_engine: LLMEngine):
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        llm_engine: LLMEngine,
+        catalog: Optional[CocktailCatalog] = None
+    ):
         self.vector_store = vector_store
         self.llm_engine = llm_engine
+        self.catalog = catalog
+        
+        # Local matcher decides whether the LLM preference detector is needed at all
+        self.preference_matcher = (
+            PreferenceMatcher.from_catalog(catalog) if catalog is not None else PreferenceMatcher()
+        )
+        
+        # Decides which searches a query needs, in one pass over the query
+        self.intent_router = IntentRouter.from_catalog(catalog) if catalog is not None else IntentRouter()
+        
+        self.response_cache = (
+            SemanticResponseCache(RESPONSE_CACHE_THRESHOLD, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE)
+            if RESPONSE_CACHE_ENABLED else None
+        )
+        
+        self.context_builder = ContextBuilder(MODEL_NAME, CONTEXT_TOKEN_BUDGET, CONTEXT_INSTRUCTIONS_TOKENS)
+    
+    def use_catalog(self, catalog: CocktailCatalog) -> None:
+        """
+        Switch to a newly loaded catalog, e.g. after an index reload
+        
+        Args:
+            catalog: New cocktail catalog
+        """
+        matcher = PreferenceMatcher.from_catalog(catalog)
+        matcher.counters = self.preference_matcher.counters
+        self.preference_matcher = matcher
+        self.intent_router = IntentRouter.from_catalog(catalog)
+        self.catalog = catalog
     
     def process_query(
         self,
         query: str,
-        history: List[Dict[str, str]]
+        history: List[Dict[str, str]],
+        user_id: str = DEFAULT_USER_ID
     ) -> Tuple[str, List[str]]:
         """
         Process a user query using RAG
@@ -20,144 +73,324 @@ class CocktailRAG:
         Args:
             query: User query
             history: Chat history
+            user_id: User whose memories to read and write
             
         Returns:
             Tuple of (response, sources)
         """
-        # Detect user preferences
-        preference = self.llm_engine.detect_user_preferences(query)
-        if preference:
-            # Store user preference
-            self.vector_store.add_user_memory(
-                memory_text=f"My {preference['type']} is {preference['content']}",
-                memory_type=preference["type"]
-            )
-        
-        # Analyze query to determine search strategy
-        search_strategy = self._determine_search_strategy(query)
+        # Detect user preferences, asking the LLM only when the local matcher can't decide
+        with stage("preference_detection"):
+            decision, preferences = self.preference_matcher.match(query)
+            metrics.inc("cocktail_events_total", event=f"preference_{decision}")
+            if decision == PreferenceMatcher.AMBIGUOUS:
+                preference = self.llm_engine.detect_user_preferences(query)
+                preferences = [preference] if preference else []
+            
+            for preference in preferences:
+                # Store user preference
+                self.vector_store.add_user_memory(
+                    memory_text=preference["content"],
+                    memory_type=preference["type"],
+                    user_id=user_id
+                )
         
         # Retrieve relevant information
-        retrieved_docs = []
-        sources = []
-        
-        if search_strategy.get("search_cocktails", False):
-            cocktail_docs = self.vector_store.search_cocktails(query)
-            retrieved_docs.extend(cocktail_docs)
-            sources.extend([doc.metadata.get("name", "Unknown") for doc in cocktail_docs])
-        
-        if search_strategy.get("search_user_memories", False):
-            memory_docs = self.vector_store.get_user_memories(query)
-            retrieved_docs.extend(memory_docs)
-        
-        if search_strategy.get("get_favorites", False):
-            favorite_ingredients = self.vector_store.get_favorite_ingredients()
-            if favorite_ingredients:
-                favorites_text = f"User's favorite ingredients: {', '.join(favorite_ingredients)}"
-                retrieved_docs.append(Document(page_content=favorites_text))
-        
-        if search_strategy.get("recommend_similar", False):
-            # Extract cocktail name from query
-            cocktail_name = self._extract_cocktail_name(query)
-            if cocktail_name:
-                similar_docs = self.vector_store.search_cocktails(f"Cocktail similar to {cocktail_name}")
-                retrieved_docs.extend(similar_docs)
-                sources.extend([doc.metadata.get("name", "Unknown") for doc in similar_docs])
+        retrieved_docs = self._retrieve(query, user_id)
         
         # Combine retrieved documents into context
-        context = self._combine_documents(retrieved_docs)
+        context, sources, context_user = self._combine_documents(retrieved_docs, user_id)
+        
+        cached, cache_key = self._lookup_response(query, history, context, context_user)
+        if cached is not None:
+            return cached[0], sources
         
         # Generate response using LLM
+        start = time.perf_counter()
         response = self.llm_engine.generate_response(query, history, context)
+        self._store_response(cache_key, response, sources, time.perf_counter() - start)
         
-        return response, list(set(sources))
+        return response, sources
     
-    def _determine_search_strategy(self, query: str) -> Dict[str, bool]:
+    async def aprocess_query(
+        self,
+        query: str,
+        history: List[Dict[str, str]],
+        user_id: str = DEFAULT_USER_ID
+    ) -> Tuple[str, List[str]]:
         """
-        Determine search strategy based on the query
+        Process a user query using RAG without blocking the event loop
+        
+        Preference detection runs concurrently with retrieval, whose searches
+        share a single batched embedding call.
         
         Args:
             query: User query
+            history: Chat history
+            user_id: User whose memories to read and write
             
         Returns:
-            Dictionary of search strategies to use
-        """
-        query_lower = query.lower()
-        strategy = {
-            "search_cocktails": False,
-            "search_user_memories": False,
-            "get_favorites": False,
-            "recommend_similar": False
-        }
-        
-        # Check if query is about cocktails
-        if any(word in query_lower for word in ["cocktail", "drink", "recipe", "ingredients", "mix", "contain"]):
-            strategy["search_cocktails"] = True
-        
-        # Check if query is about user preferences
-        if any(word in query_lower for word in ["favorite", "prefer", "like", "love"]):
-            strategy["search_user_memories"] = True
-        
-        # Check if query is asking for recommendations
-        if any(word in query_lower for word in ["recommend", "suggestion", "what should"]):
-            strategy["search_cocktails"] = True
-            strategy["search_user_memories"] = True
-            strategy["get_favorites"] = True
-        
-        # Check if query is asking for similar cocktails
-        if "similar" in query_lower:
-            strategy["recommend_similar"] = True
-        
-        return strategy
+            Tuple of (response, sources)
+        """
+        context, sources, context_user = await self._aprepare_context(query, user_id)
+        
+        cached, cache_key = await self._alookup_response(query, history, context, context_user)
+        if cached is not None:
+            return cached[0], sources
+        
+        # Generate response using LLM
+        start = time.perf_counter()
+        response = await self.llm_engine.agenerate_response(query, history, context)
+        self._store_response(cache_key, response, sources, time.perf_counter() - start)
+        
+        return response, sources
     
-    def _extract_cocktail_name(self, query: str) -> Optional[str]:
+    async def astream_query(
+        self,
+        query: str,
+        history: List[Dict[str, str]],
+        user_id: str = DEFAULT_USER_ID
+    ) -> AsyncIterator[Tuple[str, Any]]:
         """
-        Extract cocktail name from query
+        Process a user query using RAG, streaming the response
         
         Args:
             query: User query
+            history: Chat history
+            user_id: User whose memories to read and write
+            
+        Yields:
+            ("sources", list of source names) once retrieval finishes, then
+            ("token", text chunk) for each generated chunk
+        """
+        context, sources, context_user = await self._aprepare_context(query, user_id)
+        yield "sources", sources
+        
+        cached, cache_key = await self._alookup_response(query, history, context, context_user)
+        if cached is not None:
+            yield "token", cached[0]
+            return
+        
+        start = time.perf_counter()
+        tokens = []
+        async for token in self.llm_engine.astream_response(query, history, context):
+            tokens.append(token)
+            yield "token", token
+        self._store_response(cache_key, "".join(tokens), sources, time.perf_counter() - start)
+    
+    @staticmethod
+    def _scope_history(query: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        The parts of the history an answer depends on
+        
+        That is the exchange before the current message, and the summary of
+        older turns if the session has one: a follow-up depends on what was
+        just said and on what was summarized. Keying the cache on the whole
+        conversation would keep it from hitting after the first turn.
+        """
+        summary = [entry for entry in history[:1] if entry.get("role") == "system"]
+        turns = history[len(summary):]
+        if turns and turns[-1].get("role") == "user" and turns[-1].get("content") == query:
+            turns = turns[:-1]
+        return summary + turns[-2:]
+    
+    def _lookup_response(
+        self,
+        query: str,
+        history: List[Dict[str, str]],
+        context: str,
+        context_user: Optional[str]
+    ) -> Tuple[Optional[Tuple[str, List[str]]], Optional[Tuple[List[float], str]]]:
+        """
+        Look up a cached response for the query
+        
+        Entries are shared between users unless the context holds one
+        user's memories, so a common question hits for everyone.
+        
+        Args:
+            query: User query
+            history: Chat history
+            context: Retrieved context
+            context_user: User whose memories are in the context, None if there are none
             
         Returns:
-            Cocktail name if found, None otherwise
-        """
-        query_lower = query.lower()
-        
-        # Look for patterns like "similar to X" or "like X"
-        patterns = ["similar to", "like"]
-        
-        for pattern in patterns:
-            if pattern in query_lower:
-                parts = query_lower.split(pattern, 1)
-                if len(parts) > 1:
-                    # Extract the cocktail name
-                    cocktail_name = parts[1].strip()
-                    # Remove any trailing punctuation or text
-                    for punctuation in [".", ",", "?", "!", ";"]:
-                        if punctuation in cocktail_name:
-                            cocktail_name = cocktail_name.split(punctuation, 1)[0]
-                    
-                    # Remove quotes if present
-                    cocktail_name = cocktail_name.strip('"\'')
-                    
-                    return cocktail_name
-        
-        return None
+            Tuple of (cached (response, sources) or None, cache key to store under or None)
+        """
+        if self.response_cache is None:
+            return None, None
+        
+        with stage("cache_lookup"):
+            vector = self.vector_store.embeddings.embed_query(query)
+            scope = SemanticResponseCache.scope_key(context_user, context, self._scope_history(query, history))
+            cached = self.response_cache.lookup(vector, scope)
+        metrics.inc("cocktail_cache_total", cache="response", result="miss" if cached is None else "hit")
+        return cached, (vector, scope)
+    
+    async def _alookup_response(
+        self,
+        query: str,
+        history: List[Dict[str, str]],
+        context: str,
+        context_user: Optional[str]
+    ) -> Tuple[Optional[Tuple[str, List[str]]], Optional[Tuple[List[float], str]]]:
+        """Look up a cached response for the query without blocking the event loop"""
+        if self.response_cache is None:
+            return None, None
+        return await asyncio.to_thread(self._lookup_response, query, history, context, context_user)
+    
+    def _store_response(
+        self,
+        cache_key: Optional[Tuple[List[float], str]],
+        response: str,
+        sources: List[str],
+        generation_seconds: float
+    ) -> None:
+        """Cache a generated response under the key returned by _lookup_response"""
+        if self.response_cache is None or cache_key is None or not response:
+            return
+        vector, scope = cache_key
+        self.response_cache.store(vector, scope, response, sources, generation_seconds)
     
-    def _combine_documents(self, documents: List[Document]) -> str:
+    async def _aprepare_context(self, query: str, user_id: str) -> Tuple[str, List[str], Optional[str]]:
+        """
+        Run preference detection and retrieval concurrently and build the context
+        
+        Args:
+            query: User query
+            user_id: User whose memories to read and write
+            
+        Returns:
+            Tuple of (context, sources, user whose memories are in the context or None)
+        """
+        retrieved_docs, _ = await asyncio.gather(
+            self._aretrieve(query, user_id),
+            self._adetect_and_store_preference(query, user_id)
+        )
+        
+        # Combine retrieved documents into context
+        return self._combine_documents(retrieved_docs, user_id)
+    
+    async def _adetect_and_store_preference(self, query: str, user_id: str) -> None:
+        """Detect user preferences in the query and store any that are found"""
+        with stage("preference_detection"):
+            decision, preferences = self.preference_matcher.match(query)
+            metrics.inc("cocktail_events_total", event=f"preference_{decision}")
+            if decision == PreferenceMatcher.AMBIGUOUS:
+                preference = await self.llm_engine.adetect_user_preferences(query)
+                preferences = [preference] if preference else []
+            
+            for preference in preferences:
+                await self.vector_store.aadd_user_memory(
+                    memory_text=preference["content"],
+                    memory_type=preference["type"],
+                    user_id=user_id
+                )
+    
+    def _plan_retrieval(self, query: str, user_id: str) -> Tuple[List[SearchRequest], bool]:
+        """
+        Plan the searches for a query as one batch
+        
+        Args:
+            query: User query
+            user_id: User whose memories to search and whose preferences rank cocktails
+            
+        Returns:
+            Tuple of (search requests, whether to add the user's favorite ingredients)
+        """
+        intent = self.intent_router.route(query)
+        
+        requests = []
+        
+        if intent.search_cocktails:
+            requests.append(SearchRequest(COCKTAILS, query, user_id=user_id, personalize=True))
+        
+        if intent.search_user_memories:
+            requests.append(SearchRequest(USER_MEMORIES, query, user_id=user_id))
+        
+        if intent.recommend_similar and intent.similar_to:
+            requests.append(SearchRequest(SIMILAR_COCKTAILS, intent.similar_to, user_id=user_id, personalize=True))
+        
+        return requests, intent.get_favorites
+    
+    def _retrieve(self, query: str, user_id: str) -> List[Document]:
+        """
+        Retrieve documents for a query
+        
+        Args:
+            query: User query
+            user_id: User whose memories to search
+            
+        Returns:
+            Retrieved documents, possibly with duplicates
+        """
+        with stage("retrieval"):
+            requests, get_favorites = self._plan_retrieval(query, user_id)
+            
+            results = self.vector_store.search_batch(requests) if requests else []
+            retrieved_docs = [doc for documents in results for doc in documents]
+            
+            if get_favorites:
+                favorite_ingredients = self.vector_store.get_favorite_ingredients(user_id)
+                retrieved_docs.extend(self._favorites_documents(favorite_ingredients, user_id))
+        
+        metrics.observe("cocktail_retrieved_documents", len(retrieved_docs))
+        return retrieved_docs
+    
+    async def _aretrieve(self, query: str, user_id: str) -> List[Document]:
+        """
+        Retrieve documents for a query without blocking the event loop
+        
+        Args:
+            query: User query
+            user_id: User whose memories to search
+            
+        Returns:
+            Retrieved documents, possibly with duplicates
+        """
+        with stage("retrieval"):
+            requests, get_favorites = self._plan_retrieval(query, user_id)
+            
+            results = await self.vector_store.asearch_batch(requests) if requests else []
+            retrieved_docs = [doc for documents in results for doc in documents]
+            
+            if get_favorites:
+                favorite_ingredients = await self.vector_store.aget_favorite_ingredients(user_id)
+                retrieved_docs.extend(self._favorites_documents(favorite_ingredients, user_id))
+        
+        metrics.observe("cocktail_retrieved_documents", len(retrieved_docs))
+        return retrieved_docs
+    
+    @staticmethod
+    def _favorites_documents(favorite_ingredients: List[str], user_id: str) -> List[Document]:
+        """Wrap the user's favorite ingredients in a context document"""
+        if not favorite_ingredients:
+            return []
+        favorites_text = f"User's favorite ingredients: {', '.join(favorite_ingredients)}"
+        return [Document(page_content=favorites_text, metadata={"type": "favorite_ingredients", "user_id": user_id})]
+    
+    def _combine_documents(self, documents: List[Document], user_id: str) -> Tuple[str, List[str], Optional[str]]:
         """
         Combine documents into a single context string
         
+        Duplicates are dropped and the rest packed into the context token
+        budget, so the sources are exactly the cocktails the LLM sees.
+        
         Args:
             documents: List of documents
+            user_id: User the documents were retrieved for
             
         Returns:
-            Combined context string
+            Tuple of (combined context string, sources, user_id if any of the
+            user's memories made it into the context, else None)
         """
         if not documents:
-            return ""
-        
-        context_parts = []
+            return "", [], None
         
-        for doc in documents:
-            context_parts.append(doc.page_content)
+        with stage("context_build"):
+            context, sources = self.context_builder.build(documents)
+        metrics.observe("cocktail_context_cocktails", len(sources))
         
-        return "\n\n".join(context_parts)
\ No newline at end of file
+        personal = any(
+            document.metadata.get("user_id") == user_id and document.page_content.strip() in context
+            for document in documents if document.metadata
+        )
+        return context, sources, user_id if personal else None
\ No newline at end of file
@@ -0,0 +1,171 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class CachedResponse:
+    """A generated response and what it cost to produce"""
+    vector: np.ndarray
+    scope: str
+    response: str
+    sources: List[str]
+    created_at: float
+    generation_seconds: float
+
+
+class SemanticResponseCache:
+    """
+    Response cache keyed on query similarity within an exact scope
+
+    The scope is a fingerprint of everything besides the query wording that
+    shapes an answer: the retrieved context (sources and memories), the
+    user when the context holds their memories, the previous exchange and
+    the conversation summary. A lookup only considers entries with the same
+    scope, and hits when the cosine similarity of the query embeddings is
+    at least the threshold. Entries expire after a TTL and the least
+    recently used ones are evicted once the cache is full.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 1024):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[int, CachedResponse]" = OrderedDict()
+        self._by_scope: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "seconds_saved": 0.0}
+
+    @staticmethod
+    def scope_key(
+        user_id: Optional[str],
+        context: str,
+        history: List[Dict[str, str]]
+    ) -> str:
+        """
+        Fingerprint the non-query inputs of a response
+
+        Args:
+            user_id: User whose memories are in the context, None if it holds none
+            context: Retrieved context passed to the LLM
+            history: Conversation summary and turns the answer depends on
+
+        Returns:
+            Scope key
+        """
+        digest = hashlib.sha256()
+        digest.update((user_id or "").encode("utf-8") + b"\x00")
+        digest.update(context.encode("utf-8") + b"\x00")
+        for entry in history:
+            digest.update(f"{entry['role']}\x01{entry['content']}\x00".encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def lookup(self, vector: List[float], scope: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Find a cached response for a similar query in the same scope
+
+        Args:
+            vector: Query embedding
+            scope: Scope key from scope_key()
+
+        Returns:
+            Tuple of (response, sources) on a hit, None on a miss
+        """
+        query = self._normalize(vector)
+        now = time.monotonic()
+
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_scope.get(scope, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self._stats["expirations"] += 1
+                    continue
+                score = float(entry.vector @ query)
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self._stats["misses"] += 1
+                return None
+
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self._stats["hits"] += 1
+            self._stats["seconds_saved"] += entry.generation_seconds
+            return entry.response, list(entry.sources)
+
+    def store(
+        self,
+        vector: List[float],
+        scope: str,
+        response: str,
+        sources: List[str],
+        generation_seconds: float
+    ) -> None:
+        """
+        Cache a generated response
+
+        Args:
+            vector: Query embedding
+            scope: Scope key from scope_key()
+            response: Generated response
+            sources: Sources returned with the response
+            generation_seconds: Time it took to generate, reported as saved on hits
+        """
+        entry = CachedResponse(
+            vector=self._normalize(vector),
+            scope=scope,
+            response=response,
+            sources=list(sources),
+            created_at=time.monotonic(),
+            generation_seconds=generation_seconds
+        )
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._by_scope.setdefault(scope, []).append(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._stats["evictions"] += 1
+
+    def _remove(self, entry_id: int) -> None:
+        # Caller holds self._lock
+        entry = self._entries.pop(entry_id)
+        scope_ids = self._by_scope[entry.scope]
+        scope_ids.remove(entry_id)
+        if not scope_ids:
+            del self._by_scope[entry.scope]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get cache counters
+
+        Returns:
+            Dictionary with hits, misses, hit rate, evictions and seconds of generation saved
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["seconds_saved"] = round(stats["seconds_saved"], 4)
+        return stats
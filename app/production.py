@@ -0,0 +1,100 @@
+import os
+import secrets
+import tempfile
+import multiprocessing
+
+import uvicorn
+
+from app.config import (
+    HOST,
+    PORT,
+    USER_PREFERENCES_PATH,
+    USER_PREFERENCES_FLUSH_SECONDS,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE
+)
+
+
+def prepare_index() -> str:
+    """
+    Build the index artifact the workers load, once, before any worker starts
+
+    Workers open the artifact read-only; its snapshots are memory-mapped, so
+    the workers share their pages. Nothing is rebuilt if the current artifact
+    is up to date.
+
+    Returns:
+        Version of the current artifact
+    """
+    from app.build_index import build
+
+    return build()
+
+
+def start_memory_service(address: str, authkey: str) -> multiprocessing.Process:
+    """
+    Start the process that owns all user memory reads and writes
+
+    Args:
+        address: Unix socket path for the service
+        authkey: Shared secret for worker connections
+
+    Returns:
+        The running service process
+    """
+    from app.db.vector_store import VectorStore, USER_MEMORIES
+    from app.db.memory_service import run_memory_service
+
+    # Spawned, not forked: the parent has Chroma clients and background threads
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_memory_service,
+        args=(
+            address,
+            authkey.encode("utf-8"),
+            USER_PREFERENCES_PATH,
+            VectorStore._backend_path(USER_MEMORIES),
+            USER_PREFERENCES_FLUSH_SECONDS
+        ),
+        name="memory-service"
+    )
+    process.start()
+    return process
+
+
+def serve(workers: int) -> None:
+    """
+    Run the app with several worker processes
+
+    Indexing happens here, before the workers start; each worker then loads
+    the index artifact read-only and sends user memory calls to one
+    memory service process, which also holds the conversation sessions, so
+    a follow-up can land on any worker. Account-wide LLM rate limits are
+    split evenly between the workers. Metrics stay per worker.
+
+    Args:
+        workers: Number of worker processes
+    """
+    prepare_index()
+
+    address = os.path.join(tempfile.gettempdir(), f"cocktail-memory-{os.getpid()}.sock")
+    authkey = secrets.token_hex(16)
+    memory_service = start_memory_service(address, authkey)
+
+    # Workers are spawned by uvicorn and read their configuration from the environment
+    os.environ.update({
+        "INDEX_READ_ONLY": "true",
+        "MEMORY_SERVICE_ADDRESS": address,
+        "MEMORY_SERVICE_AUTHKEY": authkey,
+        "LLM_REQUESTS_PER_MINUTE": str(LLM_REQUESTS_PER_MINUTE / workers),
+        "LLM_TOKENS_PER_MINUTE": str(LLM_TOKENS_PER_MINUTE / workers)
+    })
+
+    print(f"Starting Cocktail Advisor Chat on http://{HOST}:{PORT} with {workers} workers")
+    try:
+        uvicorn.run("main:app", host=HOST, port=PORT, workers=workers)
+    finally:
+        # SIGTERM makes the service flush pending memories before exiting
+        memory_service.terminate()
+        memory_service.join(timeout=10)
+        if os.path.exists(address):
+            os.remove(address)
@@ -5,8 +5,11 @@ document.addEventListener('DOMContentLoaded', function() {
     const sendButton = document.getElementById('send-button');
     const suggestionButtons = document.querySelectorAll('.suggestion');
     
-    // Chat history for context
-    let chatHistory = [];
+    // Server-side conversation session, assigned by the first response
+    let sessionId = null;
+    
+    // Stable per-browser ID so preferences are remembered per user
+    const userId = getUserId();
     
     // Add event listeners
     sendButton.addEventListener('click', sendMessage);
@@ -41,47 +44,25 @@ document.addEventListener('DOMContentLoaded', function() {
         // Show typing indicator
         showTypingIndicator();
         
-        // Add to chat history
-        chatHistory.push({
-            role: 'user',
-            content: message
-        });
-        
-        // Send message to API
-        fetch('/api/chat', {
+        // Send message to API, streaming the response
+        fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
                 message: message,
-                history: chatHistory
+                session_id: sessionId,
+                user_id: userId
             })
         })
         .then(response => {
-            if (!response.ok) {
+            if (!response.ok || !response.body) {
                 throw new Error('Network response was not ok');
             }
-            return response.json();
+            return readStream(response.body);
         })
-        .then(data => {
-            // Remove typing indicator
-            removeTypingIndicator();
-            
-            // Add assistant message to chat
-            addMessageToChat('assistant', data.message, data.sources);
-            
-            // Add to chat history
-            chatHistory.push({
-                role: 'assistant',
-                content: data.message
-            });
-            
-            // Keep chat history manageable (limit to last 10 exchanges)
-            if (chatHistory.length > 20) {
-                chatHistory = chatHistory.slice(-20);
-            }
-            
+        .then(() => {
             // Scroll to bottom
             scrollToBottom();
         })
@@ -96,6 +77,60 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Function to read the NDJSON event stream and render it incrementally
+    async function readStream(body) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let fullMessage = '';
+        let sources = null;
+        let contentElement = null;
+        
+        function render() {
+            if (!contentElement) {
+                // First token: swap the typing indicator for the message
+                removeTypingIndicator();
+                contentElement = addMessageToChat('assistant', '');
+            }
+            contentElement.innerHTML = formatMessageContent(fullMessage);
+            appendSources(contentElement, sources);
+            scrollToBottom();
+        }
+        
+        function handleEvent(event) {
+            if (event.type === 'session') {
+                sessionId = event.session_id;
+            } else if (event.type === 'sources') {
+                sources = event.sources;
+            } else if (event.type === 'token') {
+                fullMessage += event.content;
+                render();
+            } else if (event.type === 'error') {
+                throw new Error(event.detail);
+            }
+        }
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            
+            lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+        }
+        
+        if (buffer.trim()) {
+            handleEvent(JSON.parse(buffer));
+        }
+        
+        // Make sure something is shown even for an empty response
+        render();
+        
+        return fullMessage;
+    }
+    
     // Function to add message to chat
     function addMessageToChat(role, content, sources = null) {
         const messageElement = document.createElement('div');
@@ -117,12 +152,7 @@ document.addEventListener('DOMContentLoaded', function() {
         contentElement.innerHTML = formattedContent;
         
         // Add sources if available
-        if (sources && sources.length > 0) {
-            const sourcesElement = document.createElement('div');
-            sourcesElement.classList.add('sources');
-            sourcesElement.textContent = 'Sources: ' + sources.join(', ');
-            contentElement.appendChild(sourcesElement);
-        }
+        appendSources(contentElement, sources);
         
         messageElement.appendChild(avatarElement);
         messageElement.appendChild(contentElement);
@@ -131,6 +161,18 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to bottom
         scrollToBottom();
+        
+        return contentElement;
+    }
+    
+    // Function to add the sources line to a message
+    function appendSources(contentElement, sources) {
+        if (sources && sources.length > 0) {
+            const sourcesElement = document.createElement('div');
+            sourcesElement.classList.add('sources');
+            sourcesElement.textContent = 'Sources: ' + sources.join(', ');
+            contentElement.appendChild(sourcesElement);
+        }
     }
     
     // Function to format message content
@@ -204,6 +246,30 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Function to get or create the user ID stored in this browser
+    function getUserId() {
+        const storageKey = 'cocktailAdvisorUserId';
+        let id = null;
+        try {
+            id = localStorage.getItem(storageKey);
+        } catch (error) {
+            // Storage may be unavailable (e.g. private browsing); fall back to a per-page ID
+        }
+        
+        if (!id) {
+            id = (window.crypto && crypto.randomUUID)
+                ? crypto.randomUUID()
+                : Date.now().toString(36) + Math.random().toString(36).slice(2);
+            try {
+                localStorage.setItem(storageKey, id);
+            } catch (error) {
+                // Ignore, the ID just won't survive a reload
+            }
+        }
+        
+        return id;
+    }
+    
     // Function to scroll to bottom of chat
     function scrollToBottom() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
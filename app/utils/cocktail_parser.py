@@ -1,52 +1,440 @@
-import pandas as pd
-import kagglehub
-from kagglehub import KaggleDatasetAdapter
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Sequence, Mapping
+from array import array
+import ast
+import hashlib
 import os
+import re
 
-from app.config import DATA_DIR, COCKTAILS_DATA
+from app.config import DATA_DIR, COCKTAILS_DATA, COCKTAILS_SNAPSHOT
+from app.utils.cocktail_store import CocktailStore, CocktailView
 
-def load_cocktail_data() -> List[Dict[str, Any]]:
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def load_cocktail_data() -> CocktailStore:
     """
     Load cocktail data from Kaggle dataset
     
+    A binary snapshot of the parsed dataset is written next to the CSV and
+    memory-mapped on later loads, so the CSV is only parsed when it changes.
+    
     Returns:
-        List of cocktail dictionaries
+        CocktailStore, a sequence of cocktail views
     """
+    global _catalog
+    
     # Create data directory if it doesn't exist
     os.makedirs(DATA_DIR, exist_ok=True)
     
-    # Check if dataset already exists
+    store = None
     if os.path.exists(COCKTAILS_DATA):
+        store = CocktailStore.load(COCKTAILS_SNAPSHOT, source_path=COCKTAILS_DATA)
+        if store is not None:
+            print(f"Loaded cocktails snapshot from {COCKTAILS_SNAPSHOT}")
+    
+    if store is None:
+        store = CocktailStore.from_records(_read_cocktail_records())
+        if os.path.exists(COCKTAILS_DATA):
+            try:
+                store.save(COCKTAILS_SNAPSHOT, source_path=COCKTAILS_DATA)
+                print(f"Saved cocktails snapshot to {COCKTAILS_SNAPSHOT}")
+            except OSError as e:
+                print(f"Error saving cocktails snapshot: {e}")
+    
+    # Build the structured index once for exact-match queries
+    _catalog = CocktailCatalog(store)
+    
+    print(f"Loaded {len(store)} cocktails")
+    return store
+
+def _read_cocktail_records() -> List[Dict[str, Any]]:
+    """
+    Read the raw cocktail records, downloading the dataset if needed
+    
+    Returns:
+        List of cocktail dictionaries
+    """
+    # Imported here so the snapshot path never pays for pandas or kagglehub
+    import pandas as pd
+    
+    # Check if dataset already exists
+    if os.path.exists(COCKTAILS_DATA) or download_cocktail_data():
         print(f"Loading cocktails from {COCKTAILS_DATA}")
         df = pd.read_csv(COCKTAILS_DATA)
     else:
-        print("Downloading cocktails dataset from Kaggle...")
+        # Create an empty DataFrame with the expected columns
+        df = pd.DataFrame(columns=[
+            "name", "alcoholic", "category", "glassType", "instructions",
+            "ingredients", "ingredientMeasures"
+        ])
+    
+    # Convert DataFrame to list of dictionaries
+    return df.to_dict(orient="records")
+
+def download_cocktail_data(path: str = COCKTAILS_DATA) -> bool:
+    """
+    Download the cocktails dataset from Kaggle and save it as CSV
+    
+    Args:
+        path: Where to save the CSV
+        
+    Returns:
+        True if the dataset was saved
+    """
+    print("Downloading cocktails dataset from Kaggle...")
+    try:
+        import kagglehub
+        from kagglehub import KaggleDatasetAdapter
+        
+        # Download dataset from Kaggle
+        df = kagglehub.load_dataset(
+            KaggleDatasetAdapter.PANDAS,
+            "aadyasingh55/cocktails",
+            ""  # Empty string to get all files
+        )
+        
+        # Save dataset locally
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        df.to_csv(path, index=False)
+        print(f"Saved cocktails dataset to {path}")
+        return True
+    except Exception as e:
+        print(f"Error downloading dataset: {e}")
+        return False
+
+def format_cocktail(cocktail: Mapping[str, Any]) -> str:
+    """Create the formatted text that is embedded and shown to the LLM for a cocktail"""
+    cocktail_text = f"Name: {cocktail['name']}\n"
+    cocktail_text += f"Category: {cocktail['category']}\n"
+    cocktail_text += f"Alcoholic: {cocktail['alcoholic']}\n"
+    cocktail_text += f"Glass: {cocktail['glassType']}\n"
+    cocktail_text += f"Ingredients: {cocktail.get('ingredients', '')}\n"
+    cocktail_text += f"Ingredient Measures: {cocktail.get('ingredientMeasures', '')}\n"
+    cocktail_text += f"Instructions: {cocktail['instructions']}\n"
+    return cocktail_text
+
+def cocktail_doc_id(cocktail_text: str) -> str:
+    """Stable document ID derived from the cocktail's formatted text"""
+    return hashlib.sha256(cocktail_text.encode("utf-8")).hexdigest()[:32]
+
+def cocktail_metadata(cocktail: Mapping[str, Any], doc_id: str) -> Dict[str, Any]:
+    """Metadata stored with a cocktail document"""
+    return {
+        "id": doc_id,
+        "name": cocktail['name'],
+        "category": cocktail['category'],
+        "alcoholic": cocktail['alcoholic'],
+        "glass": cocktail['glassType'],
+        "ingredients": cocktail.get('ingredients', ''),
+        "measures": cocktail.get('ingredientMeasures', '')
+    }
+
+def parse_list_field(value: Any) -> List[str]:
+    """
+    Parse a stringified list column such as "['Gin', 'Lemon Juice']"
+    
+    Args:
+        value: Raw column value
+        
+    Returns:
+        List of stripped strings, empty if the value can't be parsed
+    """
+    if isinstance(value, list):
+        items = value
+    elif isinstance(value, str) and value.strip():
         try:
-            # Download dataset from Kaggle
-            df = kagglehub.load_dataset(
-                KaggleDatasetAdapter.PANDAS,
-                "aadyasingh55/cocktails",
-                ""  # Empty string to get all files
-            )
+            items = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            items = value.split(",")
+        if not isinstance(items, (list, tuple)):
+            items = [items]
+    else:
+        return []
+    
+    return [str(item).strip() for item in items if item is not None and str(item).strip()]
+
+class CocktailCatalog:
+    """
+    Structured index over the cocktail dataset
+    
+    Ingredient lists are parsed once. Each ingredient maps to a sorted array
+    of cocktail ids (its postings), and every ingredient and attribute value
+    also has a bitset (a Python int, bit i set for cocktail i), so boolean
+    queries reduce to a handful of integer AND/OR/NOT operations.
+    """
+    
+    ATTRIBUTES = {"alcoholic": "alcoholic", "category": "category", "glass": "glassType"}
+    
+    def __init__(self, cocktails: Sequence[Mapping[str, Any]]):
+        self.cocktails = cocktails
+        self.ingredients: List[List[str]] = [
+            c.ingredients if isinstance(c, CocktailView) else parse_list_field(c.get("ingredients"))
+            for c in cocktails
+        ]
+        self.all_bits = (1 << len(cocktails)) - 1
+        
+        # Inverted postings: ingredient -> sorted cocktail ids
+        postings: Dict[str, List[int]] = {}
+        for cocktail_id, ingredients in enumerate(self.ingredients):
+            for ingredient in ingredients:
+                ids = postings.setdefault(ingredient.lower(), [])
+                if not ids or ids[-1] != cocktail_id:
+                    ids.append(cocktail_id)
+        self.postings: Dict[str, array] = {ing: array("I", ids) for ing, ids in postings.items()}
+        self._ingredient_bits: Dict[str, int] = {ing: self._to_bits(ids) for ing, ids in postings.items()}
+        
+        # Word -> ingredients containing that word, so "lemon" also finds "Lemon juice"
+        self._word_to_ingredients: Dict[str, Set[str]] = {}
+        for ingredient in self._ingredient_bits:
+            for word in _WORD_RE.findall(ingredient):
+                self._word_to_ingredients.setdefault(word, set()).add(ingredient)
+        
+        # Attribute bitsets: attribute -> normalized value -> bits
+        self.attribute_bits: Dict[str, Dict[str, int]] = {}
+        for attribute, column in self.ATTRIBUTES.items():
+            values: Dict[str, List[int]] = {}
+            for cocktail_id, cocktail in enumerate(cocktails):
+                values.setdefault(self._normalize(cocktail.get(column)), []).append(cocktail_id)
+            self.attribute_bits[attribute] = {value: self._to_bits(ids) for value, ids in values.items()}
+        
+        self._name_to_id: Dict[str, int] = {}
+        for cocktail_id, cocktail in enumerate(cocktails):
+            self._name_to_id.setdefault(str(cocktail.get("name", "")).lower(), cocktail_id)
+        self._name_re: Optional[re.Pattern] = None
+    
+    def __len__(self) -> int:
+        return len(self.cocktails)
+    
+    @staticmethod
+    def _normalize(value: Any) -> str:
+        return " ".join(_WORD_RE.findall(str(value).lower())) if isinstance(value, str) else ""
+    
+    @staticmethod
+    def _to_bits(ids: List[int]) -> int:
+        bits = 0
+        for cocktail_id in ids:
+            bits |= 1 << cocktail_id
+        return bits
+    
+    @staticmethod
+    def _to_ids(bits: int) -> List[int]:
+        ids = []
+        while bits:
+            low = bits & -bits
+            ids.append(low.bit_length() - 1)
+            bits ^= low
+        return ids
+    
+    def ingredient_bits(self, term: str) -> int:
+        """
+        Bitset of cocktails with an ingredient matching the term
+        
+        Matches the ingredient with exactly that name plus every ingredient
+        containing all of the term's words ("lemon" -> "Lemon juice").
+        
+        Args:
+            term: Ingredient name or word(s)
             
-            # Save dataset locally
-            df.to_csv(COCKTAILS_DATA, index=False)
-            print(f"Saved cocktails dataset to {COCKTAILS_DATA}")
-        except Exception as e:
-            print(f"Error downloading dataset: {e}")
-            # Create an empty DataFrame with the expected columns
-            df = pd.DataFrame(columns=[
-                "strDrink", "strCategory", "strAlcoholic", "strGlass", "strInstructions"
-            ] + [f"strIngredient{i}" for i in range(1, 16)] + [f"strMeasure{i}" for i in range(1, 16)])
+        Returns:
+            Bitset of matching cocktail ids
+        """
+        bits = 0
+        for ingredient in self.ingredients_matching(term):
+            bits |= self._ingredient_bits[ingredient]
+        return bits
     
-    # Convert DataFrame to list of dictionaries
-    cocktails = df.to_dict(orient="records")
+    def ingredients_matching(self, term: str) -> Set[str]:
+        """
+        Ingredient names a term refers to, as ingredient_bits() matches them
+        
+        Args:
+            term: Ingredient name or word(s)
+            
+        Returns:
+            Set of lowercased ingredient names
+        """
+        term = term.strip().lower()
+        words = _WORD_RE.findall(term)
+        matches: Set[str] = set()
+        if words:
+            matches = set(self._word_to_ingredients.get(words[0], ()))
+            for word in words[1:]:
+                matches &= self._word_to_ingredients.get(word, set())
+        if term in self._ingredient_bits:
+            matches.add(term)
+        return matches
+    
+    def attribute_bits_for(self, attribute: str, value: str) -> int:
+        """
+        Bitset of cocktails whose attribute equals the value
+        
+        Args:
+            attribute: One of "alcoholic", "category" or "glass"
+            value: Attribute value (case and punctuation insensitive)
+            
+        Returns:
+            Bitset of matching cocktail ids
+        """
+        return self.attribute_bits[attribute].get(self._normalize(value), 0)
+    
+    def query(
+        self,
+        all_of: Optional[List[str]] = None,
+        any_of: Optional[List[str]] = None,
+        none_of: Optional[List[str]] = None,
+        **attributes: str
+    ) -> List[int]:
+        """
+        Find cocktails by ingredients and attributes
+        
+        Args:
+            all_of: Ingredients that must all be present
+            any_of: Ingredients of which at least one must be present
+            none_of: Ingredients that must be absent
+            attributes: Attribute filters, e.g. alcoholic="Non alcoholic"
+            
+        Returns:
+            Sorted list of matching cocktail ids
+        """
+        bits = self.all_bits
+        
+        for term in all_of or []:
+            bits &= self.ingredient_bits(term)
+        if any_of:
+            any_bits = 0
+            for term in any_of:
+                any_bits |= self.ingredient_bits(term)
+            bits &= any_bits
+        for term in none_of or []:
+            bits &= ~self.ingredient_bits(term)
+        for attribute, value in attributes.items():
+            if value is not None:
+                bits &= self.attribute_bits_for(attribute, value)
+        
+        return self._to_ids(bits & self.all_bits)
+    
+    def search(self, expression: str) -> List[int]:
+        """
+        Evaluate a boolean ingredient expression
+        
+        The expression is OR-separated groups of AND-joined terms, where a term
+        prefixed with NOT is excluded. Comma-separated qualifiers after the
+        expression filter attributes, e.g.
+        "gin AND lemon NOT sugar, non-alcoholic" or "rum OR vodka, glass: highball glass".
+        
+        Args:
+            expression: Query expression
+            
+        Returns:
+            Sorted list of matching cocktail ids
+        """
+        expression_part, *qualifiers = expression.split(",")
+        
+        bits = 0
+        for group in re.split(r"\s+OR\s+", expression_part.strip(), flags=re.IGNORECASE):
+            group_bits = self.all_bits
+            for clause in re.split(r"\s+(?=(?:AND|NOT)\s)", group, flags=re.IGNORECASE):
+                negate = False
+                clause = clause.strip()
+                if clause.upper().startswith("AND "):
+                    clause = clause[4:].strip()
+                if clause.upper().startswith("NOT "):
+                    negate = True
+                    clause = clause[4:].strip()
+                if not clause:
+                    continue
+                term_bits = self.ingredient_bits(clause)
+                group_bits &= ~term_bits if negate else term_bits
+            bits |= group_bits
+        
+        for qualifier in qualifiers:
+            attribute, _, value = qualifier.partition(":")
+            if value:
+                bits &= self.attribute_bits_for(attribute.strip().lower(), value)
+            elif attribute.strip():
+                # Bare qualifiers such as "non-alcoholic" refer to the alcoholic attribute
+                bits &= self.attribute_bits_for("alcoholic", attribute)
+        
+        return self._to_ids(bits & self.all_bits)
+    
+    @property
+    def ingredient_names(self) -> List[str]:
+        """All distinct ingredient names, lowercased"""
+        return list(self._ingredient_bits)
     
-    print(f"Loaded {len(cocktails)} cocktails")
-    return cocktails
+    @property
+    def cocktail_names(self) -> List[str]:
+        """All distinct cocktail names, lowercased"""
+        return list(self._name_to_id)
+    
+    def get(self, cocktail_id: int) -> Mapping[str, Any]:
+        """Get a cocktail by id"""
+        return self.cocktails[cocktail_id]
+    
+    def find_by_name(self, name: str) -> Optional[int]:
+        """Get a cocktail id by exact (case-insensitive) name"""
+        return self._name_to_id.get(name.strip().lower())
+    
+    def find_names_in(self, text: str) -> List[int]:
+        """
+        Find cocktails mentioned by name in free text
+        
+        Args:
+            text: Text to scan, e.g. "something similar to a Mojito please"
+            
+        Returns:
+            Ids of the cocktails named, in order of appearance; longer names win
+            over names they contain
+        """
+        if self._name_re is None:
+            # Longest names first so "Long Island Iced Tea" beats "Iced Tea"
+            names = sorted((name for name in self._name_to_id if name), key=len, reverse=True)
+            self._name_re = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(name) for name in names) + r")(?!\w)")
+        
+        ids = []
+        for match in self._name_re.finditer(text.lower()):
+            cocktail_id = self._name_to_id[match.group(0)]
+            if cocktail_id not in ids:
+                ids.append(cocktail_id)
+        return ids
+
+_catalog: Optional[CocktailCatalog] = None
 
-def get_alcoholic_cocktails(cocktails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def get_cocktail_catalog(cocktails: Optional[Sequence[Mapping[str, Any]]] = None) -> CocktailCatalog:
+    """
+    Get the catalog for a list of cocktails, reusing the one built at load time
+    
+    Args:
+        cocktails: List of cocktail dictionaries, defaults to the loaded dataset
+        
+    Returns:
+        CocktailCatalog
+    """
+    global _catalog
+    
+    if cocktails is None:
+        if _catalog is None:
+            load_cocktail_data()
+        return _catalog
+    if _catalog is not None and _catalog.cocktails is cocktails:
+        return _catalog
+    return CocktailCatalog(cocktails)
+
+def use_cocktail_store(store: CocktailStore) -> CocktailCatalog:
+    """
+    Make a store loaded from elsewhere, such as an index artifact, the current dataset
+    
+    Args:
+        store: Cocktail store
+        
+    Returns:
+        CocktailCatalog for the store, also returned by get_cocktail_catalog() from now on
+    """
+    global _catalog
+    
+    _catalog = CocktailCatalog(store)
+    return _catalog
+
+def get_alcoholic_cocktails(cocktails: Sequence[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
     """
     Get alcoholic cocktails
     
@@ -56,9 +444,10 @@ def get_alcoholic_cocktails(cocktails: List[Dict[str, Any]]) -> List[Dict[str, A
     Returns:
         List of alcoholic cocktail dictionaries
     """
-    return [c for c in cocktails if c.get("strAlcoholic", "").lower() == "alcoholic"]
+    catalog = get_cocktail_catalog(cocktails)
+    return [catalog.get(i) for i in catalog.query(alcoholic="Alcoholic")]
 
-def get_non_alcoholic_cocktails(cocktails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def get_non_alcoholic_cocktails(cocktails: Sequence[Mapping[str, Any]]) -> List[Mapping[str, Any]]:
     """
     Get non-alcoholic cocktails
     
@@ -68,9 +457,10 @@ def get_non_alcoholic_cocktails(cocktails: List[Dict[str, Any]]) -> List[Dict[st
     Returns:
         List of non-alcoholic cocktail dictionaries
     """
-    return [c for c in cocktails if c.get("strAlcoholic", "").lower() == "non alcoholic"]
+    catalog = get_cocktail_catalog(cocktails)
+    return [catalog.get(i) for i in catalog.query(alcoholic="Non alcoholic")]
 
-def get_cocktails_with_ingredient(cocktails: List[Dict[str, Any]], ingredient: str) -> List[Dict[str, Any]]:
+def get_cocktails_with_ingredient(cocktails: Sequence[Mapping[str, Any]], ingredient: str) -> List[Mapping[str, Any]]:
     """
     Get cocktails containing a specific ingredient
     
@@ -81,15 +471,5 @@ def get_cocktails_with_ingredient(cocktails: List[Dict[str, Any]], ingredient: s
     Returns:
         List of cocktail dictionaries containing the ingredient
     """
-    result = []
-    ingredient_lower = ingredient.lower()
-    
-    for cocktail in cocktails:
-        # Check all ingredient fields
-        for i in range(1, 16):
-            ing_key = f"strIngredient{i}"
-            if ing_key in cocktail and cocktail[ing_key] and ingredient_lower in str(cocktail[ing_key]).lower():
-                result.append(cocktail)
-                break
-    
-    return result
\ No newline at end of file
+    catalog = get_cocktail_catalog(cocktails)
+    return [catalog.get(i) for i in catalog.query(all_of=[ingredient])]
@@ -0,0 +1,348 @@
+import os
+import ast
+import sys
+import mmap
+import json
+import struct
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import List, Dict, Any, Optional, Iterator
+
+from app.db.models import Cocktail
+
+MAGIC = b"CKTLSNAP"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+
+# String id standing in for a missing (None) list item
+_NONE_ID = 0xFFFFFFFF
+
+# Integer columns, one entry per cocktail unless noted
+_ARRAY_SECTIONS = (
+    "string_offsets",   # len(strings) + 1 offsets into the string blob
+    "name",
+    "instructions",
+    "category",
+    "glass",
+    "alcoholic",
+    "ingredient_offsets",  # count + 1 offsets into ingredient/measure lists
+    "ingredient",
+    "measure",
+)
+
+
+def _raw_list(value: Any) -> List[Optional[str]]:
+    """Parse a stringified list column, keeping items verbatim"""
+    if not isinstance(value, str) or not value.strip():
+        return []
+    try:
+        items = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return [item for item in value.split(",")]
+    if not isinstance(items, (list, tuple)):
+        items = [items]
+    return [None if item is None else str(item) for item in items]
+
+
+def _text(value: Any) -> str:
+    # pandas hands back NaN floats for empty cells
+    return value if isinstance(value, str) else ""
+
+
+def _source_fingerprint(source_path: str) -> Dict[str, int]:
+    stat = os.stat(source_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class _StringTable:
+    """Interned strings and the UTF-8 blob they are stored in, for building a store"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.blob = bytearray()
+        self.offsets = array("I", [0])
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return _NONE_ID
+        if value not in self.ids:
+            self.ids[value] = len(self.ids)
+            self.blob.extend(value.encode("utf-8"))
+            self.offsets.append(len(self.blob))
+        return self.ids[value]
+
+
+class CocktailView(Mapping):
+    """
+    Read-only view of one cocktail in a CocktailStore
+
+    Attribute access returns parsed values. Item access keeps the original
+    CSV column names and formats ("glassType", stringified "ingredients"),
+    so code written against the raw records keeps working.
+    """
+
+    __slots__ = ("_store", "_index")
+
+    _KEYS = ("id", "name", "alcoholic", "category", "glassType", "instructions", "ingredients", "ingredientMeasures")
+
+    def __init__(self, store: "CocktailStore", index: int):
+        self._store = store
+        self._index = index
+
+    @property
+    def id(self) -> int:
+        return self._index
+
+    @property
+    def name(self) -> str:
+        return self._store.string(self._store.columns["name"][self._index])
+
+    @property
+    def category(self) -> str:
+        return self._store.string(self._store.columns["category"][self._index])
+
+    @property
+    def glass(self) -> str:
+        return self._store.string(self._store.columns["glass"][self._index])
+
+    @property
+    def alcoholic(self) -> str:
+        return self._store.string(self._store.columns["alcoholic"][self._index])
+
+    @property
+    def instructions(self) -> str:
+        return self._store.string(self._store.columns["instructions"][self._index])
+
+    @property
+    def ingredients(self) -> List[str]:
+        return [item.strip() for item in self._store.list_column("ingredient", self._index) if item]
+
+    @property
+    def measures(self) -> List[str]:
+        return [(item or "").strip() for item in self._store.list_column("measure", self._index)]
+
+    def to_model(self) -> Cocktail:
+        """Build the Cocktail model for this record"""
+        return Cocktail.from_view(self)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "id":
+            return self._index
+        if key == "glassType":
+            return self.glass
+        if key == "ingredients":
+            return repr(self._store.list_column("ingredient", self._index))
+        if key == "ingredientMeasures":
+            return repr(self._store.list_column("measure", self._index))
+        if key in ("name", "alcoholic", "category", "instructions"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return f"CocktailView({self._index}, {self.name!r})"
+
+
+class CocktailStore(Sequence):
+    """
+    Compact columnar store for the cocktail catalog
+
+    Every string lives once in a shared UTF-8 blob and columns hold integer
+    string ids, so repeated values such as category, glass and alcoholic are
+    interned. Ingredient and measure lists are flattened with an offsets
+    column. The whole store serializes to a versioned binary snapshot whose
+    columns are memory-mapped directly on load.
+    """
+
+    def __init__(self, columns: Dict[str, Sequence], blob: Any, source: Optional[Dict[str, int]] = None):
+        self.columns = columns
+        self._blob = blob
+        self._source = source or {}
+        self._count = len(columns["name"])
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "CocktailStore":
+        """
+        Build a store from raw CSV records
+
+        Args:
+            records: List of cocktail dictionaries with the CSV column names
+
+        Returns:
+            CocktailStore
+        """
+        strings = _StringTable()
+        intern = strings.intern
+
+        columns = {name: array("I") for name in _ARRAY_SECTIONS}
+        columns["string_offsets"] = strings.offsets
+        columns["ingredient_offsets"].append(0)
+
+        for record in records:
+            columns["name"].append(intern(_text(record.get("name"))))
+            columns["instructions"].append(intern(_text(record.get("instructions"))))
+            columns["category"].append(intern(_text(record.get("category"))))
+            columns["glass"].append(intern(_text(record.get("glassType"))))
+            columns["alcoholic"].append(intern(_text(record.get("alcoholic"))))
+
+            ingredients = _raw_list(record.get("ingredients"))
+            measures = _raw_list(record.get("ingredientMeasures"))
+            # Pad or trim measures so both lists share the offsets column
+            measures = (measures + [None] * len(ingredients))[:len(ingredients)]
+            for ingredient, measure in zip(ingredients, measures):
+                columns["ingredient"].append(intern(ingredient))
+                columns["measure"].append(intern(measure))
+            columns["ingredient_offsets"].append(len(columns["ingredient"]))
+
+        return cls(columns, bytes(strings.blob))
+
+    @classmethod
+    def concat(cls, stores: List["CocktailStore"]) -> "CocktailStore":
+        """
+        Join stores built from consecutive chunks of records
+
+        Nothing is parsed again: each store's strings are interned into one
+        table and its integer columns are remapped to the new string ids.
+
+        Args:
+            stores: Stores in record order
+
+        Returns:
+            CocktailStore holding every cocktail of the stores, in order
+        """
+        strings = _StringTable()
+        columns = {name: array("I") for name in _ARRAY_SECTIONS}
+        columns["string_offsets"] = strings.offsets
+        columns["ingredient_offsets"].append(0)
+
+        for store in stores:
+            remap = [strings.intern(store.string(i)) for i in range(len(store.columns["string_offsets"]) - 1)]
+            for name in ("name", "instructions", "category", "glass", "alcoholic"):
+                columns[name].extend(remap[i] for i in store.columns[name])
+
+            base = len(columns["ingredient"])
+            for name in ("ingredient", "measure"):
+                columns[name].extend(_NONE_ID if i == _NONE_ID else remap[i] for i in store.columns[name])
+            columns["ingredient_offsets"].extend(base + offset for offset in store.columns["ingredient_offsets"][1:])
+
+        return cls(columns, bytes(strings.blob))
+
+    def save(self, path: str, source_path: Optional[str] = None) -> None:
+        """
+        Write a binary snapshot of the store
+
+        Args:
+            path: Snapshot file path
+            source_path: Dataset file the snapshot was built from, used to detect staleness
+        """
+        sections = {}
+        payload = []
+        offset = 0
+
+        def add(name: str, data: bytes, typecode: str) -> None:
+            nonlocal offset
+            padding = -offset % 8
+            payload.append(b"\0" * padding)
+            offset += padding
+            sections[name] = [offset, len(data), typecode]
+            payload.append(data)
+            offset += len(data)
+
+        for name in _ARRAY_SECTIONS:
+            add(name, array("I", self.columns[name]).tobytes(), "I")
+        add("blob", bytes(self._blob), "B")
+
+        header = json.dumps({
+            "count": self._count,
+            "byteorder": sys.byteorder,
+            "itemsize": array("I").itemsize,
+            "source": _source_fingerprint(source_path) if source_path else {},
+            "sections": sections
+        }).encode("utf-8")
+        header += b" " * (-(len(header) + _PREAMBLE.size) % 8)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            for chunk in payload:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, source_path: Optional[str] = None) -> Optional["CocktailStore"]:
+        """
+        Memory-map a binary snapshot
+
+        Args:
+            path: Snapshot file path
+            source_path: Dataset file; the snapshot is rejected if it was built from a different version
+
+        Returns:
+            CocktailStore, or None if the snapshot is missing, stale or incompatible
+        """
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, version, header_len = _PREAMBLE.unpack_from(mapped, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                return None
+            header = json.loads(mapped[_PREAMBLE.size:_PREAMBLE.size + header_len])
+            if header["byteorder"] != sys.byteorder or header["itemsize"] != array("I").itemsize:
+                return None
+            if source_path and header["source"] != _source_fingerprint(source_path):
+                return None
+        except (struct.error, ValueError, KeyError, OSError):
+            return None
+
+        base = _PREAMBLE.size + header_len
+        view = memoryview(mapped)
+        columns = {}
+        for name, (offset, length, typecode) in header["sections"].items():
+            section = view[base + offset:base + offset + length]
+            columns[name] = section.cast(typecode) if typecode != "B" else section
+        blob = columns.pop("blob")
+
+        store = cls(columns, blob, header["source"])
+        store._mmap = mapped
+        return store
+
+    def string(self, string_id: int) -> str:
+        """Decode a string from the shared blob"""
+        offsets = self.columns["string_offsets"]
+        return str(self._blob[offsets[string_id]:offsets[string_id + 1]], "utf-8")
+
+    def list_column(self, name: str, index: int) -> List[Optional[str]]:
+        """Decode the ingredient or measure list of one cocktail"""
+        offsets = self.columns["ingredient_offsets"]
+        column = self.columns[name]
+        return [
+            None if column[i] == _NONE_ID else self.string(column[i])
+            for i in range(offsets[index], offsets[index + 1])
+        ]
+
+    def distinct(self, name: str) -> List[str]:
+        """Distinct values of an interned column such as "category" or "glass" """
+        return [self.string(string_id) for string_id in sorted(set(self.columns[name]))]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [CocktailView(self, i) for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return CocktailView(self, index)
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Tuple
 import re
 
 class MemoryHandler:
@@ -52,4 +52,183 @@ class MemoryHandler:
             matches = re.findall(pattern, text)
             cocktails.extend(matches)
         
-        return cocktails
\ No newline at end of file
+        return cocktails
+
+class PreferenceMatcher:
+    """
+    Cheap local stage in front of the LLM preference detector
+    
+    A message is first checked for first-person preference cues ("I love",
+    "I can't stand", "my favorite cocktail is"). A message with neither a cue
+    nor a known ingredient or cocktail name can't hold a preference and the
+    LLM is skipped; so is a single question without a cue. With an
+    unambiguous cue and known ingredients or cocktail names from the catalog
+    lexicon as the cue's object, the preference is extracted locally, so "my
+    favorite drink is gin" is stored as an ingredient and a cocktail is only
+    taken when its name is in the catalog. Questions, messages with a negator
+    outside the cue ("but not", "without") and messages with more than one
+    clause are reported as ambiguous so the caller can fall back to the LLM,
+    as is everything else, including known names without a cue ("gin is
+    great, hate anything with cream").
+    """
+    
+    NONE = "none"
+    LOCAL = "local"
+    AMBIGUOUS = "ambiguous"
+    
+    _ADVERBS = r"(?:really\s+|absolutely\s+|just\s+|totally\s+|also\s+)*"
+    
+    POSITIVE_RE = re.compile(
+        r"\b(?:i|we)\s+" + _ADVERBS + r"(?:like|love|enjoy|prefer|adore)\b"
+        r"|\bmy\s+(?:favou?rite|preferred)\s+(?:\w+\s+){0,2}(?:is|are)\b"
+        r"|\b(?<!what )(?<!which )(?<!who )(?:is|are)\s+my\s+(?:favou?rites?|go-to)\b"
+        r"|\bi'?m\s+(?:a\s+)?(?:big\s+|huge\s+)?fan\s+of\b",
+        re.IGNORECASE
+    )
+    NEGATIVE_RE = re.compile(
+        r"\b(?:i|we)\s+" + _ADVERBS + r"(?:dislike|hate|detest|can'?t\s+stand"
+        r"|don'?t\s+(?:like|enjoy|want)|do\s+not\s+(?:like|enjoy|want))\b"
+        r"|\bi'?m\s+allergic\s+to\b|\bi\s+am\s+allergic\s+to\b"
+        r"|\bnot\s+a\s+(?:big\s+)?fan\s+of\b",
+        re.IGNORECASE
+    )
+    # Anything that can flip or restrict the cue's meaning ("I like gin but not vodka")
+    NEGATOR_RE = re.compile(r"\b(?:not|no|never|without|except|but)\b|n'?t\b", re.IGNORECASE)
+    QUESTION_RE = re.compile(
+        r"\?|^\s*(?:do|does|did|what|which|how|why|can|could|should|would|will|is|are)\b",
+        re.IGNORECASE
+    )
+    # A second sentence, or a comma or conjunction opening a new clause
+    CLAUSE_RE = re.compile(
+        r"[.;!?]\s*\S"
+        r"|,\s*(?:and\s+|so\s+)?(?:i|we|you|it|what|which|how|can|could|would|should|do|does)\b"
+        r"|\b(?:because|although|though|while|if|when|so)\b",
+        re.IGNORECASE
+    )
+    # What may separate the entities of one object list ("gin, rum and the lime juice")
+    JOINER_RE = re.compile(r"(?:\s+|,|&|\b(?:and|or|the|a|an|some|also|too)\b)*")
+    # Cues whose object comes before them ("Gin is my favorite")
+    OBJECT_FIRST_RE = re.compile(r"^(?:is|are)\b", re.IGNORECASE)
+    
+    def __init__(self, ingredients: Iterable[str] = (), cocktails: Iterable[str] = ()):
+        self._kinds: Dict[str, str] = {}
+        for name in cocktails:
+            if name:
+                self._kinds[name.lower()] = "cocktail"
+        for name in ingredients:
+            if name:
+                # Ingredient wins when a name is both
+                self._kinds[name.lower()] = "ingredient"
+        
+        # Longest names first so "lemon juice" beats "lemon"
+        names = sorted(self._kinds, key=len, reverse=True)
+        self._lexicon_re = (
+            re.compile(r"(?<!\w)(?:" + "|".join(re.escape(name) for name in names) + r")(?!\w)")
+            if names else None
+        )
+        
+        self.counters = {self.NONE: 0, self.LOCAL: 0, self.AMBIGUOUS: 0}
+    
+    @classmethod
+    def from_catalog(cls, catalog) -> "PreferenceMatcher":
+        """Build a matcher whose lexicon holds the catalog's ingredients and cocktail names"""
+        return cls(catalog.ingredient_names, catalog.cocktail_names)
+    
+    def _governed_entities(self, message: str, cue: re.Match) -> List[Tuple[str, str]]:
+        """
+        Known (kind, name) entities that are the object of the cue
+        
+        That is the list of entities right after the cue ("I love gin and
+        rum"), or right before it for "X is my favorite", separated only by
+        commas, conjunctions and articles. Entities anywhere else in the
+        message are not taken.
+        """
+        if self._lexicon_re is None:
+            return []
+        lowered = message.lower()
+        matches = list(self._lexicon_re.finditer(lowered))
+        
+        governed = []
+        if self.OBJECT_FIRST_RE.match(cue.group(0)):
+            position = cue.start()
+            for match in reversed([m for m in matches if m.end() <= cue.start()]):
+                if not self.JOINER_RE.fullmatch(lowered[match.end():position]):
+                    break
+                governed.insert(0, match)
+                position = match.start()
+        else:
+            position = cue.end()
+            for match in (m for m in matches if m.start() >= cue.end()):
+                if not self.JOINER_RE.fullmatch(lowered[position:match.start()]):
+                    break
+                governed.append(match)
+                position = match.end()
+        
+        entities = []
+        for match in governed:
+            entity = (self._kinds[match.group(0)], match.group(0))
+            if entity not in entities:
+                entities.append(entity)
+        return entities
+    
+    def match(self, message: str) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Classify a message and extract preferences when it is safe to do so locally
+        
+        Args:
+            message: User message
+            
+        Returns:
+            Tuple of (decision, preferences) where decision is NONE, LOCAL or
+            AMBIGUOUS; preferences is only populated for LOCAL
+        """
+        decision, preferences = self._match(message)
+        self.counters[decision] += 1
+        return decision, preferences
+    
+    def _match(self, message: str) -> Tuple[str, List[Dict[str, str]]]:
+        positive = self.POSITIVE_RE.search(message)
+        negative = self.NEGATIVE_RE.search(message)
+        
+        if not positive and not negative:
+            # Preferences can be phrased without a first-person cue, but not without naming something
+            if self._lexicon_re is None or not self._lexicon_re.search(message.lower()):
+                return self.NONE, []
+            if self.QUESTION_RE.search(message) and not self.CLAUSE_RE.search(message):
+                return self.NONE, []
+            return self.AMBIGUOUS, []
+        if positive and negative:
+            return self.AMBIGUOUS, []
+        cue = positive or negative
+        
+        # Questions, qualified statements and several clauses are left to the LLM
+        rest = message[:cue.start()] + " " + message[cue.end():]
+        if self.QUESTION_RE.search(message) or self.NEGATOR_RE.search(rest) or self.CLAUSE_RE.search(message):
+            return self.AMBIGUOUS, []
+        
+        # Names the lexicon doesn't know, cocktails included, are left to the LLM
+        entities = self._governed_entities(message, cue)
+        if not entities:
+            return self.AMBIGUOUS, []
+        
+        if negative:
+            ingredients = [name for kind, name in entities if kind == "ingredient"]
+            if not ingredients:
+                return self.AMBIGUOUS, []
+            return self.LOCAL, [{"type": "disliked_ingredient", "content": name} for name in ingredients]
+        
+        return self.LOCAL, [
+            {"type": f"favorite_{kind}", "content": name}
+            for kind, name in entities
+        ]
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Get decision counters
+        
+        Returns:
+            Dictionary with per-decision counts and the number of LLM calls avoided
+        """
+        stats = dict(self.counters)
+        stats["llm_calls_avoided"] = self.counters[self.NONE] + self.counters[self.LOCAL]
+        return stats
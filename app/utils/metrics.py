@@ -0,0 +1,161 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Tuple, Optional, Iterator
+
+# Upper bounds in seconds, from cache hits to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class RequestTrace:
+    """Stage timings of one request, in the order the stages first ran"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        # Stages may run in worker threads via asyncio.to_thread
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Stage timings as a Server-Timing header value"""
+        with self._lock:
+            entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, rendered in Prometheus text format
+
+    Recording a value is a dictionary update under one lock, cheap enough for
+    every stage of every request. Series are created on first use, keyed by
+    metric name and sorted label pairs.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def describe(
+        self,
+        name: str,
+        metric_type: str,
+        help_text: str,
+        buckets: Optional[Tuple[float, ...]] = None
+    ) -> None:
+        """Set the HELP and TYPE lines of a metric, and a histogram's buckets"""
+        self._help[name] = (metric_type, help_text)
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Add to a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record a value in a histogram"""
+        key = tuple(sorted(labels.items()))
+        buckets = self._buckets.get(name, self.buckets)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Per-bucket counts, then sum and count
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0.0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    values[i] += 1
+                    break
+            values[-2] += value
+            values[-1] += 1
+
+    @staticmethod
+    def _labels(key: LabelKey, extra: str = "") -> str:
+        parts = [f'{name}="{str(value)}"' for name, value in key]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        """All series in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric_type, help_text = self._help.get(name, ("counter", name))
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                for key, value in series.items():
+                    lines.append(f"{name}{self._labels(key)} {value:g}")
+
+            for name, series in sorted(self._histograms.items()):
+                _, help_text = self._help.get(name, ("histogram", name))
+                buckets = self._buckets.get(name, self.buckets)
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for key, values in series.items():
+                    cumulative = 0.0
+                    for bound, count in zip(buckets, values):
+                        cumulative += count
+                        le = 'le="%g"' % bound
+                        lines.append(f"{name}_bucket{self._labels(key, le)} {cumulative:g}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{name}_bucket{self._labels(key, le)} {values[-1]:g}")
+                    lines.append(f"{name}_sum{self._labels(key)} {values[-2]:.6f}")
+                    lines.append(f"{name}_count{self._labels(key)} {values[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("cocktail_stage_seconds", "histogram", "Time spent in each request pipeline stage")
+metrics.describe("cocktail_request_seconds", "histogram", "Time until the response starts, per route")
+metrics.describe("cocktail_retrieved_documents", "histogram", "Documents retrieved per query, before deduplication", COUNT_BUCKETS)
+metrics.describe("cocktail_context_cocktails", "histogram", "Cocktails packed into the LLM context per query", COUNT_BUCKETS)
+metrics.describe("cocktail_llm_tokens_total", "counter", "LLM tokens, estimated for prompts and counted for completions")
+metrics.describe("cocktail_cache_total", "counter", "Cache lookups by cache and result")
+metrics.describe("cocktail_events_total", "counter", "Pipeline events, e.g. lexical fast-path searches")
+
+
+def start_trace() -> RequestTrace:
+    """Start collecting stage timings for the current request"""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration in the histogram and the current request's trace"""
+    metrics.observe("cocktail_stage_seconds", seconds, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
@@ -0,0 +1,47 @@
+from functools import lru_cache
+
+# Rough characters-per-token ratio used when no tiktoken encoding is available
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _encoding(model_name: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its encodings on first use, which fails offline
+        print(f"Error loading tiktoken encoding, estimating token counts instead: {e}")
+        return None
+
+
+def count_tokens(text: str, model_name: str) -> int:
+    """
+    Count the tokens in a text with the model's tiktoken encoding
+
+    Args:
+        text: Text to measure
+        model_name: Model whose tokenizer to use
+
+    Returns:
+        Number of tokens
+    """
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, model_name: str) -> str:
+    """Cut a text down to at most max_tokens tokens"""
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return text[:max_tokens * _CHARS_PER_TOKEN]
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
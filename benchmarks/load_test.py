@@ -0,0 +1,303 @@
+"""
+End-to-end load test for the chat API
+
+Virtual users replay multi-turn conversations against /api/chat (or
+/api/chat/stream with --stream), carrying their session_id between turns,
+with --concurrency users active at once. Reports latency percentiles,
+throughput, errors and a per-stage breakdown, plus time to sources and first
+token when streaming. Stage timings come from the server's
+cocktail_stage_seconds histograms on /metrics, scraped before and after the
+run, so they cover streamed responses too. Their percentiles are histogram
+bucket bounds, and with WORKERS > 1 each scrape only reaches one worker:
+
+    python -m benchmarks.mock_openai --port 8100 &
+    OPENAI_API_BASE=http://localhost:8100/v1 OPENAI_API_KEY=mock python main.py &
+    python -m benchmarks.load_test --concurrency 32 --conversations 200 --json results.json
+
+With --baseline, the run fails if p95/p99 latency or throughput regress by more
+than --max-regression compared to an earlier --json result.
+"""
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import httpx
+
+INGREDIENTS = ["rum", "gin", "tequila", "vodka", "lemon", "lime", "mint", "sugar", "orange juice", "whiskey"]
+COCKTAILS = ["Mojito", "Margarita", "Negroni", "Daiquiri", "Old Fashioned", "Cosmopolitan", "Hot Creamy Bush", "ABC"]
+
+# Conversation scripts, modelled on the README use cases
+CONVERSATIONS = [
+    ["What are the 5 cocktails containing {ingredient}?", "How do I make the first one?"],
+    ["What are the 5 non-alcoholic cocktails containing {ingredient}?", "Which of those is the sweetest?"],
+    ["I love {ingredient} and {ingredient2}", "What are my favourite ingredients?",
+     "Recommend 5 cocktails that contain my favourite ingredients"],
+    ["Recommend a cocktail similar to '{cocktail}'", "What glass should I serve it in?"],
+    ["How do I make a {cocktail}?", "Can I make it without {ingredient}?", "Thanks! Anything similar?"],
+    ["I don't like {ingredient}", "Recommend a cocktail for a summer party"]
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+STAGE_METRIC = "cocktail_stage_seconds"
+_STAGE_LINE_RE = re.compile(STAGE_METRIC + r'_(bucket|sum|count)\{stage="([^"]+)"(?:,le="([^"]+)")?\} (\S+)')
+
+
+def parse_stage_histograms(text: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the stage histograms out of a /metrics page
+
+    Returns:
+        {stage: {"buckets": {upper bound in seconds: cumulative count}, "sum": seconds, "count": n}}
+    """
+    stages: Dict[str, Dict[str, Any]] = {}
+    for kind, name, le, value in _STAGE_LINE_RE.findall(text):
+        stage = stages.setdefault(name, {"buckets": {}, "sum": 0.0, "count": 0.0})
+        if kind == "bucket":
+            stage["buckets"][float(le)] = float(value)
+        else:
+            stage[kind] = float(value)
+    return stages
+
+
+def stage_summaries(before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Per-stage count, mean and bucket-bound percentiles, in milliseconds, of what happened between two scrapes
+
+    A percentile is the upper bound of the bucket it falls in; the +Inf
+    bucket reports the largest finite bound.
+    """
+    summaries = {}
+    for name, stage in after.items():
+        previous = before.get(name, {"buckets": {}, "sum": 0.0, "count": 0.0})
+        count = stage["count"] - previous["count"]
+        if count <= 0:
+            continue
+        buckets: List[Tuple[float, float]] = sorted(
+            (bound, cumulative - previous["buckets"].get(bound, 0.0)) for bound, cumulative in stage["buckets"].items()
+        )
+        largest = max((bound for bound, _ in buckets if math.isfinite(bound)), default=0.0)
+
+        def bound_at(q: float) -> float:
+            rank = math.ceil(q / 100.0 * count)
+            for bound, cumulative in buckets:
+                if cumulative >= rank:
+                    return round((bound if math.isfinite(bound) else largest) * 1000, 1)
+            return round(largest * 1000, 1)
+
+        summaries[f"server_{name}"] = {
+            "count": int(count),
+            "p50": bound_at(50),
+            "p95": bound_at(95),
+            "p99": bound_at(99),
+            "mean": round((stage["sum"] - previous["sum"]) / count * 1000, 1)
+        }
+    return summaries
+
+
+def script_for(rng: random.Random) -> List[str]:
+    ingredient, ingredient2 = rng.sample(INGREDIENTS, 2)
+    values = {"ingredient": ingredient, "ingredient2": ingredient2, "cocktail": rng.choice(COCKTAILS)}
+    return [turn.format(**values) for turn in rng.choice(CONVERSATIONS)]
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def record_stage(self, name: str, milliseconds: float) -> None:
+        self.stages.setdefault(name, []).append(milliseconds)
+
+    async def send(self, client: httpx.AsyncClient, payload: Dict[str, Any]) -> Optional[str]:
+        """Send one turn; returns the session ID to continue with"""
+        start = time.perf_counter()
+        session_id = payload.get("session_id")
+        try:
+            if self.args.stream:
+                async with client.stream("POST", "/api/chat/stream", json=payload) as response:
+                    self.statuses[response.status_code] += 1
+                    if response.status_code != 200:
+                        await response.aread()
+                        return session_id
+                    first_token = None
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        elapsed = (time.perf_counter() - start) * 1000
+                        if event["type"] == "session":
+                            session_id = event["session_id"]
+                        elif event["type"] == "sources":
+                            self.record_stage("client_sources", elapsed)
+                        elif event["type"] == "token" and first_token is None:
+                            first_token = elapsed
+                            self.record_stage("client_first_token", elapsed)
+                        elif event["type"] == "error":
+                            self.errors[event.get("detail", "error")[:80]] += 1
+            else:
+                response = await client.post("/api/chat", json=payload)
+                self.statuses[response.status_code] += 1
+                if response.status_code != 200:
+                    return session_id
+                session_id = response.json().get("session_id", session_id)
+        except httpx.HTTPError as e:
+            self.errors[type(e).__name__] += 1
+            return session_id
+
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        return session_id
+
+    @staticmethod
+    async def scrape_stages(client: httpx.AsyncClient) -> Dict[str, Dict[str, Any]]:
+        """Current stage histograms, or nothing if the server has no /metrics endpoint"""
+        response = await client.get("/metrics")
+        if response.status_code != 200:
+            return {}
+        return parse_stage_histograms(response.text)
+
+    async def user(self, client: httpx.AsyncClient, queue: "asyncio.Queue[int]") -> None:
+        while True:
+            try:
+                conversation = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            rng = random.Random(self.args.seed + conversation)
+            user_id = f"load-{conversation % self.args.users}"
+            session_id = None
+            for message in script_for(rng):
+                payload = {"message": message, "history": [], "user_id": user_id}
+                if session_id:
+                    payload["session_id"] = session_id
+                session_id = await self.send(client, payload)
+                if self.args.think_ms:
+                    await asyncio.sleep(rng.uniform(0, 2 * self.args.think_ms) / 1000)
+
+    async def run(self) -> Dict[str, Any]:
+        limits = httpx.Limits(max_connections=self.args.concurrency)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(base_url=self.args.url, limits=limits, timeout=timeout) as client:
+            ready = await client.get("/api/ready")
+            if ready.status_code != 200:
+                raise SystemExit(f"Server not ready: {ready.status_code} {ready.text}")
+
+            queue: "asyncio.Queue[int]" = asyncio.Queue()
+            for conversation in range(self.args.conversations):
+                queue.put_nowait(conversation)
+
+            stages_before = await self.scrape_stages(client)
+            start = time.perf_counter()
+            await asyncio.gather(*(self.user(client, queue) for _ in range(self.args.concurrency)))
+            elapsed = time.perf_counter() - start
+            server_stages = stage_summaries(stages_before, await self.scrape_stages(client))
+
+        return self.report(elapsed, server_stages)
+
+    def report(self, elapsed: float, server_stages: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+        def summary(values: List[float]) -> Dict[str, float]:
+            return {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 1),
+                "p95": round(percentile(values, 95), 1),
+                "p99": round(percentile(values, 99), 1),
+                "mean": round(sum(values) / len(values), 1) if values else 0.0
+            }
+
+        return {
+            "run_id": uuid.uuid4().hex[:8],
+            "endpoint": "/api/chat/stream" if self.args.stream else "/api/chat",
+            "concurrency": self.args.concurrency,
+            "seconds": round(elapsed, 2),
+            "requests": sum(self.statuses.values()),
+            "throughput_rps": round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": summary(self.latencies),
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "errors": dict(self.errors),
+            "stages_ms": dict(sorted(
+                [(name, summary(values)) for name, values in self.stages.items()] + list(server_stages.items())
+            ))
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    latency = report["latency_ms"]
+    print(f"{report['endpoint']}  concurrency={report['concurrency']}  requests={report['requests']}  "
+          f"time={report['seconds']}s  throughput={report['throughput_rps']} req/s")
+    print(f"latency ms  p50={latency['p50']}  p95={latency['p95']}  p99={latency['p99']}  mean={latency['mean']}")
+    print(f"statuses    {report['statuses']}")
+    if report["errors"]:
+        print(f"errors      {report['errors']}")
+    if report["stages_ms"]:
+        print(f"{'stage':<30}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, stage in report["stages_ms"].items():
+            print(f"{name:<30}{stage['count']:>8}{stage['p50']:>10}{stage['p95']:>10}{stage['p99']:>10}")
+
+
+def regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every metric that got worse than the baseline by more than tolerance"""
+    problems = []
+    for q in ("p95", "p99"):
+        old, new = baseline["latency_ms"][q], report["latency_ms"][q]
+        if old and new > old * (1 + tolerance):
+            problems.append(f"latency {q} {old} -> {new} ms")
+    old, new = baseline["throughput_rps"], report["throughput_rps"]
+    if old and new < old * (1 - tolerance):
+        problems.append(f"throughput {old} -> {new} req/s")
+    return problems
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the chat API with replayed conversations")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=16, help="Conversations in flight at once")
+    parser.add_argument("--conversations", type=int, default=100, help="Conversations to replay in total")
+    parser.add_argument("--users", type=int, default=50, help="Distinct user IDs to spread conversations over")
+    parser.add_argument("--stream", action="store_true", help="Use /api/chat/stream")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between turns")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Earlier --json report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="Allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = regressions(report, json.load(f), args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Local stand-in for the OpenAI chat completion and embedding endpoints
+
+Replies are canned but shaped like the real API, including SSE token
+streaming, so the app can be benchmarked without an API key:
+
+    python -m benchmarks.mock_openai --port 8100 --latency-ms 400 --token-ms 15
+    OPENAI_API_BASE=http://localhost:8100/v1 OPENAI_API_KEY=mock python main.py
+
+Latency is drawn per request from the chosen distribution, and a fraction of
+requests can be failed with 429s to exercise the client's retries.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import hashlib
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.embeddings import HashingEmbeddings
+
+REPLY_WORDS = (
+    "A classic choice would be a Margarita: shake tequila, triple sec and fresh lime juice with ice, "
+    "then strain into a salt-rimmed glass. If you prefer something lighter, a Mojito with white rum, "
+    "mint, lime, sugar and soda water is refreshing. For a non-alcoholic option, try a Virgin Mojito "
+    "or a Shirley Temple with ginger ale and grenadine. Enjoy your drink and let me know if you would "
+    "like more suggestions based on your favourite ingredients."
+).split()
+
+
+class LatencyModel:
+    """Per-request latency drawn from a fixed, normal or lognormal distribution"""
+
+    def __init__(self, distribution: str, median_ms: float, spread: float):
+        self.distribution = distribution
+        self.median = median_ms / 1000.0
+        self.spread = spread
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        if self.distribution == "fixed":
+            return self.median
+        if self.distribution == "normal":
+            return max(0.0, random.gauss(self.median, self.median * self.spread))
+        # Lognormal: long right tail, like real API latency
+        return random.lognormvariate(0.0, self.spread) * self.median
+
+
+@lru_cache(maxsize=1)
+def token_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"Can't load tiktoken's encoding, token-id embedding inputs will be hashed: {e}")
+        return None
+
+
+def decode_tokens(tokens: List[int]) -> str:
+    """
+    Turn token-id input back into text
+
+    The app sends raw text to a custom OPENAI_API_BASE (EMBEDDING_TOKENIZE),
+    so this only runs for clients that tokenize. Without tiktoken's encoding
+    the ids are hashed, which gives vectors unrelated to the text.
+    """
+    encoding = token_encoding()
+    if encoding is not None:
+        return encoding.decode(tokens)
+    return hashlib.sha256(json.dumps(tokens).encode("utf-8")).hexdigest()
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI")
+    chat_latency = LatencyModel(args.latency_dist, args.latency_ms, args.latency_spread)
+    embedding_latency = LatencyModel(args.latency_dist, args.embedding_latency_ms, args.latency_spread)
+    embedder = HashingEmbeddings(dim=args.embedding_dim)
+    stats = {"chat": 0, "stream": 0, "embeddings": 0, "embedded_texts": 0, "rate_limited": 0}
+
+    def rate_limited() -> Optional[JSONResponse]:
+        if args.error_rate > 0 and random.random() < args.error_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after": "0.2"}
+            )
+        return None
+
+    def reply_for(messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> str:
+        system = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        if "detect if they're sharing a preference" in system:
+            return '{"detected": false}'
+        if "running summary" in system:
+            return "The user asked about cocktails and was given a few suggestions."
+        words = min(args.reply_tokens, max_tokens or args.reply_tokens)
+        return " ".join(REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(words))
+
+    def prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+        return sum(len(str(m.get("content", ""))) // 4 + 4 for m in messages)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        error = rate_limited()
+        if error is not None:
+            return error
+
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "mock")
+        reply = reply_for(messages, body.get("max_tokens"))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        # Time to first token
+        await asyncio.sleep(chat_latency.sample())
+
+        if not body.get("stream"):
+            stats["chat"] += 1
+            # Non-streaming replies arrive all at once, after the whole generation
+            await asyncio.sleep(len(reply.split()) * args.token_ms / 1000.0)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens(messages),
+                    "completion_tokens": len(reply.split()),
+                    "total_tokens": prompt_tokens(messages) + len(reply.split())
+                }
+            }
+
+        stats["stream"] += 1
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }) + "\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(reply.split()):
+                if i:
+                    await asyncio.sleep(args.token_ms / 1000.0)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        error = rate_limited()
+        if error is not None:
+            return error
+
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        texts = [item if isinstance(item, str) else decode_tokens(item) for item in inputs]
+
+        await asyncio.sleep(embedding_latency.sample())
+        stats["embeddings"] += 1
+        stats["embedded_texts"] += len(texts)
+
+        vectors = embedder.embed_documents(texts)
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors)],
+            "model": body.get("model", "mock-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat and embedding server")
+    parser.add_argument("--host", default=os.getenv("MOCK_OPENAI_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MOCK_OPENAI_PORT", "8100")))
+    parser.add_argument("--latency-dist", choices=["fixed", "normal", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="Median time to first token")
+    parser.add_argument("--latency-spread", type=float, default=0.4, help="Sigma (lognormal) or relative stddev (normal)")
+    parser.add_argument("--token-ms", type=float, default=15.0, help="Time between generated tokens")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Words per canned reply")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(f"Mock OpenAI listening on http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
@@ -1,41 +1,175 @@
+import time
+
+# Taken first so the startup breakdown includes module import time
+PROCESS_START = time.perf_counter()
+
 from fastapi import FastAPI, Request, Depends, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import uvicorn
 import os
-from typing import List, Dict, Any
-from contextlib import asynccontextmanager
+import json
+import asyncio
+from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager, contextmanager
 
 # Import application modules
+# Heavy dependencies (chromadb, langchain, pandas) are imported inside the lifespan hook
 from app.db.models import ChatRequest, ChatResponse
-from app.db.vector_store import VectorStore
-from app.llm.engine import LLMEngine
-from app.llm.rag import CocktailRAG
-from app.utils.cocktail_parser import load_cocktail_data
-from app.config import HOST, PORT
+from app.llm.errors import LLMOverloaded
+from app.utils.metrics import metrics, start_trace
+from app.config import (
+    HOST,
+    PORT,
+    MODEL_NAME,
+    CONVERSATION_TOKEN_BUDGET,
+    CONVERSATION_SUMMARY_TOKENS,
+    CONVERSATION_SUMMARIZE,
+    CONVERSATION_TTL,
+    CONVERSATION_MAX_SESSIONS,
+    METRICS_TIMING_HEADERS,
+    WORKERS,
+    EMBEDDING_BACKEND,
+    INDEX_ARTIFACTS_PATH,
+    INDEX_RELOAD_SECONDS
+)
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Initialize components
-vector_store = VectorStore()
-llm_engine = LLMEngine()
-cocktail_rag = CocktailRAG(vector_store, llm_engine)
+# Components, built on demand in the lifespan hook
+components: Dict[str, Any] = {}
+
+# Seconds spent in each startup phase, in order
+startup_timings: Dict[str, float] = {}
+
+@contextmanager
+def startup_phase(name: str):
+    """Record how long a startup phase takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round(time.perf_counter() - start, 4)
+
+def load_index_artifact(version: Optional[str] = None):
+    """
+    Load a prebuilt index artifact
+    
+    Args:
+        version: Version to load, defaults to the current one
+        
+    Returns:
+        IndexArtifact, or None if there is none or it can't be used
+    """
+    from app.db.index_artifact import IndexArtifact
+    
+    try:
+        if version is None:
+            artifact = IndexArtifact.load_current(INDEX_ARTIFACTS_PATH)
+        else:
+            artifact = IndexArtifact.load(INDEX_ARTIFACTS_PATH, version)
+    except ValueError as e:
+        print(f"Error loading index artifact: {e}")
+        return None
+    
+    if artifact is not None and artifact.manifest.get("embedding_backend") != EMBEDDING_BACKEND:
+        print(f"Ignoring index artifact {artifact.version} built for another embedding backend")
+        return None
+    return artifact
+
+def use_index_artifact(artifact) -> None:
+    """Swap a newly loaded index artifact in while requests keep being served"""
+    from app.utils.cocktail_parser import use_cocktail_store
+    
+    catalog = use_cocktail_store(artifact.cocktails)
+    components["vector_store"].load_artifact(artifact)
+    components["rag"].use_catalog(catalog)
+    components["catalog"] = artifact.cocktails
+
+async def watch_index_artifacts(interval: float):
+    """Hot-reload the index whenever the build command moves the current pointer"""
+    from app.db.index_artifact import IndexArtifact
+    
+    loaded = components["vector_store"].search_state.version
+    while True:
+        await asyncio.sleep(interval)
+        version = await asyncio.to_thread(IndexArtifact.current_version, INDEX_ARTIFACTS_PATH)
+        if version is None or version == loaded:
+            continue
+        
+        # A broken artifact isn't retried until the pointer moves again
+        loaded = version
+        artifact = await asyncio.to_thread(load_index_artifact, version)
+        if artifact is not None:
+            await asyncio.to_thread(use_index_artifact, artifact)
+            print(f"Reloaded index artifact {version}")
 
 # Lifespan event handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize the application on startup"""
-    # Load cocktail data
-    cocktails = load_cocktail_data()
+    startup_timings["module_import"] = round(time.perf_counter() - PROCESS_START, 4)
+
+    with startup_phase("import_dependencies"):
+        from app.utils.cocktail_parser import load_cocktail_data, get_cocktail_catalog, use_cocktail_store
+        from app.db.vector_store import VectorStore
+        from app.llm.engine import LLMEngine
+        from app.llm.rag import CocktailRAG
+        from app.llm.conversation import ConversationStore, SharedConversationStore
+
+    # Load cocktail data, from the prebuilt index artifact if there is one
+    with startup_phase("load_cocktails"):
+        artifact = load_index_artifact()
+        if artifact is not None:
+            components["catalog"] = artifact.cocktails
+            use_cocktail_store(artifact.cocktails)
+        else:
+            components["catalog"] = load_cocktail_data()
+
+    with startup_phase("vector_store"):
+        vector_store = VectorStore()
 
     # Add cocktails to vector store
-    vector_store.add_cocktails(cocktails)
+    with startup_phase("index_cocktails"):
+        if artifact is not None:
+            vector_store.load_artifact(artifact)
+        else:
+            vector_store.add_cocktails(components["catalog"])
+        components["vector_store"] = vector_store
+
+    with startup_phase("llm_engine"):
+        llm_engine = LLMEngine()
+        components["llm_engine"] = llm_engine
+
+    with startup_phase("rag"):
+        components["rag"] = CocktailRAG(vector_store, components["llm_engine"], get_cocktail_catalog())
+        budgets = dict(
+            token_budget=CONVERSATION_TOKEN_BUDGET,
+            summary_budget=CONVERSATION_SUMMARY_TOKENS,
+            ttl_seconds=CONVERSATION_TTL,
+            max_sessions=CONVERSATION_MAX_SESSIONS
+        )
+        # With several workers, sessions live in the memory service so any worker can continue them
+        if vector_store.memory_service is not None:
+            components["conversations"] = SharedConversationStore(vector_store.memory_service, MODEL_NAME, **budgets)
+        else:
+            components["conversations"] = ConversationStore(MODEL_NAME, **budgets)
 
-    print("Application initialized successfully")
+    startup_timings["total"] = round(time.perf_counter() - PROCESS_START, 4)
+    print(f"Application initialized successfully: {startup_timings}")
+    
+    index_watcher = None
+    if INDEX_RELOAD_SECONDS > 0:
+        index_watcher = asyncio.create_task(watch_index_artifacts(INDEX_RELOAD_SECONDS))
     yield  # App is running
+    if index_watcher is not None:
+        index_watcher.cancel()
+    vector_store.close()
+    await llm_engine.aclose()
+    components.clear()
     print("Application shutting down")
 
 # Create FastAPI application
@@ -45,28 +179,196 @@ app = FastAPI(title="Cocktail Advisor Chat", lifespan=lifespan)
 templates = Jinja2Templates(directory="app/templates")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Collect per-stage timings for API requests"""
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+
+    trace = start_trace()
+    response = await call_next(request)
+    metrics.observe("cocktail_request_seconds", time.perf_counter() - trace.started, route=request.url.path)
+    # Streaming responses have only started here, their stages run later
+    if METRICS_TIMING_HEADERS and trace.stages:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
 # Define routes
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Render the chat interface"""
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.get("/api/ready")
+async def ready():
+    """Report which subsystems are warm and how long startup took"""
+    subsystems = {name: name in components for name in ("catalog", "vector_store", "llm_engine", "rag")}
+    is_ready = all(subsystems.values())
+
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "ready": is_ready,
+            "subsystems": subsystems,
+            "startup_timings": startup_timings
+        }
+    )
+
+def collect_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters of every component that keeps them"""
+    vector_store = components.get("vector_store")
+    cocktail_rag = components.get("rag")
+
+    return {
+        "embedding_cache": vector_store.get_embedding_cache_stats() if vector_store else {},
+        "embedding_batching": vector_store.get_embedding_batch_stats() if vector_store else {},
+        "preference_detection": cocktail_rag.preference_matcher.stats() if cocktail_rag else {},
+        "llm_client": components["llm_engine"].client.stats() if "llm_engine" in components else {},
+        "response_cache": (
+            cocktail_rag.response_cache.stats() if cocktail_rag and cocktail_rag.response_cache else {}
+        )
+    }
+
+@app.get("/api/stats")
+async def stats():
+    """Report cache, embedding batching, LLM client and preference-detection counters"""
+    return collect_stats()
+
+def component_stat_lines(stats: Dict[str, Any], prefix: str = "") -> List[str]:
+    """Flatten numeric component stats into cocktail_component_stat samples"""
+    lines = []
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            lines.extend(component_stat_lines(value, f"{name}_"))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            component, _, stat = name.partition(".")
+            lines.append(f'cocktail_component_stat{{component="{component}",stat="{stat}"}} {value:g}')
+    return lines
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Expose pipeline metrics and component counters in Prometheus text format"""
+    lines = [
+        "# HELP cocktail_component_stat Current value of a component counter from /api/stats",
+        "# TYPE cocktail_component_stat gauge"
+    ]
+    for component, values in collect_stats().items():
+        lines.extend(component_stat_lines(values, f"{component}."))
+    return PlainTextResponse(
+        metrics.render() + "\n".join(lines) + "\n",
+        media_type="text/plain; version=0.0.4"
+    )
+
+def overloaded(retry_after: float) -> HTTPException:
+    """503 telling the client when to retry"""
+    return HTTPException(
+        status_code=503,
+        detail="The assistant is busy, please try again shortly",
+        headers={"Retry-After": str(int(retry_after + 0.999))}
+    )
+
+async def open_conversation(request: ChatRequest):
+    """
+    Get the server-side session for a request
+
+    Clients that don't send a session_id yet get a new session, seeded with
+    any history they sent.
+    """
+    conversations = components["conversations"]
+    session = await conversations.aget_or_create(request.session_id, request.user_id)
+
+    if request.session_id != session.session_id:
+        history = [entry.model_dump() for entry in request.history]
+        # Older clients include the current message as the last history entry
+        if history and history[-1] == {"role": "user", "content": request.message}:
+            history = history[:-1]
+        if history:
+            await conversations.aadd_turns(session, [(entry["role"], entry["content"]) for entry in history])
+
+    return session
+
+async def close_turn(session, message: str, response: str) -> None:
+    """Record a finished exchange and compact the session in the background if needed"""
+    conversations = components["conversations"]
+    await conversations.aadd_turns(session, [("user", message), ("assistant", response)])
+
+    summarize = components["llm_engine"].asummarize_conversation if CONVERSATION_SUMMARIZE else None
+    conversations.schedule_compaction(session, summarize)
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Process chat message and return response"""
+    cocktail_rag = components.get("rag")
+    if cocktail_rag is None:
+        raise HTTPException(status_code=503, detail="Application is still starting up")
+
     try:
+        session = await open_conversation(request)
+        history = components["conversations"].history(session)
+
         # Process query using RAG
-        response, sources = cocktail_rag.process_query(request.message, request.history)
+        response, sources = await cocktail_rag.aprocess_query(request.message, history, request.user_id)
+        await close_turn(session, request.message, response)
 
         return ChatResponse(
             message=response,
-            sources=sources if sources else None
+            sources=sources if sources else None,
+            session_id=session.session_id
         )
+    except LLMOverloaded as e:
+        raise overloaded(e.retry_after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Process chat message and stream the response as NDJSON
+
+    Emits a {"type": "session"} event with the session ID, one
+    {"type": "sources"} event once retrieval is done, then one
+    {"type": "token"} event per generated chunk, and finally {"type": "done"}
+    or {"type": "error"}.
+    """
+    cocktail_rag = components.get("rag")
+    if cocktail_rag is None:
+        raise HTTPException(status_code=503, detail="Application is still starting up")
+
+    # Shed load before the response starts, a 503 can't be sent mid-stream
+    llm_client = components["llm_engine"].client
+    if llm_client.saturated():
+        raise overloaded(llm_client.queue_timeout)
+
+    session = await open_conversation(request)
+    history = components["conversations"].history(session)
+
+    async def events():
+        try:
+            yield json.dumps({"type": "session", "session_id": session.session_id}) + "\n"
+            tokens = []
+            async for event_type, payload in cocktail_rag.astream_query(request.message, history, request.user_id):
+                if event_type == "sources":
+                    yield json.dumps({"type": "sources", "sources": payload}) + "\n"
+                else:
+                    tokens.append(payload)
+                    yield json.dumps({"type": "token", "content": payload}) + "\n"
+            await close_turn(session, request.message, "".join(tokens))
+            yield json.dumps({"type": "done"}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Run the application
 if __name__ == "__main__":
-    print(f"Starting Cocktail Advisor Chat on http://{HOST}:{PORT}")
-    uvicorn.run("main:app", host=HOST, port=PORT, reload=True)
-3
\ No newline at end of file
+    if WORKERS > 1:
+        from app.production import serve
+        serve(WORKERS)
+    else:
+        print(f"Starting Cocktail Advisor Chat on http://{HOST}:{PORT}")
+        uvicorn.run("main:app", host=HOST, port=PORT, reload=True)
@@ -0,0 +1,109 @@
+import pickle
+import asyncio
+
+import pytest
+
+from app.llm.conversation import ConversationStore, SharedConversationStore
+
+
+@pytest.fixture
+def store():
+    return ConversationStore("gpt-3.5-turbo", token_budget=40, summary_budget=20, compact_ratio=0.5)
+
+
+def fill(store, session, turns=8):
+    for i in range(turns):
+        store.add_turn(session, "user" if i % 2 == 0 else "assistant", f"message number {i} " * 3)
+
+
+def test_compaction_folds_old_turns_into_the_summary(store):
+    session = store.get_or_create(None, "alice")
+    fill(store, session)
+
+    async def summarize(previous, turns):
+        return f"{len(turns)} turns"
+
+    asyncio.run(store.compact(session, summarize))
+    assert session.summary.endswith("turns")
+    assert session.history_tokens <= store.token_budget
+    assert session.turns[-1].content.startswith("message number 7")
+    assert not session.compacting
+
+
+def test_failed_summary_keeps_the_turns(store):
+    session = store.get_or_create(None, "alice")
+    fill(store, session)
+    before = list(session.turns)
+
+    async def summarize(previous, turns):
+        raise RuntimeError("LLM down")
+
+    asyncio.run(store.compact(session, summarize))
+    assert session.turns == before
+    assert session.summary == ""
+    assert store.needs_compaction(session)
+
+
+def test_turns_stay_visible_while_summarizing(store):
+    session = store.get_or_create(None, "alice")
+    fill(store, session)
+    seen = []
+
+    async def summarize(previous, turns):
+        seen.append(len(session.turns))
+        # A request that lands mid-compaction adds its exchange at the end
+        store.add_turn(session, "user", "late question")
+        return "summary"
+
+    count = len(session.turns)
+    asyncio.run(store.compact(session, summarize))
+    assert seen == [count]
+    assert session.turns[-1].content == "late question"
+    assert session.summary == "summary"
+
+
+def test_sessions_are_not_shared_between_users(store):
+    session = store.get_or_create(None, "alice")
+    assert store.get_or_create(session.session_id, "alice") is session
+    assert store.get_or_create(session.session_id, "bob").session_id != session.session_id
+
+
+class LoopbackClient:
+    """Calls a MemoryService in-process, pickling like the socket does"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def __getattr__(self, method):
+        def call(*args):
+            return pickle.loads(pickle.dumps(self.service._handle(method, pickle.loads(pickle.dumps(args)))))
+        return call
+
+
+def test_shared_sessions_continue_on_any_worker(tmp_path):
+    from app.db.memory_service import MemoryService
+
+    service = MemoryService(str(tmp_path / "prefs.sqlite3"), str(tmp_path / "memories"))
+    service.conversations.token_budget, service.conversations.summary_budget = 40, 20
+    try:
+        workers = [
+            SharedConversationStore(LoopbackClient(service), "gpt-3.5-turbo", token_budget=40, summary_budget=20)
+            for _ in range(2)
+        ]
+        session = workers[0].get_or_create(None, "alice")
+        fill(workers[0], session)
+
+        # The follow-up lands on the other worker
+        follow_up = workers[1].get_or_create(session.session_id, "alice")
+        assert follow_up.session_id == session.session_id
+        assert [turn.content for turn in follow_up.turns] == [turn.content for turn in session.turns]
+
+        async def summarize(previous, turns):
+            return "summary"
+
+        asyncio.run(workers[1].compact(follow_up, summarize))
+        compacted = workers[0].get_or_create(session.session_id, "alice")
+        assert compacted.summary == "summary"
+        assert compacted.history_tokens < session.history_tokens
+    finally:
+        service.preference_store.close()
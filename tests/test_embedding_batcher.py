@@ -0,0 +1,102 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.db.embedding_batcher import BatchingEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    """Embeds a text as [len(text)], recording every batch it is sent"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.batches.append(list(texts))
+        time.sleep(self.delay)
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class ShortEmbeddings(RecordingEmbeddings):
+    def embed_documents(self, texts):
+        return super().embed_documents(texts)[:-1]
+
+
+class FailingEmbeddings(RecordingEmbeddings):
+    def embed_documents(self, texts):
+        raise RuntimeError("API down")
+
+
+def embed_concurrently(batcher, texts):
+    with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        return list(pool.map(batcher.embed_query, texts))
+
+
+def test_concurrent_calls_are_coalesced_and_deduplicated():
+    model = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(model, max_wait_ms=200, max_batch_size=64)
+    texts = ["gin", "rum", "gin", "vodka"] * 4
+    try:
+        assert embed_concurrently(batcher, texts) == [[float(len(text))] for text in texts]
+    finally:
+        batcher.close()
+
+    assert len(model.batches) < len(texts)
+    assert sum(len(batch) for batch in model.batches) <= 3 * len(model.batches)
+    stats = batcher.stats()
+    assert stats["calls"] == len(texts)
+    assert stats["deduplicated"] > 0
+
+
+def test_batches_are_capped_and_oversized_calls_bypass():
+    model = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(model, max_wait_ms=200, max_batch_size=4)
+    try:
+        embed_concurrently(batcher, [f"text {i}" for i in range(10)])
+        assert all(len(batch) <= 4 for batch in model.batches)
+        assert batcher.embed_documents([f"bulk {i}" for i in range(5)]) == [[6.0]] * 5
+    finally:
+        batcher.close()
+    assert batcher.stats()["bypassed"] == 1
+
+
+@pytest.mark.parametrize("model", [FailingEmbeddings(), ShortEmbeddings()])
+def test_errors_reach_every_caller(model):
+    batcher = BatchingEmbeddings(model, max_wait_ms=50, timeout=5)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(batcher.embed_query, f"text {i}") for i in range(4)]
+            errors = [future.exception(timeout=5) for future in futures]
+    finally:
+        batcher.close()
+    assert all(isinstance(error, (RuntimeError, ValueError)) for error in errors)
+
+
+def test_callers_time_out():
+    batcher = BatchingEmbeddings(RecordingEmbeddings(delay=1.0), max_wait_ms=1, timeout=0.1)
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.embed_query("gin")
+    finally:
+        batcher.close()
+
+
+def test_close_sends_queued_texts_then_embeds_directly():
+    model = RecordingEmbeddings()
+    batcher = BatchingEmbeddings(model, max_wait_ms=10_000)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(batcher.embed_query, "gin")
+        time.sleep(0.1)
+        batcher.close()
+        assert pending.result(timeout=5) == [3.0]
+    assert batcher.embed_query("vodka") == [5.0]
+    assert batcher.stats()["bypassed"] == 1
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.db.cocktail_index import CocktailIndex
+from app.db.index_artifact import IndexArtifact, CATALOG_FILE, CURRENT_POINTER
+from app.db.similarity_graph import SimilarityGraph
+from app.utils.cocktail_store import CocktailStore
+
+RECORDS = [
+    {"name": "Gimlet", "ingredients": "['Gin', 'Lime juice']", "ingredientMeasures": "['2 oz', '1 oz']"},
+    {"name": "Daiquiri", "ingredients": "['Rum', 'Lime', 'Sugar']", "ingredientMeasures": "['2 oz', '1 oz', '1 tsp']"},
+    {"name": "Martini", "ingredients": "['Gin', 'Dry Vermouth']", "ingredientMeasures": "['2 oz', '1 oz']"},
+]
+
+
+def write(root, version, graph=None):
+    ids = [f"{version}-{i}" for i in range(len(RECORDS))]
+    index = CocktailIndex.build(
+        ids,
+        np.eye(len(RECORDS), 4).tolist(),
+        [record["name"] for record in RECORDS],
+        [{"id": doc_id, "name": record["name"]} for doc_id, record in zip(ids, RECORDS)]
+    )
+    cocktails = CocktailStore.from_records(RECORDS)
+    return IndexArtifact.write(root, version, cocktails, index, {"backend": "test"}, graph)
+
+
+def test_write_then_load_current(tmp_path):
+    root = str(tmp_path)
+    write(root, "v1")
+    artifact = IndexArtifact.load_current(root)
+    assert artifact.version == "v1"
+    assert [cocktail.name for cocktail in artifact.cocktails] == ["Gimlet", "Daiquiri", "Martini"]
+    assert artifact.manifest["backend"] == "test"
+    assert len(artifact.index) == 3
+    assert artifact.graph is None
+
+
+def test_graph_is_stored_with_the_artifact(tmp_path):
+    root = str(tmp_path)
+    graph = SimilarityGraph.build(["a", "b", "c"], np.eye(3, 4), [["gin"], ["rum"], ["gin"]], k=2)
+    write(root, "v1", graph)
+    assert IndexArtifact.load_current(root).graph.ids == ["a", "b", "c"]
+
+
+def test_corrupt_files_fail_the_checksum(tmp_path):
+    root = str(tmp_path)
+    path = write(root, "v1")
+    with open(os.path.join(path, CATALOG_FILE), "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        IndexArtifact.load(root, "v1")
+
+
+def test_current_only_moves_once_an_artifact_is_complete(tmp_path):
+    root = str(tmp_path)
+    write(root, "v1")
+
+    class BrokenGraph:
+        def save(self, path):
+            raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write(root, "v2", BrokenGraph())
+    assert IndexArtifact.current_version(root) == "v1"
+    assert not os.path.exists(os.path.join(root, "v2"))
+
+    write(root, "v3")
+    assert IndexArtifact.current_version(root) == "v3"
+    assert not os.path.exists(os.path.join(root, f"{CURRENT_POINTER}.tmp"))
+
+
+def test_prune_keeps_the_newest_and_the_current(tmp_path):
+    root = str(tmp_path)
+    for version in ("v1", "v2", "v3", "v4"):
+        write(root, version)
+    IndexArtifact.set_current(root, "v1")
+
+    deleted = IndexArtifact.prune(root, keep=2)
+    assert sorted(deleted) == ["v2"]
+    assert sorted(name for name in os.listdir(root) if name.startswith("v")) == ["v1", "v3", "v4"]
+    assert IndexArtifact.load_current(root).version == "v1"
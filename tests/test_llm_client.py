@@ -0,0 +1,137 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+from langchain.schema import HumanMessage
+
+from app.llm.client import LLMClient, TokenBucket
+from app.llm.errors import LLMOverloaded
+
+MESSAGES = [HumanMessage(content="Something with gin?")]
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://llm.test/v1/chat"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class ScriptedLLM:
+    """Raises the scripted errors in turn, then answers"""
+
+    def __init__(self, errors=(), delay=0.0, stream_error=None):
+        self.errors = list(errors)
+        self.delay = delay
+        self.stream_error = stream_error
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "reply"
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.delay)
+        return self._next()
+
+    def invoke(self, messages):
+        return self._next()
+
+    async def astream(self, messages):
+        yield self._next()
+        if self.stream_error is not None:
+            raise self.stream_error
+        yield "more"
+
+
+def client(**kwargs):
+    params = dict(max_output_tokens=10, retry_base_delay=0.001, retry_max_delay=0.01, queue_timeout=0.5)
+    params.update(kwargs)
+    return LLMClient("gpt-3.5-turbo", **params)
+
+
+def test_token_bucket_reports_the_wait_for_its_debt():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.delay_for(60) == 0.0
+    assert bucket.reserve(60) == 0.0
+    assert bucket.delay_for(30) == pytest.approx(30.0, abs=0.1)
+    # Reservations are capped at the bucket size
+    assert bucket.reserve(600) == pytest.approx(60.0, abs=0.1)
+
+
+def test_retryable_errors_are_retried():
+    llm_client = client()
+    llm = ScriptedLLM([rate_limit_error(), rate_limit_error()])
+    assert asyncio.run(llm_client.ainvoke(llm, MESSAGES)) == "reply"
+    assert llm.calls == 3
+    assert llm_client.stats()["retries"] == 2
+
+
+def test_other_errors_and_exhausted_retries_are_raised():
+    llm_client = client(max_retries=1)
+    with pytest.raises(ValueError):
+        llm_client.invoke(ScriptedLLM([ValueError("bad prompt")]), MESSAGES)
+    with pytest.raises(openai.RateLimitError):
+        llm_client.invoke(ScriptedLLM([rate_limit_error(), rate_limit_error()]), MESSAGES)
+    stats = llm_client.stats()
+    assert stats["failures"] == 2
+    assert stats["retries"] == 1
+
+
+def test_retry_after_is_honoured_up_to_the_cap():
+    llm_client = client(retry_max_delay=5.0)
+    assert llm_client._retry_delay(rate_limit_error("2"), 0) == 2.0
+    assert llm_client._retry_delay(rate_limit_error("60"), 0) == 5.0
+
+
+def test_streams_are_only_retried_before_the_first_chunk():
+    llm_client = client()
+
+    async def collect(llm):
+        return [chunk async for chunk in llm_client.astream(llm, MESSAGES)]
+
+    assert asyncio.run(collect(ScriptedLLM([rate_limit_error()]))) == ["reply", "more"]
+
+    llm = ScriptedLLM(stream_error=rate_limit_error())
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(collect(llm))
+    assert llm.calls == 1
+
+
+def test_calls_beyond_the_queue_are_shed():
+    llm_client = client(max_concurrency=1, max_queue=0)
+
+    async def run():
+        first = asyncio.create_task(llm_client.ainvoke(ScriptedLLM(delay=0.2), MESSAGES))
+        await asyncio.sleep(0.05)
+        assert llm_client.saturated()
+        with pytest.raises(LLMOverloaded):
+            await llm_client.ainvoke(ScriptedLLM(), MESSAGES)
+        return await first
+
+    assert asyncio.run(run()) == "reply"
+    assert llm_client.stats()["shed"] == 1
+
+
+def test_calls_waiting_past_the_queue_timeout_are_shed():
+    llm_client = client(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+
+    async def run():
+        first = asyncio.create_task(llm_client.ainvoke(ScriptedLLM(delay=0.3), MESSAGES))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMOverloaded) as shed:
+            await llm_client.ainvoke(ScriptedLLM(), MESSAGES)
+        await first
+        return shed.value
+
+    assert asyncio.run(run()).retry_after >= 1.0
+
+
+def test_calls_over_the_token_rate_are_shed():
+    llm_client = client(tokens_per_minute=600, max_output_tokens=1000)
+    assert llm_client.invoke(ScriptedLLM(), MESSAGES) == "reply"
+    with pytest.raises(LLMOverloaded) as shed:
+        llm_client.invoke(ScriptedLLM(), MESSAGES)
+    assert shed.value.retry_after > 10
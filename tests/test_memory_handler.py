@@ -0,0 +1,73 @@
+import pytest
+
+from app.utils.memory_handler import PreferenceMatcher
+
+INGREDIENTS = ["gin", "vodka", "rum", "lime", "sugar", "lemon juice", "lemon"]
+COCKTAILS = ["mojito", "margarita"]
+
+
+@pytest.fixture
+def matcher():
+    return PreferenceMatcher(INGREDIENTS, COCKTAILS)
+
+
+@pytest.mark.parametrize("message", [
+    "I like gin but not vodka",
+    "I love cocktails without sugar",
+    "I love rum, what can I make with lime and sugar?",
+    "Do I like gin?",
+    "I love gin. Vodka is fine too",
+    "I love gin except with lime",
+])
+def test_ambiguous_messages_go_to_the_llm(matcher, message):
+    assert matcher.match(message) == (PreferenceMatcher.AMBIGUOUS, [])
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("I love gin and rum", [("favorite_ingredient", "gin"), ("favorite_ingredient", "rum")]),
+    ("I really like lemon juice", [("favorite_ingredient", "lemon juice")]),
+    ("Gin is my favorite", [("favorite_ingredient", "gin")]),
+    ("I love a mojito", [("favorite_cocktail", "mojito")]),
+    ("I can't stand vodka", [("disliked_ingredient", "vodka")]),
+    ("I don't like lime or sugar", [("disliked_ingredient", "lime"), ("disliked_ingredient", "sugar")]),
+])
+def test_cue_objects_are_extracted_locally(matcher, message, expected):
+    decision, preferences = matcher.match(message)
+    assert decision == PreferenceMatcher.LOCAL
+    assert [(p["type"], p["content"]) for p in preferences] == expected
+
+
+def test_only_the_cue_object_is_taken(matcher):
+    decision, preferences = matcher.match("I love gin cocktails with lime")
+    assert decision == PreferenceMatcher.LOCAL
+    assert preferences == [{"type": "favorite_ingredient", "content": "gin"}]
+
+
+def test_messages_without_cues_skip_the_llm(matcher):
+    assert matcher.match("What goes into a margarita?") == (PreferenceMatcher.NONE, [])
+
+
+def test_a_favorite_drink_that_is_an_ingredient_is_stored_as_one(matcher):
+    assert matcher.match("My favorite drink is gin") == (
+        PreferenceMatcher.LOCAL, [{"type": "favorite_ingredient", "content": "gin"}]
+    )
+
+
+def test_unknown_favorite_cocktails_go_to_the_llm(matcher):
+    assert matcher.match("My favorite cocktail is the Zombie") == (PreferenceMatcher.AMBIGUOUS, [])
+
+
+@pytest.mark.parametrize("message", [
+    "gin is great, hate anything with cream",
+    "Vodka all the way",
+])
+def test_known_names_without_a_cue_go_to_the_llm(matcher, message):
+    assert matcher.match(message) == (PreferenceMatcher.AMBIGUOUS, [])
+
+
+@pytest.mark.parametrize("message", [
+    "Hello there",
+    "What can I make with gin?",
+])
+def test_messages_that_cannot_hold_a_preference_skip_the_llm(matcher, message):
+    assert matcher.match(message) == (PreferenceMatcher.NONE, [])
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from langchain.schema import Document
+
+from app.db.cocktail_index import CocktailIndex
+from app.db.personalization import PreferenceReranker
+from app.utils.cocktail_parser import CocktailCatalog
+
+COCKTAILS = [
+    {"name": "Daiquiri", "ingredients": "['Rum', 'Lime juice', 'Sugar']"},
+    {"name": "Gimlet", "ingredients": "['Gin', 'Lime juice']"},
+    {"name": "Tom Collins", "ingredients": "['Gin', 'Lemon juice', 'Sugar', 'Soda water']"},
+    {"name": "White Russian", "ingredients": "['Vodka', 'Coffee liqueur', 'Cream']"},
+]
+
+
+@pytest.fixture
+def rows():
+    return [
+        Document(page_content=cocktail["name"], metadata={"id": f"id-{i}", "name": cocktail["name"]})
+        for i, cocktail in enumerate(COCKTAILS)
+    ]
+
+
+@pytest.fixture
+def reranker(rows):
+    return PreferenceReranker(CocktailCatalog(COCKTAILS), rows, favorite_weight=0.3)
+
+
+def names(documents):
+    return [document.metadata["name"] for document in documents]
+
+
+def test_without_preferences_the_order_is_kept(reranker, rows):
+    assert reranker.rerank(rows, [], []) is rows
+
+
+def test_disliked_ingredients_sink_to_the_bottom(reranker, rows):
+    ranked = names(reranker.rerank(rows, [], ["lime"]))
+    assert ranked == ["Tom Collins", "White Russian", "Daiquiri", "Gimlet"]
+
+
+def test_dislikes_outweigh_favorites_and_relevance(reranker, rows):
+    ranked = names(reranker.rerank(rows, ["rum", "sugar"], ["rum"]))
+    assert ranked[-1] == "Daiquiri"
+
+
+def test_favorites_lift_matching_cocktails(rows):
+    reranker = PreferenceReranker(CocktailCatalog(COCKTAILS), rows, favorite_weight=1.0)
+    # "lemon" also refers to "Lemon juice", so the Tom Collins matches both favorites
+    ranked = names(reranker.rerank(rows, ["gin", "lemon"], []))
+    assert ranked == ["Tom Collins", "Gimlet", "Daiquiri", "White Russian"]
+
+
+def test_documents_outside_the_catalog_are_kept_unscored(reranker, rows):
+    stranger = Document(page_content="Memory", metadata={"id": "memory"})
+    ranked = reranker.rerank([stranger] + rows, [], ["cream"])
+    assert ranked[0] is stranger
+    assert names(ranked[-1:]) == ["White Russian"]
+
+
+def test_query_cosine_is_the_relevance_when_the_index_is_loaded(rows):
+    index = CocktailIndex.build(
+        [row.metadata["id"] for row in rows],
+        np.eye(len(rows)).tolist(),
+        [row.page_content for row in rows],
+        [row.metadata for row in rows]
+    )
+    reranker = PreferenceReranker(CocktailCatalog(COCKTAILS), rows, index)
+    # Closest to the White Russian; the unmatched favorite changes nothing
+    ranked = names(reranker.rerank(rows, ["absinthe"], [], vector=[0.1, 0.2, 0.3, 0.9]))
+    assert ranked == ["White Russian", "Tom Collins", "Gimlet", "Daiquiri"]
@@ -0,0 +1,29 @@
+from app.llm.rag import CocktailRAG
+from app.llm.response_cache import SemanticResponseCache
+
+EXCHANGE = [{"role": "user", "content": "Something with gin?"}, {"role": "assistant", "content": "Try a Gimlet."}]
+
+
+def scope(history, query="And without lime?"):
+    return SemanticResponseCache.scope_key(None, "context", CocktailRAG._scope_history(query, history))
+
+
+def test_scope_covers_the_conversation_summary():
+    first = [{"role": "system", "content": "Summary of the earlier conversation: the user hates sugar"}]
+    second = [{"role": "system", "content": "Summary of the earlier conversation: the user loves sugar"}]
+    assert scope(first + EXCHANGE) != scope(second + EXCHANGE)
+    assert scope(first + EXCHANGE) != scope(EXCHANGE)
+
+
+def test_scope_ignores_turns_before_the_last_exchange():
+    older = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}]
+    current = {"role": "user", "content": "And without lime?"}
+    assert scope(older + EXCHANGE) == scope(EXCHANGE) == scope(EXCHANGE + [current])
+
+
+def test_lookup_is_confined_to_the_scope():
+    cache = SemanticResponseCache(threshold=0.9)
+    cache.store([1.0, 0.0], "a", "response", ["Gimlet"], 1.0)
+    assert cache.lookup([0.99, 0.05], "a") == ("response", ["Gimlet"])
+    assert cache.lookup([0.99, 0.05], "b") is None
+    assert cache.lookup([0.0, 1.0], "a") is None
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from app.db.similarity_graph import SimilarityGraph
+
+INGREDIENTS = ["gin", "rum", "vodka", "lime", "lemon", "sugar", "mint", "soda", "cream", "coffee"]
+
+
+def random_catalog(rng, ids):
+    vectors = {doc_id: rng.normal(size=16).astype(np.float32) for doc_id in ids}
+    ingredients = {
+        doc_id: list(rng.choice(INGREDIENTS, size=rng.integers(1, 5), replace=False))
+        for doc_id in ids
+    }
+    return vectors, ingredients
+
+
+def build(ids, vectors, ingredients, previous=None, k=5):
+    return SimilarityGraph.build(
+        ids,
+        np.stack([vectors[doc_id] for doc_id in ids]),
+        [ingredients[doc_id] for doc_id in ids],
+        k=k,
+        alpha=0.7,
+        previous=previous
+    )
+
+
+def neighbour_ids(graph):
+    return [[graph.ids[hit] for hit in graph.neighbours_of(row)] for row in range(len(graph))]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_rebuild_matches_a_full_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    old_ids = [f"doc-{i}" for i in range(60)]
+    vectors, ingredients = random_catalog(rng, old_ids + [f"new-{i}" for i in range(15)])
+    previous = build(old_ids, vectors, ingredients)
+
+    # Drop some documents, add new ones and shuffle the row order
+    kept = [doc_id for doc_id in old_ids if rng.random() > 0.2]
+    new_ids = list(rng.permutation(kept + [f"new-{i}" for i in range(15)]))
+
+    incremental = build(new_ids, vectors, ingredients, previous=previous)
+    full = build(new_ids, vectors, ingredients)
+    assert neighbour_ids(incremental) == neighbour_ids(full)
+    np.testing.assert_allclose(incremental.weights, full.weights, rtol=1e-5)
+
+
+def test_rows_are_never_their_own_or_a_duplicate_neighbour():
+    rng = np.random.default_rng(0)
+    ids = [f"doc-{i}" for i in range(10)]
+    vectors, ingredients = random_catalog(rng, ids)
+    graph = build(ids + ["doc-0"], vectors, ingredients, k=20)
+
+    for row, doc_id in enumerate(graph.ids):
+        assert doc_id not in [graph.ids[hit] for hit in graph.neighbours_of(row)]
+    assert len(graph.neighbours_of(0)) == 9
+    assert len(graph.neighbours_of(0, k=3)) == 3
+
+
+def test_save_and_load_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    ids = [f"doc-{i}" for i in range(20)]
+    vectors, ingredients = random_catalog(rng, ids)
+    graph = build(ids, vectors, ingredients)
+
+    path = str(tmp_path / "graph.npz")
+    graph.save(path)
+    loaded = SimilarityGraph.load(path)
+    assert loaded.ids == graph.ids and (loaded.k, loaded.alpha) == (graph.k, graph.alpha)
+    assert neighbour_ids(loaded) == neighbour_ids(graph)
+    assert SimilarityGraph.load(str(tmp_path / "missing.npz")) is None